@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Footfall Aggregation Store
+Incremental per-camera, per-line rollups in 1-minute, 15-minute and hourly buckets (SQLite)
+"""
+
+import sqlite3
+import time
+from collections import defaultdict
+
+BUCKETS = {'1m': 60, '15m': 900, '1h': 3600}
+
+
+class AggregationStore:
+    """Event sink that keeps time-bucketed entry/exit counts
+
+    Rollups are updated incrementally from each event batch, so queries never rescan
+    raw events. Events are bucketed by wall-clock time, or by media time plus
+    time_offset (e.g. the recording start) for recorded footage.
+    """
+
+    def __init__(self, path='footfall_stats.db', time_field='wall_time', time_offset=0.0):
+        self.path = path
+        self.time_field = time_field
+        self.time_offset = time_offset
+        self.conn = None
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                "camera_id TEXT NOT NULL, line TEXT NOT NULL, bucket_seconds INTEGER NOT NULL, "
+                "bucket_start INTEGER NOT NULL, entries INTEGER NOT NULL DEFAULT 0, exits INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (bucket_seconds, camera_id, line, bucket_start)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rollups_time ON rollups (bucket_seconds, bucket_start)")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _event_time(self, event):
+        if self.time_field == 'media_time' and event.media_time is not None:
+            return event.media_time + self.time_offset
+        return event.wall_time
+
+    def write(self, events):
+        """Fold a batch of crossing events into every rollup level"""
+        self._fold(events, 1)
+
+    def retract(self, events):
+        """Take events written earlier (with the same time_offset) back out of the rollups"""
+        self._fold(events, -1)
+
+    def _fold(self, events, sign):
+        deltas = defaultdict(lambda: [0, 0])
+        for e in events:
+            timestamp = self._event_time(e)
+            for seconds in BUCKETS.values():
+                key = (e.camera_id, e.line, seconds, int(timestamp // seconds) * seconds)
+                deltas[key][0 if e.direction == 'entry' else 1] += sign
+        if not deltas:
+            return
+        if self.conn is None:
+            # Opened on first write so the connection belongs to the event writer thread
+            self.conn = self._connect()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO rollups (camera_id, line, bucket_seconds, bucket_start, entries, exits) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (bucket_seconds, camera_id, line, bucket_start) "
+                "DO UPDATE SET entries = entries + excluded.entries, exits = exits + excluded.exits",
+                [key + tuple(counts) for key, counts in deltas.items()]
+            )
+
+    def delete(self, camera_id):
+        """Remove every rollup of camera_id, e.g. before a recording is counted again; returns rows removed"""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM rollups WHERE camera_id = ?", (camera_id,)).rowcount
+        finally:
+            conn.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _filters(self, start, end, camera_id, line):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("bucket_start >= ?")
+            params.append(int(start))
+        if end is not None:
+            clauses.append("bucket_start < ?")
+            params.append(int(end))
+        if camera_id is not None:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if line is not None:
+            clauses.append("line = ?")
+            params.append(line)
+        return ''.join(f" AND {c}" for c in clauses), params
+
+    def query(self, start=None, end=None, bucket='1h', camera_id=None, line=None, by_camera=False):
+        """Counts per bucket in [start, end), e.g. hourly entries for the last week:
+
+            store.query(time.time() - 7 * 86400, time.time(), bucket='1h')
+        """
+        seconds = BUCKETS[bucket]
+        if start is not None:
+            start = int(start // seconds) * seconds
+        where, params = self._filters(start, end, camera_id, line)
+        group = "bucket_start, camera_id, line" if by_camera else "bucket_start"
+        columns = "bucket_start, camera_id, line" if by_camera else "bucket_start"
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT {columns}, SUM(entries), SUM(exits) FROM rollups "
+                f"WHERE bucket_seconds = ?{where} GROUP BY {group} ORDER BY {group}",
+                [seconds] + params
+            ).fetchall()
+        finally:
+            conn.close()
+        if by_camera:
+            return [{'bucket_start': r[0], 'camera_id': r[1], 'line': r[2], 'entries': r[3], 'exits': r[4]} for r in rows]
+        return [{'bucket_start': r[0], 'entries': r[1], 'exits': r[2]} for r in rows]
+
+    def totals(self, start=None, end=None, camera_id=None, line=None):
+        """Entry/exit totals per camera and line; minute buckets when a range is given"""
+        seconds = BUCKETS['1m'] if start is not None or end is not None else BUCKETS['1h']
+        if start is not None:
+            start = int(start // seconds) * seconds
+        where, params = self._filters(start, end, camera_id, line)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT camera_id, line, SUM(entries), SUM(exits) FROM rollups "
+                f"WHERE bucket_seconds = ?{where} GROUP BY camera_id, line ORDER BY camera_id, line",
+                [seconds] + params
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{'camera_id': r[0], 'line': r[1], 'entries': r[2], 'exits': r[3]} for r in rows]
+
+    def last(self, seconds, bucket='1h', **filters):
+        """Convenience wrapper: query the trailing window ending now"""
+        now = time.time()
+        return self.query(now - seconds, now, bucket=bucket, **filters)
@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Runner
+Watches a directory for recorded clips, queues them in a SQLite job store and counts
+them with a pool of worker threads sharing one loaded detector; restarts resume
+interrupted files and never redo finished ones
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import cv2
+
+from footfall_counter import FootfallCounter, TRACKERS, EXPORT_SUFFIXES
+from aggregation import AggregationStore
+from events import CrossingEvent
+
+JOBS_PATH = 'footfall_jobs.db'
+VIDEO_PATTERNS = ('*.mp4', '*.avi', '*.mkv', '*.mov', '*.ts')
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+class JobStore:
+    """Persisted queue of video files with their status and results
+
+    A file is identified by its path and queued again only if its size or mtime
+    changed since it was last seen. Every call opens its own connection, so worker
+    threads can share one store. Crossing events bound for the stats database are
+    staged here per file and committed once the file is done (see BatchRunner).
+    """
+
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, queued_at REAL NOT NULL, started_at REAL, "
+                "finished_at REAL, entry_count INTEGER, exit_count INTEGER, frames INTEGER, processing_fps REAL, "
+                "elapsed_s REAL, error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, queued_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS staged_events ("
+                "path TEXT NOT NULL, frame_index INTEGER NOT NULL, committed INTEGER NOT NULL DEFAULT 0, "
+                "time_offset REAL, event TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS staged_events_path ON staged_events (path, committed, frame_index)")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def add(self, path, size, mtime):
+        """Queue a file; True if it is new or changed since it was queued"""
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT size, mtime FROM jobs WHERE path = ?", (path,)).fetchone()
+                if row is not None and (row['size'], row['mtime']) == (size, mtime):
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (path, size, mtime, status, queued_at) VALUES (?, ?, ?, 'queued', ?)",
+                    (path, size, mtime, time.time())
+                )
+                return True
+        finally:
+            conn.close()
+
+    def claim(self, worker):
+        """Mark the oldest queued job as running for worker and return it, or None"""
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY queued_at LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 "
+                    "WHERE path = ?", (worker, time.time(), row['path'])
+                )
+            conn.execute("COMMIT")
+            return dict(row) if row is not None else None
+        finally:
+            conn.close()
+
+    def _update(self, path, **values):
+        conn = self._connect()
+        try:
+            with conn:
+                assignments = ", ".join(f"{name} = ?" for name in values)
+                conn.execute(f"UPDATE jobs SET {assignments} WHERE path = ?", (*values.values(), path))
+        finally:
+            conn.close()
+
+    def finish(self, path, result, elapsed):
+        self._update(path, status='done', finished_at=time.time(), entry_count=result['entry_count'],
+                     exit_count=result['exit_count'], frames=result['frames_processed'] + result['resumed_from_frame'],
+                     processing_fps=result['processing_fps'], elapsed_s=round(elapsed, 2), error=None)
+
+    def fail(self, path, error):
+        self._update(path, status='failed', finished_at=time.time(), error=error)
+
+    def requeue(self, path):
+        self._update(path, status='queued', worker=None)
+
+    def recover(self, retry_failed=False):
+        """Requeue jobs left running by a previous process (and failed ones if asked); returns how many"""
+        statuses = ('running', 'failed') if retry_failed else ('running',)
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(
+                    f"UPDATE jobs SET status = 'queued', worker = NULL WHERE status IN ({','.join('?' * len(statuses))})",
+                    statuses
+                ).rowcount
+        finally:
+            conn.close()
+
+    def stage(self, path, events):
+        """Keep crossing events of a file until it is committed"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT INTO staged_events (path, frame_index, event) VALUES (?, ?, ?)",
+                                 [(path, e.frame_index, json.dumps(e.to_dict())) for e in events])
+        finally:
+            conn.close()
+
+    def discard_staged(self, path, from_frame=0):
+        """Drop uncommitted events from from_frame on, which a resumed run emits again"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM staged_events WHERE path = ? AND committed = 0 AND frame_index >= ?",
+                             (path, from_frame))
+        finally:
+            conn.close()
+
+    def staged_events(self, path, committed=False):
+        """(events, time_offset) staged for path; committed ones carry the offset they were written with"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT event, time_offset FROM staged_events WHERE path = ? AND committed = ? ORDER BY frame_index",
+                (path, int(committed))
+            ).fetchall()
+        finally:
+            conn.close()
+        return [CrossingEvent(**json.loads(row['event'])) for row in rows], rows[0]['time_offset'] if rows else None
+
+    def commit_staged(self, path, time_offset):
+        """Mark the staged events as written to the stats database, replacing the previous commit"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM staged_events WHERE path = ? AND committed = 1", (path,))
+                conn.execute("UPDATE staged_events SET committed = 1, time_offset = ? WHERE path = ?",
+                             (time_offset, path))
+        finally:
+            conn.close()
+
+    def summary(self):
+        """Job count per status"""
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            conn.close()
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+    def jobs(self, status=None):
+        conn = self._connect()
+        try:
+            if status is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY queued_at").fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY queued_at", (status,)).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+
+class SharedModel:
+    """A loaded YOLO model used by several counters, one inference at a time
+
+    Decoding, tracking, embedding and event writing still run in parallel across
+    workers; only the detector call is serialised, which also keeps the model's
+    predictor state consistent between threads.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+            return self.model(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class StagedEventSink:
+    """Event sink that stages a file's crossings in the job store until the file is done"""
+
+    def __init__(self, jobs, path):
+        self.jobs = jobs
+        self.path = path
+
+    def write(self, events):
+        self.jobs.stage(self.path, events)
+
+    def close(self):
+        pass
+
+
+class BatchStopped(Exception):
+    """Raised inside process_video to interrupt a file when the runner stops"""
+
+
+def clip_start(path):
+    """Estimated recording start: NVRs close a clip when it ends, so mtime minus its duration"""
+    cap = cv2.VideoCapture(path)
+    fps, frames = cap.get(cv2.CAP_PROP_FPS), cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    duration = frames / fps if fps > 0 and frames > 0 else 0.0
+    return os.path.getmtime(path) - duration
+
+
+class BatchRunner:
+    """Queues clips from watch_dir and counts them with workers threads
+
+    Each file gets a fresh FootfallCounter (tracks and counts never leak between
+    files), but all counters share one SharedModel, so the detector is loaded once.
+    ByteTrack keeps its state inside the model, so with it every counter loads its own.
+    Files are queued once their mtime is settle_seconds old, so clips still being
+    written are left alone. Interrupted files resume from a per-file checkpoint.
+
+    Crossings reach stats_db only when a file is done: until then they are staged in
+    the job store, and events past the resume point are dropped before a retry emits
+    them again. A file queued again because it changed replaces its earlier counts.
+    """
+
+    def __init__(self, watch_dir, jobs_path=JOBS_PATH, workers=2, patterns=VIDEO_PATTERNS, recursive=False,
+                 counter_kwargs=None, output_dir=None, stats_db=None, checkpoint_dir=None,
+                 poll_interval=10.0, settle_seconds=30.0):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.jobs = JobStore(jobs_path)
+        self.workers = workers
+        self.patterns = patterns
+        self.recursive = recursive
+        self.counter_kwargs = counter_kwargs or {}
+        self.output_dir = output_dir
+        self.stats_db = stats_db
+        self.checkpoint_dir = checkpoint_dir or os.path.join(os.path.dirname(os.path.abspath(jobs_path)),
+                                                             'batch_checkpoints')
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.shared_model = None
+        self._model_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def scan(self):
+        """Queue new or changed files that have finished being written; returns how many"""
+        queued = 0
+        now = time.time()
+        for root, dirs, files in os.walk(self.watch_dir):
+            if not self.recursive:
+                dirs.clear()
+            for name in sorted(files):
+                if not any(fnmatch.fnmatch(name.lower(), pattern) for pattern in self.patterns):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime >= self.settle_seconds and self.jobs.add(path, stat.st_size, stat.st_mtime):
+                    queued += 1
+        return queued
+
+    def camera_id(self, path):
+        """Subdirectory name for watch_dir/<camera>/clip.mp4, the file name otherwise"""
+        relative = os.path.relpath(path, self.watch_dir)
+        parent = os.path.dirname(relative)
+        return parent.replace(os.sep, '/') if parent else os.path.splitext(relative)[0]
+
+    def _checkpoint_path(self, path):
+        return os.path.join(self.checkpoint_dir, hashlib.sha1(path.encode('utf-8')).hexdigest()[:16] + '.json')
+
+    def _resume_frame(self, path):
+        """Frame process_video resumes path from: its checkpoint's, if it is for this file"""
+        try:
+            with open(self._checkpoint_path(path), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get('source') == path and state.get('source_size') == os.path.getsize(path):
+            return state.get('frame_index', 0)
+        return 0
+
+    def _commit_stats(self, path):
+        """Write a finished file's staged events to stats_db in place of its previous ones"""
+        store = AggregationStore(self.stats_db, time_field='media_time')
+        try:
+            previous, store.time_offset = self.jobs.staged_events(path, committed=True)
+            if previous:
+                store.retract(previous)
+            events, _ = self.jobs.staged_events(path)
+            store.time_offset = clip_start(path)
+            store.write(events)
+        finally:
+            store.close()
+        self.jobs.commit_staged(path, store.time_offset)
+
+    def _create_counter(self, path):
+        camera_id = self.camera_id(path)
+        sinks = []
+        if self.stats_db:
+            sinks.append(StagedEventSink(self.jobs, path))
+        kwargs = dict(self.counter_kwargs, camera_id=camera_id, event_sinks=sinks)
+        if kwargs.get('tracker') == 'bytetrack':
+            return FootfallCounter(**kwargs)
+        with self._model_lock:
+            if self.shared_model is not None:
+                return FootfallCounter(model=self.shared_model, **kwargs)
+            counter = FootfallCounter(**kwargs)
+            self.shared_model = counter.model = SharedModel(counter.model)
+            return counter
+
+    def process(self, job, worker):
+        path = job['path']
+        print(f"🎬 [{worker}] {os.path.basename(path)} (attempt {job['attempts'] + 1})")
+        start = time.time()
+        counter = None
+        try:
+            if self.stats_db:
+                self.jobs.discard_staged(path, self._resume_frame(path))
+            counter = self._create_counter(path)
+            output_path = None
+            if self.output_dir:
+                # Mirror the watch directory, so clips with the same name from different cameras don't collide
+                relative = os.path.splitext(os.path.relpath(path, self.watch_dir))[0]
+                output_path = os.path.join(self.output_dir, relative + '_counted.mp4')
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            def check_stop(_status):
+                if self._stop.is_set():
+                    raise BatchStopped()
+
+            result = counter.process_video(path, output_path, show_heatmap=output_path is not None,
+                                           show_trajectories=output_path is not None, status_callback=check_stop,
+                                           checkpoint_path=self._checkpoint_path(path))
+        except BatchStopped:
+            # The final checkpoint is written, so the next run continues from here
+            self.jobs.requeue(path)
+            print(f"⏸️ [{worker}] {os.path.basename(path)} interrupted; it will resume")
+            return
+        except Exception as e:
+            self.jobs.fail(path, f"{type(e).__name__}: {e}")
+            print(f"❌ [{worker}] {os.path.basename(path)}: {e}")
+            return
+        finally:
+            if counter is not None:
+                counter.close()
+        if self.stats_db:
+            self._commit_stats(path)
+        self.jobs.finish(path, result, time.time() - start)
+        try:
+            os.remove(self._checkpoint_path(path))
+        except OSError:
+            pass
+        print(f"✅ [{worker}] {os.path.basename(path)}: {result['entry_count']} in / {result['exit_count']} out, "
+              f"{result['frames_processed']} frames @ {result['processing_fps']} FPS")
+
+    def _work(self, worker, watch):
+        while not self._stop.is_set():
+            job = self.jobs.claim(worker)
+            if job is None:
+                if not watch:
+                    return
+                self._stop.wait(1.0)
+                continue
+            self.process(job, worker)
+
+    def run(self, watch=True):
+        """Process the queue; with watch=True keep scanning for new files until stop()"""
+        recovered = self.jobs.recover()
+        if recovered:
+            print(f"♻️ Requeued {recovered} interrupted job(s)")
+        print(f"📂 Queued {self.scan()} new file(s) from {self.watch_dir}")
+        self._threads = [threading.Thread(target=self._work, args=(f"worker-{i + 1}", watch), daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                if self._stop.wait(self.poll_interval if watch else 1.0):
+                    break
+                if watch:
+                    queued = self.scan()
+                    if queued:
+                        print(f"📂 Queued {queued} new file(s)")
+        except KeyboardInterrupt:
+            print("🛑 Stopping; interrupted files will resume on the next run")
+        self.stop()
+        return self.jobs.summary()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def print_jobs(store):
+    print(f"{'Status':<8}{'In':>6}{'Out':>6}{'Frames':>9}{'FPS':>8}  File")
+    for job in store.jobs():
+        fps = f"{job['processing_fps']:.1f}" if job['processing_fps'] is not None else '-'
+        print(f"{job['status']:<8}{job['entry_count'] if job['entry_count'] is not None else '-':>6}"
+              f"{job['exit_count'] if job['exit_count'] is not None else '-':>6}"
+              f"{job['frames'] if job['frames'] is not None else '-':>9}{fps:>8}  {job['path']}"
+              + (f"  ({job['error']})" if job['error'] else ""))
+    print(", ".join(f"{status}: {count}" for status, count in store.summary().items()))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Count footfall in every clip dropped into a directory")
+    parser.add_argument('watch_dir', help="Directory to watch for video files")
+    parser.add_argument('--jobs', default=JOBS_PATH, help="SQLite job store")
+    parser.add_argument('--workers', type=int, default=2, help="Files processed at the same time")
+    parser.add_argument('--once', action='store_true', help="Process what is there now and exit")
+    parser.add_argument('--recursive', action='store_true', help="Also watch subdirectories (one per camera)")
+    parser.add_argument('--pattern', action='append', default=None,
+                        help=f"File name pattern (repeatable, default: {' '.join(VIDEO_PATTERNS)})")
+    parser.add_argument('--poll-interval', type=float, default=10.0, help="Seconds between directory scans")
+    parser.add_argument('--settle', type=float, default=30.0,
+                        help="Only queue files not modified for this many seconds (still being written)")
+    parser.add_argument('--output-dir', default=None, help="Also write annotated videos here")
+    parser.add_argument('--stats-db', default=None,
+                        help="Roll crossings up into this aggregation database, timed from each clip's start")
+    parser.add_argument('--retry-failed', action='store_true', help="Queue previously failed files again")
+    parser.add_argument('--status', action='store_true', help="Print the job table and exit")
+    parser.add_argument('--model', default='yolov8n.pt', help="YOLOv8 weights")
+    parser.add_argument('--backend', choices=['torch'] + list(EXPORT_SUFFIXES), default='torch')
+    parser.add_argument('--tracker', choices=TRACKERS, default='deepsort')
+    parser.add_argument('--imgsz', type=int, default=640, help="Inference image size")
+    parser.add_argument('--conf', type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument('--line-y', type=int, default=None, help="Counting line y position (default: frame middle)")
+    parser.add_argument('--skip-frames', type=int, default=0, help="Frames to skip between detections")
+    parser.add_argument('--cpu', action='store_true', help="Force CPU inference")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.status:
+        print_jobs(JobStore(args.jobs))
+        return 0
+    if not os.path.isdir(args.watch_dir):
+        print(f"No directory {args.watch_dir}")
+        return 2
+    runner = BatchRunner(
+        args.watch_dir, args.jobs, workers=args.workers, patterns=tuple(args.pattern or VIDEO_PATTERNS),
+        recursive=args.recursive, output_dir=args.output_dir, stats_db=args.stats_db,
+        poll_interval=args.poll_interval, settle_seconds=args.settle,
+        counter_kwargs={
+            'model_path': args.model, 'backend': args.backend, 'tracker': args.tracker, 'imgsz': args.imgsz,
+            'confidence_threshold': args.conf, 'roi_line_y': args.line_y, 'skip_frames': args.skip_frames,
+            'use_gpu': not args.cpu
+        }
+    )
+    if args.retry_failed:
+        print(f"♻️ Requeued {runner.jobs.recover(retry_failed=True)} failed job(s)")
+    summary = runner.run(watch=not args.once)
+    print("📋 " + ", ".join(f"{status}: {count}" for status, count in summary.items()))
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Footfall Counter Benchmark
+Runs FootfallCounter.process_video over the bundled sample videos under named
+configurations and compares the results against a stored baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+VIDEOS = ['sample video.mp4', 'Demo.mp4']
+
+# Counter kwargs ('counter') and process_video kwargs ('run') per configuration
+CONFIGS = {
+    'default': {'counter': {}, 'run': {}},
+    'skip2': {'counter': {'skip_frames': 2}, 'run': {}},
+    'no_heatmap': {'counter': {}, 'run': {'show_heatmap': False}},
+    'no_trajectories': {'counter': {}, 'run': {'show_trajectories': False}},
+    'no_overlays': {'counter': {}, 'run': {'show_heatmap': False, 'show_trajectories': False}},
+    'video_output': {'counter': {}, 'run': {'output_path': True}},
+    'no_embedding_cache': {'counter': {'embedding_cache': False}, 'run': {}},
+    'bytetrack': {'counter': {'tracker': 'bytetrack'}, 'run': {}},
+    'onnx': {'counter': {'backend': 'onnx'}, 'run': {}},
+    'tiled': {'counter': {'tile_size': 640}, 'run': {}},
+    'decode_process': {'counter': {}, 'run': {'decode_process': True}},
+    # Run twice: the first run records the cache, the second replays it
+    'detection_cache': {'counter': {}, 'run': {'detection_cache': True}},
+    # Per-stream torch/OpenCV/decode thread split (threads.ThreadBudget); compare with --concurrent N
+    'thread_budget': {'counter': {}, 'run': {}, 'threads': {}},
+    'thread_budget_pinned': {'counter': {}, 'run': {}, 'threads': {'pin': True}},
+}
+DEFAULT_CONFIGS = ['default', 'skip2', 'no_overlays', 'video_output', 'bytetrack']
+
+# Relative slowdown / memory growth tolerated before a result is flagged
+FPS_TOLERANCE = 0.10
+RSS_TOLERANCE = 0.20
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except (ImportError, AttributeError):
+            return None
+
+
+def track_frame_allocations(counter):
+    """Record the transient allocation peak of every process_frame call
+
+    tracemalloc sees NumPy and OpenCV-returned arrays, so this approximates the
+    short-lived memory the frame loop churns through. It slows processing down, so
+    FPS from such runs is not comparable with normal runs.
+    """
+    samples = []
+    process_frame = counter.process_frame
+    tracemalloc.start()
+
+    def measured(*args, **kwargs):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = process_frame(*args, **kwargs)
+        samples.append(tracemalloc.get_traced_memory()[1] - before)
+        return result
+
+    counter.process_frame = measured
+    return samples
+
+
+def run_one(video, config_name, model, max_frames, use_gpu, measure_alloc=False, streams=1, stream_index=0):
+    """Run a single video/config pair in this process and return its result record"""
+    from footfall_counter import FootfallCounter
+    from threads import ThreadBudget, thread_report
+
+    config = CONFIGS[config_name]
+    if 'threads' in config:
+        import torch
+        ThreadBudget(streams, stream_index, gpu=use_gpu and torch.cuda.is_available(), **config['threads']).apply()
+    run_kwargs = dict(config['run'])
+    output_path = None
+    if run_kwargs.pop('output_path', False):
+        output_path = os.path.join(tempfile.mkdtemp(prefix='footfall_bench_'), 'output.mp4')
+
+    load_start = time.perf_counter()
+    counter = FootfallCounter(model_path=model, use_gpu=use_gpu, **config['counter'])
+    load_time = time.perf_counter() - load_start
+    alloc_samples = track_frame_allocations(counter) if measure_alloc else None
+
+    try:
+        result = counter.process_video(video, output_path, max_frames=max_frames, **run_kwargs)
+    finally:
+        counter.close()
+        if output_path and os.path.exists(output_path):
+            os.remove(output_path)
+
+    record = {
+        'video': video,
+        'config': config_name,
+        'device': counter.device,
+        'frames': result['frames_processed'],
+        'fps': result['processing_fps'],
+        'model_load_s': round(load_time, 2),
+        'peak_rss_mb': peak_rss_mb(),
+        'entry_count': result['entry_count'],
+        'exit_count': result['exit_count'],
+        'stages': result['metrics']['stages'],
+        'gauges': result['metrics']['gauges'],
+        'encoder': result['encoder'],
+        'threads': thread_report()
+    }
+    if alloc_samples:
+        tracemalloc.stop()
+        mean_bytes = sum(alloc_samples) / len(alloc_samples)
+        record['alloc_mb_per_frame'] = round(mean_bytes / (1024 * 1024), 3)
+        record['alloc_mb_per_s_at_30fps'] = round(mean_bytes * 30 / (1024 * 1024), 1)
+        record['render_buffer_allocations'] = counter.render_buffer_allocations
+    return record
+
+
+def run_isolated(video, config_name, args):
+    """Run one benchmark in a fresh interpreter so peak RSS and warm caches don't leak between runs
+
+    With --concurrent N, N interpreters run the same benchmark at once, as N cameras on one
+    machine would; the record then reports their combined FPS.
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', config_name, '--videos', video,
+               '--model', args.model, '--concurrent', str(args.concurrent)]
+    if args.max_frames:
+        command += ['--max-frames', str(args.max_frames)]
+    if args.cpu:
+        command.append('--cpu')
+    if args.measure_alloc:
+        command.append('--measure-alloc')
+    processes = [subprocess.Popen(command + ['--stream-index', str(i)], stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, text=True) for i in range(args.concurrent)]
+    records = []
+    for process in processes:
+        stdout, stderr = process.communicate()
+        result = next((json.loads(line[len('BENCH_RESULT '):]) for line in stdout.splitlines()
+                       if line.startswith('BENCH_RESULT ')), None)
+        if result is None:
+            return {'video': video, 'config': config_name, 'error': (stderr.strip().splitlines() or ['failed'])[-1]}
+        records.append(result)
+    if args.concurrent == 1:
+        return records[0]
+    return dict(records[0], fps=round(sum(r['fps'] for r in records), 2), concurrent=args.concurrent,
+                stream_fps=[r['fps'] for r in records], frames=sum(r['frames'] for r in records),
+                peak_rss_mb=max((r['peak_rss_mb'] or 0) for r in records) or None)
+
+
+def environment():
+    info = {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['cuda'] = torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+    except ImportError:
+        pass
+    try:
+        import cv2
+        info['opencv'] = cv2.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def compare(results, baseline):
+    """List of regression messages against a baseline results file"""
+    expected = {(r['video'], r['config']): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for r in results:
+        base = expected.get((r['video'], r['config']))
+        if base is None:
+            continue
+        name = f"{r['config']} / {r['video']}"
+        if 'error' in r:
+            regressions.append(f"{name}: run failed ({r['error']})")
+            continue
+        if r.get('concurrent', 1) != base.get('concurrent', 1):
+            continue
+        # tracemalloc runs are much slower, so only compare speed between runs of the same kind
+        same_kind = ('alloc_mb_per_frame' in r) == ('alloc_mb_per_frame' in base)
+        if same_kind and base['fps'] and r['fps'] < base['fps'] * (1 - FPS_TOLERANCE):
+            regressions.append(f"{name}: {r['fps']} FPS vs baseline {base['fps']} FPS")
+        if base.get('peak_rss_mb') and r.get('peak_rss_mb') and r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + RSS_TOLERANCE):
+            regressions.append(f"{name}: peak RSS {r['peak_rss_mb']} MB vs baseline {base['peak_rss_mb']} MB")
+        if base.get('alloc_mb_per_frame') and r.get('alloc_mb_per_frame') is not None and \
+                r['alloc_mb_per_frame'] > base['alloc_mb_per_frame'] * (1 + RSS_TOLERANCE):
+            regressions.append(f"{name}: {r['alloc_mb_per_frame']} MB allocated/frame vs baseline "
+                               f"{base['alloc_mb_per_frame']} MB")
+        if base['frames'] == r['frames'] and (r['entry_count'], r['exit_count']) != (base['entry_count'], base['exit_count']):
+            regressions.append(f"{name}: counts {r['entry_count']}/{r['exit_count']} vs baseline "
+                               f"{base['entry_count']}/{base['exit_count']}")
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'Config':<18}{'Video':<20}{'FPS':>8}{'RSS MB':>9}{'In':>5}{'Out':>5}  Slowest stages")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['config']:<18}{r['video']:<20}  ERROR: {r['error']}")
+            continue
+        stages = sorted(r['stages'].items(), key=lambda item: item[1]['mean_ms'], reverse=True)[:3]
+        slowest = ', '.join(f"{name} {s['p50_ms']:.1f}ms" for name, s in stages)
+        print(f"{r['config']:<18}{r['video'][:19]:<20}{r['fps']:>8.1f}{r['peak_rss_mb'] or 0:>9.0f}"
+              f"{r['entry_count']:>5}{r['exit_count']:>5}  {slowest}")
+        if r.get('concurrent'):
+            print(f"{'':<18}{r['concurrent']} concurrent streams: " + ", ".join(f"{fps:.1f}" for fps in r['stream_fps'])
+                  + " FPS each")
+        threads = r.get('threads')
+        if threads:
+            print(f"{'':<18}threads: torch {threads.get('torch_threads')}, OpenCV {threads['opencv_threads']}, "
+                  f"decode {threads['decode_threads'] or 'auto'} on {threads['allowed_cores']} cores")
+        if 'alloc_mb_per_frame' in r:
+            print(f"{'':<18}allocations: {r['alloc_mb_per_frame']} MB/frame "
+                  f"(~{r['alloc_mb_per_s_at_30fps']} MB/s at 30 FPS)")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the footfall counter on the bundled videos")
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=DEFAULT_CONFIGS)
+    parser.add_argument('--videos', nargs='+', default=VIDEOS)
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--max-frames', type=int, default=None, help="Limit frames per run")
+    parser.add_argument('--cpu', action='store_true', help="Force CPU inference")
+    parser.add_argument('--measure-alloc', action='store_true',
+                        help="Measure per-frame transient allocations with tracemalloc (slows runs down)")
+    parser.add_argument('--concurrent', type=int, default=1,
+                        help="Run N copies of each benchmark at once and report their combined FPS")
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'results.json'), help="Results JSON path")
+    parser.add_argument('--baseline', default=os.path.join('benchmarks', 'baseline.json'), help="Baseline JSON path")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--run-one', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--stream-index', type=int, default=0, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if args.run_one:
+        result = run_one(args.videos[0], args.run_one, args.model, args.max_frames, not args.cpu, args.measure_alloc,
+                         args.concurrent, args.stream_index)
+        print('BENCH_RESULT ' + json.dumps(result))
+        return 0
+
+    results = []
+    for video in args.videos:
+        for config_name in args.configs:
+            print(f"⏱️ {config_name} / {video} ...")
+            results.append(run_isolated(video, config_name, args))
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+              'max_frames': args.max_frames, 'concurrent': args.concurrent, 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(results)
+    print(f"\n💾 Results saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline updated: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for message in regressions:
+                print(f"  • {message}")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
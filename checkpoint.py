@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Counter Checkpoints
+Periodic, atomic JSON snapshots of counter state written on a background thread
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class CheckpointManager:
+    """Snapshots counts, counted IDs and frame position so long jobs can resume"""
+
+    def __init__(self, path, interval=30.0):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.monotonic()
+        self.saves = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def maybe_save(self, counter):
+        """Called every frame; snapshots only once per interval"""
+        now = time.monotonic()
+        if now - self.last_save < self.interval:
+            return
+        self.last_save = now
+        self.save(counter.get_state())
+
+    def save(self, state):
+        """Queue a snapshot; a newer snapshot replaces one not yet written"""
+        with self._lock:
+            self._pending = state
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                state, self._pending = self._pending, None
+            if state is not None:
+                try:
+                    self._write(state)
+                except OSError as e:
+                    print(f"⚠️ Checkpoint write failed: {e}")
+            # close() may queue the final snapshot while an earlier one is being written
+            with self._lock:
+                if self._stopped and self._pending is None:
+                    return
+
+    def _write(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers see either the previous or the new checkpoint, never a partial one
+        os.replace(tmp_path, self.path)
+        self.saves += 1
+
+    def load(self):
+        """Return the last checkpoint, or None if there is no readable one"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def close(self, final_state=None):
+        """Write the final snapshot (if any) and stop the writer thread"""
+        if final_state is not None:
+            self.save(final_state)
+        with self._lock:
+            self._stopped = True
+        self._wake.set()
+        self._thread.join()
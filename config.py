@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Performance Config
+Persisted device, precision, frame-skip, inference-size, tracker and backend settings
+passed through to FootfallCounter
+"""
+
+import json
+import os
+from dataclasses import dataclass, asdict, fields
+
+from footfall_counter import TRACKERS, EXPORT_SUFFIXES
+
+CONFIG_PATH = 'footfall_config.json'
+DEVICES = ('auto', 'cpu')
+BACKENDS = ('torch',) + tuple(EXPORT_SUFFIXES)
+IMAGE_SIZES = (320, 416, 480, 640, 800, 960, 1280)
+
+
+@dataclass
+class PerformanceConfig:
+    """Counter performance settings; 'auto' uses CUDA when it is available"""
+    model: str = 'yolov8n.pt'
+    device: str = 'auto'
+    half_precision: bool = False
+    skip_frames: int = 2
+    imgsz: int = 640
+    tracker: str = 'deepsort'
+    backend: str = 'torch'
+    target_fps: float = 15.0  # live streams only; 0 disables adaptive quality
+
+    def validate(self):
+        """List of problems; load() replaces invalid values with the defaults"""
+        problems = []
+        if self.device not in DEVICES:
+            problems.append(('device', f"unknown device {self.device!r}"))
+        if self.tracker not in TRACKERS:
+            problems.append(('tracker', f"unknown tracker {self.tracker!r}"))
+        if self.backend not in BACKENDS:
+            problems.append(('backend', f"unknown backend {self.backend!r}"))
+        if not isinstance(self.skip_frames, int) or self.skip_frames < 0:
+            problems.append(('skip_frames', f"skip_frames must be a non-negative integer, not {self.skip_frames!r}"))
+        if not isinstance(self.imgsz, int) or self.imgsz < 32 or self.imgsz % 32:
+            problems.append(('imgsz', f"imgsz must be a positive multiple of 32, not {self.imgsz!r}"))
+        if not isinstance(self.target_fps, (int, float)) or self.target_fps < 0:
+            problems.append(('target_fps', f"target_fps must be >= 0, not {self.target_fps!r}"))
+        return problems
+
+    def counter_kwargs(self):
+        """Keyword arguments for FootfallCounter"""
+        return {
+            'model_path': self.model, 'use_gpu': self.device != 'cpu', 'half_precision': self.half_precision,
+            'skip_frames': self.skip_frames, 'imgsz': self.imgsz, 'tracker': self.tracker, 'backend': self.backend
+        }
+
+    @classmethod
+    def load(cls, path=CONFIG_PATH):
+        """Settings from path; missing files, unknown keys and invalid values fall back to defaults"""
+        config = cls()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except OSError:
+            return config
+        except ValueError as e:
+            print(f"⚠️ Ignoring unreadable config {path}: {e}")
+            return config
+        names = {f.name for f in fields(cls)}
+        config = cls(**{k: v for k, v in data.items() if k in names})
+        defaults = cls()
+        for name, problem in config.validate():
+            print(f"⚠️ {path}: {problem}, using {getattr(defaults, name)!r}")
+            setattr(config, name, getattr(defaults, name))
+        return config
+
+    def save(self, path=CONFIG_PATH):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, indent=2)
+        os.replace(tmp_path, path)
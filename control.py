@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Control Socket
+Local JSON-lines TCP endpoint for reconfiguring a running counter (counting line,
+zones, confidence, skip rate, heatmap and overlay options) without restarting it
+"""
+
+import argparse
+import json
+import socket
+import socketserver
+import sys
+import threading
+
+from preview import counter_stats
+
+
+def handle_command(counter, command):
+    """Reply dict for one decoded command
+
+    {"configure": {...}} queues settings for the next frame (see FootfallCounter.configure);
+    {"get": true}, or any command, also returns the current settings and counts.
+    """
+    if counter is None:
+        return {'ok': False, 'error': 'No counter is running'}
+    if not isinstance(command, dict):
+        return {'ok': False, 'error': 'Expected a JSON object'}
+    reply = {'ok': True}
+    if 'configure' in command:
+        if not isinstance(command['configure'], dict):
+            return {'ok': False, 'error': 'configure expects an object of settings'}
+        try:
+            reply['queued'] = counter.configure(**command['configure'])
+        except ValueError as e:
+            return {'ok': False, 'error': str(e)}
+    reply['settings'] = counter.current_config()
+    reply['stats'] = dict(counter_stats(counter), zone_counts=counter.zone_counts)
+    return reply
+
+
+class ControlTCPServer(socketserver.ThreadingTCPServer):
+    """Rebinds right after a restart and doesn't wait for open connections on exit"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ControlServer:
+    """Answers one JSON line per JSON line received, from a background thread
+
+    counter is a FootfallCounter, or a callable returning the current one (None while
+    idle), so the GUI can keep one server across streams. Bind to localhost only: anyone
+    who can connect can move the counting line.
+    """
+
+    def __init__(self, counter, port=9109, host='127.0.0.1'):
+        get_counter = counter if callable(counter) else (lambda: counter)
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        reply = handle_command(get_counter(), json.loads(line))
+                    except ValueError as e:
+                        reply = {'ok': False, 'error': f"Invalid JSON: {e}"}
+                    self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+        self.server = ControlTCPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🎛️ Control socket at {self.server.server_address[0]}:{self.port}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def send(command, port=9109, host='127.0.0.1', timeout=5.0):
+    """Send one command to a ControlServer and return its reply"""
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.sendall(json.dumps(command).encode() + b'\n')
+        with conn.makefile('rb') as replies:
+            return json.loads(replies.readline())
+
+
+def parse_assignment(text):
+    """'name=value' -> (name, value); values are JSON where possible ('none' for null)"""
+    name, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected name=value, not {text!r}")
+    if value.lower() == 'none':
+        return name, None
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Reconfigure a running footfall counter")
+    parser.add_argument('settings', nargs='*', type=parse_assignment,
+                        help="Settings to change, e.g. roi_line_y=420 confidence_threshold=0.4 "
+                             "'zones={\"door\": [[0, 0], [200, 0], [200, 300]]}'; none prints the current ones")
+    parser.add_argument('--port', type=int, default=9109, help="Control port (--control-port of the counter)")
+    parser.add_argument('--host', default='127.0.0.1')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    command = {'configure': dict(args.settings)} if args.settings else {'get': True}
+    try:
+        reply = send(command, args.port, args.host)
+    except OSError as e:
+        print(f"❌ Could not reach the counter on {args.host}:{args.port}: {e}")
+        return 2
+    print(json.dumps(reply, indent=2))
+    return 0 if reply.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
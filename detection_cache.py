@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Detection Cache
+On-disk per-frame YOLO detections keyed by video content, model and detector settings,
+stored as memory-mapped NumPy arrays so re-runs can skip inference entirely
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+CACHE_DIR = '.detection_cache'
+SAMPLE_CHUNKS = 16
+CHUNK_SIZE = 1 << 20
+
+
+def video_fingerprint(path):
+    """Content hash from the file size and evenly spaced 1 MB chunks
+
+    Sampling keeps hashing multi-GB recordings to a few milliseconds while still
+    changing whenever the footage does (re-encodes, trims, different clips).
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_CHUNKS * CHUNK_SIZE:
+            digest.update(f.read())
+        else:
+            step = (size - CHUNK_SIZE) // (SAMPLE_CHUNKS - 1)
+            for i in range(SAMPLE_CHUNKS):
+                f.seek(i * step)
+                digest.update(f.read(CHUNK_SIZE))
+    return digest.hexdigest()
+
+
+def cache_key(video_path, signature):
+    """Cache key for a video and a detector signature (model, confidence, imgsz, ...)"""
+    payload = json.dumps({'video': video_fingerprint(video_path), **signature}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class DetectionCache:
+    """Per-frame boxes and scores for one video/detector combination
+
+    Layout: boxes.npy (N, 5) float32 rows of x1, y1, x2, y2, conf; offsets.npy (F + 1)
+    int64 so frame i owns rows offsets[i]:offsets[i + 1]; valid.npy (F,) uint8 marking
+    frames that were actually detected (skipped frames have no entry).
+    """
+
+    def __init__(self, path, boxes, offsets, valid, meta):
+        self.path = path
+        self.boxes = boxes
+        self.offsets = offsets
+        self.valid = valid
+        self.meta = meta
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, video_path, signature, cache_dir=CACHE_DIR):
+        """Memory-map an existing cache, or return None"""
+        path = os.path.join(cache_dir, cache_key(video_path, signature))
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode='r')
+        return cls(path, load('boxes.npy'), load('offsets.npy'), load('valid.npy'), meta)
+
+    def get(self, frame_index):
+        """(k, 5) array for a frame, or None if that frame was never detected"""
+        if frame_index >= len(self.valid) or not self.valid[frame_index]:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.boxes[self.offsets[frame_index]:self.offsets[frame_index + 1]]
+
+
+class DetectionCacheWriter:
+    """Collects detections during a run and writes the cache atomically at the end"""
+
+    def __init__(self, video_path, signature, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, cache_key(video_path, signature))
+        self.meta = {'video': os.path.basename(video_path), **signature}
+        self.frames = {}
+
+    def add(self, frame_index, boxes):
+        self.frames[frame_index] = np.asarray(boxes, dtype=np.float32).reshape(-1, 5)
+
+    def finalize(self):
+        """Write boxes/offsets/valid arrays; only call after a complete run"""
+        if not self.frames:
+            return None
+        num_frames = max(self.frames) + 1
+        counts = np.zeros(num_frames, dtype=np.int64)
+        valid = np.zeros(num_frames, dtype=np.uint8)
+        for index, boxes in self.frames.items():
+            counts[index] = len(boxes)
+            valid[index] = 1
+        offsets = np.zeros(num_frames + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        ordered = [self.frames[i] for i in sorted(self.frames)]
+        boxes = np.concatenate(ordered) if ordered else np.zeros((0, 5), dtype=np.float32)
+
+        tmp_path = self.path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, 'boxes.npy'), boxes)
+        np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+        np.save(os.path.join(tmp_path, 'valid.npy'), valid)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(dict(self.meta, frames=num_frames, detections=int(len(boxes))), f, indent=2)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(tmp_path, self.path)
+        return self.path
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Cached Appearance Embeddings
+Batched DeepSORT embeddings with per-track reuse while a person's box barely moves
+"""
+
+import numpy as np
+
+
+def ltwh_to_ltrb(boxes):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) ltrb boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class CachedEmbedder:
+    """Computes DeepSORT appearance embeddings in one batch and reuses them per track
+
+    A detection reuses its track's cached embedding while its box keeps an IoU of at
+    least iou_threshold with the box the embedding was computed on, for at most
+    refresh_interval frames. Everything else is cropped and embedded in a single
+    batched call to the tracker's embedder.
+    """
+
+    def __init__(self, tracker, iou_threshold=0.9, refresh_interval=10):
+        self.tracker = tracker
+        self.iou_threshold = iou_threshold
+        self.refresh_interval = refresh_interval
+        # track_id -> {'box': ltrb the embedding was computed on, 'embed': vector, 'age': frames}
+        self.cache = {}
+        self.computed = 0
+        self.reused = 0
+
+    def embed(self, frame, detections):
+        """Embeddings aligned with detections, plus the cached track ID each one came from"""
+        embeds = [None] * len(detections)
+        sources = [None] * len(detections)
+        candidates = [(track_id, entry) for track_id, entry in self.cache.items() if entry['age'] < self.refresh_interval]
+        if detections and candidates:
+            det_boxes = ltwh_to_ltrb([d[0] for d in detections])
+            cached_boxes = np.array([entry['box'] for _, entry in candidates], dtype=np.float32)
+            ious = iou_matrix(det_boxes, cached_boxes)
+            # Greedy assignment, best overlaps first
+            for flat in np.argsort(-ious, axis=None):
+                i, j = np.unravel_index(flat, ious.shape)
+                if ious[i, j] < self.iou_threshold:
+                    break
+                if sources[i] is None and candidates[j][1] is not None:
+                    track_id, entry = candidates[j]
+                    embeds[i] = entry['embed']
+                    sources[i] = track_id
+                    candidates[j] = (track_id, None)
+
+        missing = [i for i, embed in enumerate(embeds) if embed is None]
+        if missing:
+            crops, _ = self.tracker.crop_bb(frame, [detections[i] for i in missing])
+            for i, embed in zip(missing, self.tracker.embedder.predict(crops)):
+                embeds[i] = embed
+        self.computed += len(missing)
+        self.reused += len(detections) - len(missing)
+        return embeds, sources
+
+    def update(self, tracks, detections, embeds, sources):
+        """Refresh the cache from the tracks matched in this frame"""
+        live_ids = set()
+        for track in tracks:
+            live_ids.add(track.track_id)
+            if track.time_since_update > 0:
+                continue
+            det_index = track.get_det_supplementary()
+            if det_index is None:
+                continue
+            source = sources[det_index]
+            if source is not None and source in self.cache:
+                entry = dict(self.cache[source])
+                entry['age'] += 1
+            else:
+                box = ltwh_to_ltrb(detections[det_index][0])[0]
+                entry = {'box': box, 'embed': embeds[det_index], 'age': 0}
+            self.cache[track.track_id] = entry
+        for track_id in list(self.cache):
+            if track_id not in live_ids:
+                del self.cache[track_id]
+
+    def reuse_ratio(self):
+        total = self.computed + self.reused
+        return self.reused / total if total else 0.0
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Count Accuracy Evaluation
+Runs the counter over videos with ground-truth crossing annotations and reports
+crossing precision/recall, count error and throughput, checked against an accuracy budget
+
+Ground-truth format (one JSON file per video, e.g. ground_truth/sample video.json):
+
+    {
+      "video": "sample video.mp4",
+      "roi_line_y": null,
+      "crossings": [
+        {"frame": 152, "direction": "entry"},
+        {"frame": 310, "direction": "exit"}
+      ]
+    }
+
+"frame" is the 0-based frame index at which the person's centroid crosses the line.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+from benchmark import CONFIGS
+from events import ListSink
+
+GROUND_TRUTH_DIR = 'ground_truth'
+
+# Default accuracy budget a speed feature must stay within
+MIN_PRECISION = 0.90
+MIN_RECALL = 0.90
+MAX_COUNT_ERROR = 0.10
+
+
+def load_ground_truth(path):
+    with open(path) as f:
+        truth = json.load(f)
+    for crossing in truth['crossings']:
+        if crossing['direction'] not in ('entry', 'exit'):
+            raise ValueError(f"{path}: invalid direction {crossing['direction']!r}")
+    return truth
+
+
+def match_crossings(predicted, truth, tolerance=15):
+    """Greedy one-to-one matching of (frame, direction) pairs within +/- tolerance frames"""
+    pairs = []
+    for i, p in enumerate(predicted):
+        for j, t in enumerate(truth):
+            distance = abs(p['frame'] - t['frame'])
+            if p['direction'] == t['direction'] and distance <= tolerance:
+                pairs.append((distance, i, j))
+    used_predicted, used_truth = set(), set()
+    for _, i, j in sorted(pairs):
+        if i not in used_predicted and j not in used_truth:
+            used_predicted.add(i)
+            used_truth.add(j)
+    return len(used_predicted)
+
+
+def score(predicted, truth, tolerance=15):
+    matched = match_crossings(predicted, truth, tolerance)
+    gt_entries = sum(1 for t in truth if t['direction'] == 'entry')
+    gt_exits = len(truth) - gt_entries
+    entries = sum(1 for p in predicted if p['direction'] == 'entry')
+    exits = len(predicted) - entries
+    count_error = abs(entries - gt_entries) + abs(exits - gt_exits)
+    return {
+        'true_positives': matched,
+        'predicted': len(predicted),
+        'ground_truth': len(truth),
+        'precision': round(matched / len(predicted), 4) if predicted else (1.0 if not truth else 0.0),
+        'recall': round(matched / len(truth), 4) if truth else 1.0,
+        'entries': entries, 'exits': exits, 'gt_entries': gt_entries, 'gt_exits': gt_exits,
+        'count_error': count_error,
+        'relative_count_error': round(count_error / len(truth), 4) if truth else float(count_error > 0)
+    }
+
+
+def run_counter(video, config_name='default', model='yolov8n.pt', roi_line_y=None, use_gpu=True, counter_kwargs=None):
+    """Process a video without rendering and return (crossings, process_video result)"""
+    from footfall_counter import FootfallCounter
+
+    config = CONFIGS[config_name]
+    run_kwargs = {k: v for k, v in config['run'].items() if k != 'output_path'}
+    sink = ListSink()
+    counter = FootfallCounter(model_path=model, roi_line_y=roi_line_y, use_gpu=use_gpu,
+                              event_sinks=[sink], **dict(config['counter'], **(counter_kwargs or {})))
+    try:
+        result = counter.process_video(video, None, **run_kwargs)
+    finally:
+        counter.close()
+    crossings = [{'frame': e.frame_index, 'direction': e.direction} for e in sink.events]
+    return crossings, result
+
+
+def evaluate(truth_path, config_name='default', model='yolov8n.pt', tolerance=15, use_gpu=True):
+    truth = load_ground_truth(truth_path)
+    video = truth.get('video') or os.path.splitext(os.path.basename(truth_path))[0] + '.mp4'
+    if not os.path.isabs(video) and not os.path.exists(video):
+        video = os.path.join(os.path.dirname(truth_path), video)
+    predicted, result = run_counter(video, config_name, model, truth.get('roi_line_y'), use_gpu)
+    report = score(predicted, truth['crossings'], tolerance)
+    report.update({'video': os.path.basename(video), 'config': config_name, 'fps': result['processing_fps'],
+                   'frames': result['frames_processed']})
+    return report
+
+
+def within_budget(report, min_precision=MIN_PRECISION, min_recall=MIN_RECALL, max_count_error=MAX_COUNT_ERROR):
+    failures = []
+    if report['precision'] < min_precision:
+        failures.append(f"precision {report['precision']:.3f} < {min_precision}")
+    if report['recall'] < min_recall:
+        failures.append(f"recall {report['recall']:.3f} < {min_recall}")
+    if report['relative_count_error'] > max_count_error:
+        failures.append(f"count error {report['relative_count_error']:.3f} > {max_count_error}")
+    return failures
+
+
+def write_template(video, output_path, model='yolov8n.pt', roi_line_y=None, use_gpu=True):
+    """Draft ground truth from the counter's own crossings, to be reviewed and corrected by hand"""
+    crossings, _ = run_counter(video, 'default', model, roi_line_y, use_gpu)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({'video': os.path.relpath(video, os.path.dirname(os.path.abspath(output_path))),
+                   'roi_line_y': roi_line_y, 'crossings': crossings}, f, indent=2)
+    print(f"📝 Draft ground truth with {len(crossings)} crossings written to {output_path} - review before use")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Evaluate count accuracy against ground-truth crossings")
+    parser.add_argument('truth', nargs='*', help=f"Ground-truth JSON files (default: {GROUND_TRUTH_DIR}/*.json)")
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=['default'])
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--cpu', action='store_true', help="Force CPU inference")
+    parser.add_argument('--tolerance', type=int, default=15, help="Frame tolerance when matching crossings")
+    parser.add_argument('--min-precision', type=float, default=MIN_PRECISION)
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL)
+    parser.add_argument('--max-count-error', type=float, default=MAX_COUNT_ERROR,
+                        help="Maximum relative count error (|entries| + |exits| error / true crossings)")
+    parser.add_argument('--output', default=None, help="Write the evaluation as JSON")
+    parser.add_argument('--write-template', metavar='VIDEO', default=None,
+                        help="Write a draft ground-truth file for VIDEO from the current counter")
+    parser.add_argument('--line-y', type=int, default=None, help="Counting line for --write-template")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if args.write_template:
+        stem = os.path.splitext(os.path.basename(args.write_template))[0]
+        write_template(args.write_template, os.path.join(GROUND_TRUTH_DIR, stem + '.json'),
+                       args.model, args.line_y, not args.cpu)
+        return 0
+
+    truth_files = args.truth or sorted(glob.glob(os.path.join(GROUND_TRUTH_DIR, '*.json')))
+    if not truth_files:
+        print(f"No ground-truth files found in {GROUND_TRUTH_DIR}/ (see --write-template)")
+        return 2
+
+    reports = []
+    failed = False
+    print(f"{'Config':<18}{'Video':<22}{'Prec':>7}{'Recall':>8}{'CntErr':>8}{'FPS':>8}  Budget")
+    for truth_path in truth_files:
+        for config_name in args.configs:
+            report = evaluate(truth_path, config_name, args.model, args.tolerance, not args.cpu)
+            report['budget_failures'] = within_budget(report, args.min_precision, args.min_recall, args.max_count_error)
+            failed = failed or bool(report['budget_failures'])
+            reports.append(report)
+            verdict = '✅' if not report['budget_failures'] else '❌ ' + '; '.join(report['budget_failures'])
+            print(f"{config_name:<18}{report['video'][:21]:<22}{report['precision']:>7.3f}{report['recall']:>8.3f}"
+                  f"{report['relative_count_error']:>8.3f}{report['fps']:>8.1f}  {verdict}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
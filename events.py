@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Crossing Events
+Structured per-crossing events with pluggable sinks (JSONL, CSV, SQLite, in-memory)
+written in batches on a background thread
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict, fields
+from queue import Queue, Empty, Full
+
+
+@dataclass
+class CrossingEvent:
+    """A single line crossing by a tracked person"""
+    camera_id: str
+    line: str
+    frame_index: int
+    media_time: float
+    wall_time: float
+    track_id: str
+    direction: str
+    confidence: float
+
+    def to_dict(self):
+        return asdict(self)
+
+
+EVENT_FIELDS = [f.name for f in fields(CrossingEvent)]
+
+
+class JSONLSink:
+    """Appends one JSON object per event"""
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def write(self, events):
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(''.join(json.dumps(e.to_dict()) + '\n' for e in events))
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CSVSink:
+    """Appends events as CSV rows, writing a header for new files"""
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.writer = None
+
+    def write(self, events):
+        if self.file is None:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self.file = open(self.path, 'a', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=EVENT_FIELDS)
+            if new_file:
+                self.writer.writeheader()
+        self.writer.writerows(e.to_dict() for e in events)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SQLiteSink:
+    """Inserts events into a SQLite table, one transaction per batch"""
+    def __init__(self, path, table='crossings'):
+        self.path = path
+        self.table = table
+        self.conn = None
+
+    def _connect(self):
+        # Opened lazily so the connection belongs to the writer thread
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "camera_id TEXT, line TEXT, frame_index INTEGER, media_time REAL, wall_time REAL, "
+            "track_id TEXT, direction TEXT, confidence REAL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_wall_time ON {self.table} (wall_time)")
+
+    def write(self, events):
+        if self.conn is None:
+            self._connect()
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO {self.table} ({', '.join(EVENT_FIELDS)}) VALUES ({', '.join('?' * len(EVENT_FIELDS))})",
+                [tuple(getattr(e, name) for name in EVENT_FIELDS) for e in events]
+            )
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class ListSink:
+    """Keeps events in memory"""
+    def __init__(self):
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+    def close(self):
+        pass
+
+
+class MinuteHistogramSink:
+    """Per-minute entry/exit counts, keyed by wall-clock or media time"""
+    def __init__(self, time_field='wall_time', bucket_seconds=60):
+        self.time_field = time_field
+        self.bucket_seconds = bucket_seconds
+        self.buckets = defaultdict(lambda: {'entry': 0, 'exit': 0})
+        self.lock = threading.Lock()
+
+    def write(self, events):
+        with self.lock:
+            for e in events:
+                timestamp = getattr(e, self.time_field)
+                if timestamp is None:
+                    timestamp = e.wall_time
+                bucket = int(timestamp // self.bucket_seconds) * self.bucket_seconds
+                self.buckets[bucket][e.direction] += 1
+
+    def histogram(self):
+        """Sorted list of (bucket_start, entries, exits)"""
+        with self.lock:
+            return [(start, counts['entry'], counts['exit']) for start, counts in sorted(self.buckets.items())]
+
+    def close(self):
+        pass
+
+
+def create_sink(path):
+    """Pick a sink from the file extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jsonl', '.json', '.ndjson'):
+        return JSONLSink(path)
+    if ext == '.csv':
+        return CSVSink(path)
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteSink(path)
+    raise ValueError(f"Unsupported event sink extension: {ext}")
+
+
+class EventWriter:
+    """Buffers events and hands them to the sinks in batches on a background thread"""
+
+    def __init__(self, sinks, batch_size=256, flush_interval=1.0, max_queue=10000):
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.q = Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def emit(self, event):
+        """Never blocks the caller; events are dropped if the queue is full"""
+        try:
+            self.q.put_nowait(event)
+        except Full:
+            self.dropped += 1
+
+    def _write_batch(self, batch):
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception as e:
+                print(f"⚠️ Event sink {type(sink).__name__} failed: {e}")
+        self.written += len(batch)
+
+    def _run(self):
+        batch = []
+        pending = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.q.get(timeout=max(0.0, deadline - time.monotonic()))
+                pending += 1
+            except Empty:
+                item = ()
+            stop = item is None
+            if isinstance(item, CrossingEvent):
+                batch.append(item)
+            if stop or item == 'flush' or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write_batch(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+                for _ in range(pending):
+                    self.q.task_done()
+                pending = 0
+            if stop:
+                break
+        for sink in self.sinks:
+            sink.close()
+
+    def queue_depth(self):
+        return self.q.qsize()
+
+    def flush(self):
+        """Block until every queued event has reached the sinks"""
+        if not self._closed:
+            self.q.put('flush')
+            self.q.join()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.q.put(None)
+            self._thread.join()
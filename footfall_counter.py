@@ -13,17 +13,45 @@ from deep_sort_realtime.deepsort_tracker import DeepSort
 from collections import defaultdict, deque
 import time
 import threading
-from queue import Queue
+from queue import Queue, Empty
 import torch
+import argparse
+import os
 
+from video_writer import AnnotatedVideoWriter
+from events import CrossingEvent, EventWriter, create_sink
+from checkpoint import CheckpointManager
+from metrics import PerformanceMetrics, MetricsServer, MetricsLogger
+from quality import AdaptiveQualityController
+from profiling import FrameProfiler, PROFILE_MODES
+from embedding import CachedEmbedder
+from tiling import TiledDetector
+from framering import ProcessVideoCapture
+from preview import PreviewServer, counter_stats
+from control import ControlServer
+from threads import ThreadBudget, open_capture
+from trajectories import TrajectoryStore, points_in_polygon, parse_zone
+from heatmaps import HeatmapStore
+from detection_cache import DetectionCache, DetectionCacheWriter, CACHE_DIR
+
+
+
+def is_live_source(source):
+    """Camera index or stream URL: frames keep coming whether or not the counter keeps up"""
+    return isinstance(source, int) or str(source).isdigit() or '://' in str(source)
 
 
 class ThreadedVideoCapture:
     """Multi-threaded video capture for faster frame reading"""
-    def __init__(self, source):
-        self.cap = cv2.VideoCapture(source)
+    def __init__(self, source, start_frame=0, drop_when_full=False):
+        self.cap = open_capture(source)
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
         self.q = Queue(maxsize=128)
         self.stopped = False
+        # Live sources drop the oldest frame instead of falling further behind
+        self.drop_when_full = drop_when_full
+        self.dropped = 0
 
     def start(self):
         threading.Thread(target=self.update, daemon=True).start()
@@ -31,12 +59,22 @@ class ThreadedVideoCapture:
 
     def update(self):
         while not self.stopped:
+            if self.drop_when_full and self.q.full():
+                try:
+                    self.q.get_nowait()
+                    self.dropped += 1
+                except Empty:
+                    pass
             if not self.q.full():
                 ret, frame = self.cap.read()
                 if not ret:
+                    # End-of-stream marker so readers drain the queue and see ret=False
+                    self.q.put((False, None))
                     self.stopped = True
                     return
                 self.q.put((ret, frame))
+            else:
+                time.sleep(0.001)
 
     def read(self):
         return self.q.get()
@@ -46,37 +84,146 @@ class ThreadedVideoCapture:
         self.cap.release()
 
     def isOpened(self):
-        return self.cap.isOpened() and not self.stopped
+        return self.cap.isOpened() and (not self.stopped or not self.q.empty())
 
     def get(self, prop):
         return self.cap.get(prop)
 
+    def queue_depth(self):
+        return self.q.qsize()
+
+EXPORT_SUFFIXES = {'onnx': '.onnx', 'openvino': '_openvino_model', 'engine': '.engine', 'torchscript': '.torchscript'}
+TRACKERS = ('deepsort', 'bytetrack')
+# Settings FootfallCounter.configure() can change while frames are being processed
+RECONFIGURABLE = (
+    'roi_line_y', 'roi_line_position', 'zones', 'confidence_threshold', 'skip_frames',
+    'heatmap_update_interval', 'heatmap_decay', 'draw_heatmap', 'draw_trajectories', 'draw_statistics'
+)
+# Owned by the adaptive quality controller when one is active; configure() moves its base level
+QUALITY_SETTINGS = ('skip_frames', 'heatmap_update_interval', 'draw_trajectories')
+
+
+def validate_setting(name, value):
+    """Checked, normalised value for FootfallCounter.configure(); ValueError if it isn't valid"""
+    def number(kind, low, high, low_inclusive=True):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or \
+                (kind is int and not float(value).is_integer()):
+            raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}, not {value!r}")
+        if value < low or (value == low and not low_inclusive) or (high is not None and value > high):
+            bounds = f"in {'[' if low_inclusive else '('}{low}, {high}]" if high is not None else f">= {low}"
+            raise ValueError(f"{name} must be {bounds}, not {value!r}")
+        return kind(value)
+
+    if name not in RECONFIGURABLE:
+        raise ValueError(f"{name!r} can't be changed at runtime; use one of {', '.join(RECONFIGURABLE)}")
+    if name == 'roi_line_y':
+        return None if value is None else number(int, 0, None)
+    if name in ('roi_line_position', 'confidence_threshold', 'heatmap_decay'):
+        return number(float, 0.0, 1.0, low_inclusive=False)
+    if name == 'skip_frames':
+        return number(int, 0, None)
+    if name == 'heatmap_update_interval':
+        return number(int, 1, None)
+    if name == 'zones':
+        if not isinstance(value, dict):
+            raise ValueError(f"zones must map names to polygons, not {value!r}")
+        zones = {}
+        for zone, polygon in value.items():
+            try:
+                points = [(float(x), float(y)) for x, y in polygon]
+            except (TypeError, ValueError):
+                raise ValueError(f"Zone {zone!r} must be a list of [x, y] points") from None
+            if len(points) < 3:
+                raise ValueError(f"Zone {zone!r} needs at least three points")
+            zones[str(zone)] = points
+        return zones
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be true or false, not {value!r}")
+    return value
+
+
+def resolve_model_path(model_path, backend='torch', imgsz=640, half=False):
+    """Path of the model for an inference backend, exporting the .pt weights once if needed"""
+    if backend in ('torch', 'pytorch') or not model_path.endswith('.pt'):
+        return model_path
+    if backend not in EXPORT_SUFFIXES:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    exported = os.path.splitext(model_path)[0] + EXPORT_SUFFIXES[backend]
+    if not os.path.exists(exported):
+        print(f"📦 Exporting {model_path} to {backend}...")
+        exported = YOLO(model_path).export(format=backend, imgsz=imgsz, half=half)
+    return exported
+
+
+class UltralyticsTrack:
+    """Minimal DeepSORT-style track for Ultralytics' built-in trackers"""
+    def __init__(self, track_id, ltrb, det_conf):
+        self.track_id = track_id
+        self.ltrb = ltrb
+        self.det_conf = det_conf
+
+    def is_confirmed(self):
+        return True
+
+    def to_ltrb(self):
+        return self.ltrb
+
+
 class FootfallCounter:
     """AI-powered footfall counter with GPU acceleration"""
 
     def __init__(self, model_path='yolov8n.pt', roi_line_y=None, confidence_threshold=0.5, 
-                 use_gpu=True, half_precision=True, skip_frames=0):
+                 use_gpu=True, half_precision=True, skip_frames=0, event_sinks=None,
+                 camera_id='camera-0', line_name='main', tracker='deepsort', backend='torch', imgsz=640,
+                 embedding_cache=True, trajectory_store=None, heatmap_store=None, tile_size=None, tile_overlap=0.2,
+                 model=None):
 
         self.device = 'cuda' if use_gpu and torch.cuda.is_available() else 'cpu'
         print(f"🚀 Using device: {self.device}")
 
-        self.model = YOLO(model_path)
-        if self.device == 'cuda':
-            self.model.to(self.device)
-
         self.half_precision = half_precision and self.device == 'cuda'
         if self.half_precision:
             print("⚡ Half-precision (FP16) enabled for 2x speed boost")
 
-        embedder_gpu = True if self.device == 'cuda' else False
-        self.tracker = DeepSort(
-            max_age=60, n_init=3, nms_max_overlap=1.0, max_cosine_distance=0.2,
-            nn_budget=100, embedder='mobilenet', half=self.half_precision,
-            embedder_gpu=embedder_gpu
-        )
-        self.model = YOLO("yolov8n-seg.pt")
+        self.backend = backend
+        self.imgsz = imgsz
+        model_path = resolve_model_path(model_path, backend, imgsz, self.half_precision)
+        self.model_path = model_path
+        if model is not None:
+            # Already loaded from model_path and shared, e.g. batch.SharedModel across workers
+            self.model = model
+        else:
+            self.model = YOLO(model_path, task='detect')
+            if self.device == 'cuda' and model_path.endswith('.pt'):
+                self.model.to(self.device)
+
+        if tracker not in TRACKERS:
+            raise ValueError(f"Unknown tracker: {tracker}")
+        self.tracker_name = tracker
+        self.tracker = None
+        self.track_id_offset = 0
+        self.max_track_id = 0
+        if tracker == 'deepsort':
+            embedder_gpu = True if self.device == 'cuda' else False
+            self.tracker = DeepSort(
+                max_age=60, n_init=3, nms_max_overlap=1.0, max_cosine_distance=0.2,
+                nn_budget=100, embedder='mobilenet', half=self.half_precision,
+                embedder_gpu=embedder_gpu
+            )
+        self.detection_cache = None
+        self.detection_recorder = None
+        # High-resolution cameras: detect on overlapping tiles instead of one downscaled frame
+        self.tiler = None
+        if tile_size:
+            if self.tracker is None:
+                print(f"⚠️ Tiled detection is not available with {tracker}; detecting on the full frame")
+            else:
+                self.tiler = TiledDetector(self, tile_size, tile_overlap)
+        self.embedding_cache = CachedEmbedder(self.tracker) if self.tracker is not None and embedding_cache else None
         self.confidence_threshold = confidence_threshold
         self.roi_line_y = roi_line_y
+        # Line height as a fraction of the frame, used when roi_line_y is None
+        self.roi_line_position = 0.5
         self.track_history = defaultdict(lambda: deque(maxlen=60))
         self.counted_ids = set()
         self.entry_count = 0
@@ -84,20 +231,110 @@ class FootfallCounter:
         self.heatmap = None
         self.heatmap_decay = 0.95
         self.heatmap_update_interval = 3
+        self.draw_trajectories = True
+        self.draw_heatmap = True
+        self.draw_statistics = True
+        # Named polygons counted alongside the line: entering or leaving counts once per track and zone
+        self.zones = {}
+        self.zone_counts = {}
+        self.zone_counted = set()
+        # Settings queued by configure(), possibly from another thread, applied between frames
+        self._pending_config = {}
+        self._config_lock = threading.Lock()
         self.frame_counter = 0
         self.fps_history = deque(maxlen=30)
         self.last_time = time.time()
         self.skip_frames = skip_frames
         self.skip_counter = 0
         self.prev_frame_gray = None
+        self._render_buffers = {}
+        self.render_buffer_allocations = 0
+        self._gaussian_kernel = None
+
+        # Crossing events
+        self.camera_id = camera_id
+        self.line_name = line_name
+        self.source_fps = None
+        self.events = EventWriter(event_sinks) if event_sinks else None
+        # Full per-track paths for recounting with other lines (track_history only keeps 60 points)
+        self.trajectories = trajectory_store
+        # Downsampled, non-decaying density per time bucket (the live heatmap decays and is not kept)
+        self.heatmap_store = heatmap_store
+        self.checkpoint = None
+        self.checkpoint_meta = {}
+        self.metrics = PerformanceMetrics(camera_id)
+        # FOOTFALL_PROFILE=cprofile:30:200 profiles any run (e.g. the GUI) without code changes
+        self.profiler = FrameProfiler.from_env()
+        self.quality = None
+        # Optional preview.PreviewServer fed with annotated frames by process_video
+        self.preview = None
+        if self.tiler is not None:
+            self.metrics.register_gauge('tiles', lambda: self.tiler.tiles_run, source='run')
+            self.metrics.register_gauge('tiles', lambda: self.tiler.tiles_skipped, source='skipped')
+        if self.embedding_cache is not None:
+            self.metrics.register_gauge('embeddings', lambda: self.embedding_cache.computed, source='computed')
+            self.metrics.register_gauge('embeddings', lambda: self.embedding_cache.reused, source='reused')
+        if self.events is not None:
+            self.metrics.register_gauge('queue_depth', self.events.queue_depth, queue='events')
+            self.metrics.register_gauge('events_dropped', lambda: self.events.dropped)
 
         self.colors = {
             'line': (0, 255, 255), 'bbox': (0, 255, 0),
-            'entry': (0, 255, 0), 'exit': (0, 0, 255), 'text': (255, 255, 255)
+            'entry': (0, 255, 0), 'exit': (0, 0, 255), 'text': (255, 255, 255), 'zone': (255, 0, 255)
         }
 
     def _get_roi_line(self, frame_height):
-        return int(frame_height * 0.5) if self.roi_line_y is None else self.roi_line_y
+        return int(frame_height * self.roi_line_position) if self.roi_line_y is None else self.roi_line_y
+
+    def configure(self, **settings):
+        """Change settings of a running counter without reloading the model or losing tracks
+
+        Safe to call from any thread. Settings are validated immediately (ValueError for
+        unknown names or bad values, see RECONFIGURABLE) and applied together before the
+        next frame, so no frame is processed with half of an update. Returns the
+        normalised settings that were queued.
+        """
+        settings = {name: validate_setting(name, value) for name, value in settings.items()}
+        with self._config_lock:
+            self._pending_config.update(settings)
+        return settings
+
+    def current_config(self):
+        """The applied value of every RECONFIGURABLE setting (queued changes not included)"""
+        config = {name: getattr(self, name) for name in RECONFIGURABLE}
+        if self.quality is not None:
+            # Report what was asked for, not the currently degraded value
+            config.update({name: self.quality.levels[0][name] for name in QUALITY_SETTINGS})
+        return config
+
+    def _apply_pending_config(self):
+        with self._config_lock:
+            settings, self._pending_config = self._pending_config, {}
+        current = self.current_config()
+        changes = {name: value for name, value in settings.items() if value != current[name]}
+        if not changes:
+            return
+        summary = ", ".join(f"{name}={value!r}" for name, value in changes.items() if name != 'zones')
+        if 'zones' in changes:
+            zones = changes.pop('zones')
+            summary = ", ".join(filter(None, [summary, f"zones={list(zones)}"]))
+            # Zones that keep their name keep their counts
+            self.zone_counts = {name: self.zone_counts.get(name, {'entry_count': 0, 'exit_count': 0}) for name in zones}
+            self.zone_counted = {(name, track_id) for name, track_id in self.zone_counted if name in zones}
+            self.zones = zones
+        if 'confidence_threshold' in changes and (self.detection_cache or self.detection_recorder):
+            # Cached detections are keyed by the threshold they were made with
+            print(f"⚠️ [{self.camera_id}] Confidence changed; detection cache disabled for the rest of this run")
+            self.detection_cache = None
+            self.detection_recorder = None
+        if self.quality is not None:
+            base = {name: changes.pop(name) for name in QUALITY_SETTINGS if name in changes}
+            if base:
+                self.quality.set_base(**base)
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.metrics.inc('reconfigurations')
+        print(f"🔧 [{self.camera_id}] Reconfigured at frame {self.frame_counter}: {summary}")
 
     def _get_centroid(self, bbox):
         x1, y1, x2, y2 = bbox
@@ -114,6 +351,69 @@ class FootfallCounter:
             return 'exit'
         return None
 
+    def enable_checkpoints(self, path, interval=30.0):
+        """Snapshot counter state to path every interval seconds"""
+        self.checkpoint = CheckpointManager(path, interval)
+        return self.checkpoint
+
+    def reset_counts(self):
+        """Zero the line and zone counts; tracks already counted may be counted again"""
+        self.entry_count = 0
+        self.exit_count = 0
+        self.counted_ids.clear()
+        self.zone_counts = {name: {'entry_count': 0, 'exit_count': 0} for name in self.zones}
+        self.zone_counted = set()
+
+    def get_state(self):
+        """Cheap snapshot of everything needed to resume counting"""
+        return {
+            'camera_id': self.camera_id,
+            'entry_count': self.entry_count,
+            'exit_count': self.exit_count,
+            'counted_ids': [str(track_id) for track_id in self.counted_ids],
+            'zone_counts': {name: dict(counts) for name, counts in self.zone_counts.items()},
+            'zone_counted': [[zone, str(track_id)] for zone, track_id in self.zone_counted],
+            'frame_index': self.frame_counter,
+            'next_track_id': self._next_track_id(),
+            'saved_at': time.time(),
+            **self.checkpoint_meta
+        }
+
+    def restore_state(self, state, restore_position=True):
+        """Restore a get_state() snapshot; live streams keep counts but not the frame position"""
+        self.entry_count = state['entry_count']
+        self.exit_count = state['exit_count']
+        self.counted_ids = set(state['counted_ids'])
+        self.zone_counts = {name: dict(counts) for name, counts in state.get('zone_counts', {}).items()}
+        self.zone_counted = {(zone, track_id) for zone, track_id in state.get('zone_counted', [])}
+        if restore_position:
+            self.frame_counter = state.get('frame_index', 0)
+        # A fresh tracker numbers tracks from 1 again; continue past the restored IDs so
+        # new people are not mistaken for already-counted ones
+        numeric_ids = [int(track_id) for track_id in self.counted_ids if str(track_id).isdigit()]
+        next_id = max([state.get('next_track_id') or 1] + [i + 1 for i in numeric_ids])
+        if self.tracker is not None:
+            self.tracker.tracker._next_id = max(self.tracker.tracker._next_id, next_id)
+        else:
+            self.track_id_offset = next_id - 1
+
+    def _next_track_id(self):
+        if self.tracker is not None:
+            return self.tracker.tracker._next_id
+        return self.max_track_id + 1
+
+    def _emit_crossing(self, track, direction, line=None):
+        if self.events is None:
+            return
+        frame_index = self.frame_counter - 1
+        confidence = getattr(track, 'det_conf', None)
+        self.events.emit(CrossingEvent(
+            camera_id=self.camera_id, line=line or self.line_name, frame_index=frame_index,
+            media_time=round(frame_index / self.source_fps, 3) if self.source_fps else None,
+            wall_time=time.time(), track_id=str(track.track_id), direction=direction,
+            confidence=round(float(confidence), 3) if confidence is not None else None
+        ))
+
     def _should_skip_frame(self, frame):
         if self.prev_frame_gray is None:
             self.prev_frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
@@ -126,6 +426,22 @@ class FootfallCounter:
         self.prev_frame_gray = current_gray
         return False
 
+    def _render_buffer(self, name, shape, dtype=np.uint8):
+        """Per-resolution scratch buffer reused across frames"""
+        buffer = self._render_buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._render_buffers[name] = np.empty(shape, dtype=dtype)
+            self.render_buffer_allocations += 1
+        return buffer
+
+    def _heatmap_kernel(self, sigma=30):
+        # Gaussian stamp truncated at 4 sigma, where it falls below 0.03% of its peak
+        if self._gaussian_kernel is None:
+            radius = 4 * sigma
+            axis = np.arange(-radius, radius + 1, dtype=np.float32)
+            self._gaussian_kernel = np.exp(-(axis[None, :] ** 2 + axis[:, None] ** 2) / (2 * sigma ** 2)) * 0.5
+        return self._gaussian_kernel
+
     def _update_heatmap(self, frame, centroid):
         if self.frame_counter % self.heatmap_update_interval != 0:
             return
@@ -133,19 +449,29 @@ class FootfallCounter:
         if self.heatmap is None:
             self.heatmap = np.zeros((height, width), dtype=np.float32)
         cx, cy = centroid
-        sigma = 30
-        y_grid, x_grid = np.ogrid[:height, :width]
-        gaussian = np.exp(-((x_grid - cx)**2 + (y_grid - cy)**2) / (2 * sigma**2))
-        self.heatmap += gaussian * 0.5
+        kernel = self._heatmap_kernel()
+        radius = kernel.shape[0] // 2
+        x1, y1 = max(0, cx - radius), max(0, cy - radius)
+        x2, y2 = min(width, cx + radius + 1), min(height, cy + radius + 1)
+        if x1 < x2 and y1 < y2:
+            self.heatmap[y1:y2, x1:x2] += kernel[y1 - cy + radius:y2 - cy + radius, x1 - cx + radius:x2 - cx + radius]
         self.heatmap *= self.heatmap_decay
-        self.heatmap = np.clip(self.heatmap, 0, 10)
+        np.clip(self.heatmap, 0, 10, out=self.heatmap)
 
     def _draw_heatmap_overlay(self, frame):
+        """Blend the heatmap into frame in place, using scratch buffers instead of per-frame arrays"""
         if self.heatmap is None:
             return frame
-        heatmap_normalized = (self.heatmap / self.heatmap.max() * 255).astype(np.uint8) if self.heatmap.max() > 0 else np.zeros_like(self.heatmap, dtype=np.uint8)
-        heatmap_colored = cv2.applyColorMap(heatmap_normalized, cv2.COLORMAP_JET)
-        return cv2.addWeighted(frame, 0.7, heatmap_colored, 0.3, 0)
+        heatmap_max = float(self.heatmap.max())
+        normalized = self._render_buffer('heatmap_u8', self.heatmap.shape)
+        colored = self._render_buffer('heatmap_bgr', self.heatmap.shape + (3,))
+        if heatmap_max > 0:
+            cv2.convertScaleAbs(self.heatmap, dst=normalized, alpha=255.0 / heatmap_max)
+        else:
+            normalized.fill(0)
+        cv2.applyColorMap(normalized, cv2.COLORMAP_JET, dst=colored)
+        cv2.addWeighted(frame, 0.7, colored, 0.3, 0, dst=frame)
+        return frame
 
     def _calculate_fps(self):
         current_time = time.time()
@@ -154,30 +480,75 @@ class FootfallCounter:
         self.fps_history.append(fps)
         return sum(self.fps_history) / len(self.fps_history)
 
-    def process_frame(self, frame, show_heatmap=True, show_trajectories=True, force_process=False):
-        self.frame_counter += 1
-        if not force_process and self._should_skip_frame(frame):
-            return frame
-        height, width = frame.shape[:2]
-        roi_line_y = self._get_roi_line(height)
-        current_fps = self._calculate_fps()
+    def _detection_signature(self):
+        """Everything that changes the detector output, used to key the detection cache"""
+        return {
+            'model': os.path.basename(self.model_path), 'backend': self.backend, 'imgsz': self.imgsz,
+            'conf': self.confidence_threshold, 'half': self.half_precision, 'classes': [0],
+            'tiles': [self.tiler.tile_size, self.tiler.overlap] if self.tiler is not None else None
+        }
 
+    def detect_people(self, frame):
+        """(k, 5) array of x1, y1, x2, y2, conf person boxes"""
+        if self.tiler is not None:
+            return self.tiler.detect(frame)
         results = self.model(
             frame, classes=[0], conf=self.confidence_threshold, verbose=False,
-            device=self.device, half=self.half_precision, imgsz=640
+            device=self.device, half=self.half_precision, imgsz=self.imgsz
         )[0]
+        return np.column_stack([results.boxes.xyxy.cpu().numpy(), results.boxes.conf.cpu().numpy()])
+
+    def _detect(self, frame):
+        """YOLO person detections in DeepSORT's ([l, t, w, h], conf, class) format"""
+        if self.tracker is None:
+            return self._detect_and_track(frame)
+
+        frame_index = self.frame_counter - 1
+        boxes = self.detection_cache.get(frame_index) if self.detection_cache is not None else None
+        if boxes is None:
+            boxes = self.detect_people(frame)
+            if self.detection_recorder is not None:
+                self.detection_recorder.add(frame_index, boxes)
 
         detections = []
-        for box in results.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-            conf = float(box.conf[0])
+        for x1, y1, x2, y2, conf in boxes.tolist():
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
             detections.append(([x1, y1, x2 - x1, y2 - y1], conf, 0))
+        return detections
 
-        tracks = self.tracker.update_tracks(detections, frame=frame)
-
-        if show_heatmap:
-            frame = self._draw_heatmap_overlay(frame)
+    def _detect_and_track(self, frame):
+        """Ultralytics trackers run inside the detector call and return tracks directly"""
+        results = self.model.track(
+            frame, classes=[0], conf=self.confidence_threshold, verbose=False, persist=True,
+            tracker=f"{self.tracker_name}.yaml", device=self.device, half=self.half_precision, imgsz=self.imgsz
+        )[0]
 
+        tracks = []
+        if results.boxes.id is None:
+            return tracks
+        for box, track_id, conf in zip(results.boxes.xyxy.tolist(), results.boxes.id.tolist(), results.boxes.conf.tolist()):
+            track_id = int(track_id) + self.track_id_offset
+            self.max_track_id = max(self.max_track_id, track_id)
+            tracks.append(UltralyticsTrack(str(track_id), box, conf))
+        return tracks
+
+    def _track(self, detections, frame):
+        if self.tracker is None:
+            return detections
+        if self.embedding_cache is None:
+            return self.tracker.update_tracks(detections, frame=frame)
+
+        # DeepSORT drops empty boxes internally, which would misalign precomputed embeddings
+        detections = [d for d in detections if d[0][2] > 0 and d[0][3] > 0]
+        with self.metrics.stage('embed'):
+            embeds, sources = self.embedding_cache.embed(frame, detections)
+        tracks = self.tracker.update_tracks(detections, embeds=embeds, others=list(range(len(detections))))
+        self.embedding_cache.update(tracks, detections, embeds, sources)
+        return tracks
+
+    def _count(self, tracks, roi_line_y):
+        """Update trajectories and line crossings; returns (track_id, bbox, centroid, color) per confirmed track"""
+        tracked = []
         for track in tracks:
             if not track.is_confirmed():
                 continue
@@ -185,26 +556,57 @@ class FootfallCounter:
             ltrb = track.to_ltrb()
             x1, y1, x2, y2 = map(int, ltrb)
             cx, cy = self._get_centroid([x1, y1, x2, y2])
-
-            if show_heatmap:
-                self._update_heatmap(frame, (cx, cy))
             self.track_history[track_id].append((cx, cy))
+            if self.trajectories is not None:
+                self.trajectories.append(self.frame_counter - 1, track_id, cx, cy)
 
+            color = self.colors['bbox']
             if track_id not in self.counted_ids:
                 crossing = self._check_line_crossing(track_id, cy, roi_line_y)
                 if crossing == 'entry':
                     self.entry_count += 1
                     self.counted_ids.add(track_id)
+                    self._emit_crossing(track, crossing)
                     color = self.colors['entry']
                 elif crossing == 'exit':
                     self.exit_count += 1
                     self.counted_ids.add(track_id)
+                    self._emit_crossing(track, crossing)
                     color = self.colors['exit']
-                else:
-                    color = self.colors['bbox']
-            else:
-                color = self.colors['bbox']
+            if self.zones:
+                self._count_zones(track, track_id)
+            tracked.append((track_id, (x1, y1, x2, y2), (cx, cy), color))
+        return tracked
 
+    def _count_zones(self, track, track_id):
+        """Zone entries (outside -> inside) and exits, like trajectories.recount_zones"""
+        history = self.track_history[track_id]
+        if len(history) < 2:
+            return
+        (px, py), (cx, cy) = history[-2], history[-1]
+        xs, ys = np.array([px, cx]), np.array([py, cy])
+        for name, polygon in self.zones.items():
+            if (name, track_id) in self.zone_counted:
+                continue
+            was_inside, inside = points_in_polygon(xs, ys, polygon)
+            if was_inside == inside:
+                continue
+            direction = 'entry' if inside else 'exit'
+            self.zone_counts[name][f'{direction}_count'] += 1
+            self.zone_counted.add((name, track_id))
+            self._emit_crossing(track, direction, line=name)
+
+    def _draw_zones(self, frame):
+        for name, polygon in self.zones.items():
+            points = np.int32(polygon)
+            cv2.polylines(frame, [points], True, self.colors['zone'], 2)
+            counts = self.zone_counts[name]
+            x, y = points.min(axis=0)
+            cv2.putText(frame, f"{name}: {counts['entry_count']} in / {counts['exit_count']} out",
+                        (int(x) + 5, int(y) + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.colors['zone'], 2)
+
+    def _draw_tracks(self, frame, tracked, show_trajectories):
+        for track_id, (x1, y1, x2, y2), (cx, cy), color in tracked:
             cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
             cv2.putText(frame, f"ID:{track_id}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
 
@@ -216,15 +618,89 @@ class FootfallCounter:
                     cv2.line(frame, points[i-1], points[i], color, thickness)
             cv2.circle(frame, (cx, cy), 5, color, -1)
 
+    def _update_heatmaps(self, frame, tracked):
+        for _, _, centroid, _ in tracked:
+            self._update_heatmap(frame, centroid)
+
+    def _render(self, frame, tracked, tracks, roi_line_y, current_fps, show_heatmap, show_trajectories):
+        height, width = frame.shape[:2]
+        if show_heatmap:
+            frame = self._draw_heatmap_overlay(frame)
+        self._draw_tracks(frame, tracked, show_trajectories)
         cv2.line(frame, (0, roi_line_y), (width, roi_line_y), self.colors['line'], 3)
         cv2.putText(frame, "COUNTING LINE", (10, roi_line_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, self.colors['line'], 2)
-        self._draw_statistics(frame, current_fps, len(tracks))
+        if self.zones:
+            self._draw_zones(frame)
+        if self.draw_statistics:
+            self._draw_statistics(frame, current_fps, len(tracks))
         return frame
 
+    def enable_profiling(self, mode='cprofile', start_frame=30, num_frames=100, output_prefix='footfall_profile'):
+        """Profile a bounded window of frames; see profiling.FrameProfiler"""
+        self.profiler = FrameProfiler(mode, start_frame, num_frames, output_prefix)
+        return self.profiler
+
+    def enable_adaptive_quality(self, target_fps, **kwargs):
+        """Adjust skip rate, imgsz, heatmap interval and trajectories to hold target_fps; see quality.py"""
+        self.quality = AdaptiveQualityController(self, target_fps, **kwargs)
+        self.metrics.register_gauge('quality_level', lambda: self.quality.level)
+        return self.quality
+
+    def process_frame(self, frame, show_heatmap=True, show_trajectories=True, force_process=False, render=True):
+        start = time.perf_counter()
+        if self.profiler is None or self.profiler.done:
+            result = self._process_frame(frame, show_heatmap, show_trajectories, force_process, render)
+        else:
+            with self.profiler.frame():
+                result = self._process_frame(frame, show_heatmap, show_trajectories, force_process, render)
+        if self.quality is not None:
+            self.quality.observe(time.perf_counter() - start)
+        return result
+
+    def _process_frame(self, frame, show_heatmap, show_trajectories, force_process, render):
+        if self._pending_config:
+            self._apply_pending_config()
+        if self.checkpoint is not None:
+            self.checkpoint.maybe_save(self)
+        self.frame_counter += 1
+        self.metrics.inc('frames_total')
+        if not force_process and self._should_skip_frame(frame):
+            self.metrics.inc('frames_skipped')
+            return frame
+        self.metrics.inc('frames_processed')
+        show_heatmap = show_heatmap and self.draw_heatmap
+        show_trajectories = show_trajectories and self.draw_trajectories
+        roi_line_y = self._get_roi_line(frame.shape[0])
+        current_fps = self._calculate_fps()
+        stage = self.metrics.stage
+
+        with stage('detect'):
+            detections = self._detect(frame)
+        with stage('track'):
+            tracks = self._track(detections, frame)
+        with stage('count'):
+            tracked = self._count(tracks, roi_line_y)
+
+        if show_heatmap:
+            with stage('heatmap'):
+                self._update_heatmaps(frame, tracked)
+        if self.heatmap_store is not None:
+            with stage('heatmap'):
+                frame_index = self.frame_counter - 1
+                self.heatmap_store.add(
+                    [centroid for _, _, centroid, _ in tracked], (frame.shape[1], frame.shape[0]), time.time(),
+                    frame_index / self.source_fps if self.source_fps else None
+                )
+
+        if not render:
+            return frame
+        with stage('draw'):
+            return self._render(frame, tracked, tracks, roi_line_y, current_fps, show_heatmap, show_trajectories)
+
     def _draw_statistics(self, frame, fps, active_tracks):
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (500, 220), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+        # Translucent black panel: blending with black only darkens the panel's ROI
+        panel = frame[10:221, 10:501]
+        cv2.convertScaleAbs(panel, dst=panel, alpha=0.3)
         total = self.entry_count + self.exit_count
         stats = [
             ("ENTRIES", self.entry_count, self.colors['entry']),
@@ -238,34 +714,253 @@ class FootfallCounter:
             cv2.putText(frame, label, (20, y_offset + i * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
             cv2.putText(frame, str(value), (250, y_offset + i * 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 2)
 
-    def process_video(self, input_path, output_path, show_heatmap=True, show_trajectories=True, status_callback=None):
-        cap = ThreadedVideoCapture(input_path).start()
+    def close(self):
+        """Flush and close the crossing-event sinks and write a final checkpoint"""
+        if self.profiler is not None:
+            self.profiler.finish()
+        if self.events is not None:
+            self.events.close()
+        if self.trajectories is not None:
+            self.trajectories.close()
+        if self.heatmap_store is not None:
+            self.heatmap_store.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close(self.get_state())
+            self.checkpoint = None
+
+    def process_video(self, input_path, output_path=None, show_heatmap=True, show_trajectories=True, status_callback=None,
+                      video_backend='auto', output_fps=None, output_scale=1.0,
+                      checkpoint_path=None, checkpoint_interval=30.0, resume=True, max_frames=None,
+                      detection_cache=False, detection_cache_dir=CACHE_DIR, decode_process=False):
+        """Process a video file; output_path=None counts without rendering or encoding video
+
+        With checkpoint_path set, state is snapshotted every checkpoint_interval seconds and
+        a later run resumes from the last snapshot by seeking into the file. The output
+        video of a resumed run only covers the frames from the resume point on.
+
+        With detection_cache=True, YOLO detections are replayed from an on-disk cache keyed by
+        the video content and detector settings; a complete run without one records it.
+
+        With decode_process=True, decoding runs in a separate process that hands frames over
+        through a shared-memory ring instead of a thread competing for the GIL.
+        """
+        start_frame = 0
+        if self.trajectories is not None:
+            # Before anything is opened: another video's tracks would merge with the stored ones
+            self.trajectories.set_source(source=os.path.basename(input_path), camera_id=self.camera_id)
+        if checkpoint_path:
+            checkpoint = self.enable_checkpoints(checkpoint_path, checkpoint_interval)
+            state = checkpoint.load() if resume else None
+            source_id = {'source': os.path.abspath(input_path), 'source_size': os.path.getsize(input_path)}
+            if state and all(state.get(key) == value for key, value in source_id.items()):
+                self.restore_state(state)
+                start_frame = self.frame_counter
+                print(f"♻️ Resuming from frame {start_frame} "
+                      f"(entries: {self.entry_count}, exits: {self.exit_count})")
+            self.checkpoint_meta = source_id
+        if detection_cache and self.tracker is not None:
+            signature = self._detection_signature()
+            self.detection_cache = DetectionCache.open(input_path, signature, detection_cache_dir)
+            if self.detection_cache is not None:
+                print(f"🗃️ Replaying cached detections from {self.detection_cache.path}")
+            elif self.quality is None:
+                # Adaptive quality changes imgsz mid-run, which would mix detector settings in one cache
+                self.detection_recorder = DetectionCacheWriter(input_path, signature, detection_cache_dir)
+        capture = ProcessVideoCapture if decode_process else ThreadedVideoCapture
+        # Live sources drop their oldest frames rather than fall behind; frames_dropped shows how many
+        cap = capture(input_path, start_frame=start_frame, drop_when_full=is_live_source(input_path)).start()
         time.sleep(1.0)
         fps = int(cap.get(cv2.CAP_PROP_FPS))
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        self.source_fps = cap.get(cv2.CAP_PROP_FPS) or None
+        if self.trajectories is not None:
+            self.trajectories.set_source(fps=self.source_fps, width=width, height=height,
+                                         roi_line_y=self._get_roi_line(height))
+        out = None
+        if output_path:
+            out = AnnotatedVideoWriter(output_path, fps, (width, height), backend=video_backend,
+                                       output_fps=output_fps, scale=output_scale, metrics=self.metrics)
+            self.metrics.register_gauge('queue_depth', out.queue_depth, queue='encoder')
+        self.metrics.register_gauge('queue_depth', cap.queue_depth, queue='capture')
+        self.metrics.register_gauge('frames_dropped', lambda: cap.dropped, source='capture')
         frame_count = 0
+        processed_count = start_frame
+        encoder_stats = None
+        completed = False
+        start_time = time.time()
         try:
-            while cap.isOpened():
-                ret, frame = cap.read()
+            while cap.isOpened() and (max_frames is None or frame_count < max_frames):
+                with self.metrics.stage('decode'):
+                    ret, frame = cap.read()
                 if not ret:
+                    completed = True
                     break
-                processed_frame = self.process_frame(frame, show_heatmap, show_trajectories)
-                out.write(processed_frame)
+                # Frames are only drawn for the output video or when a preview viewer is due one
+                remote_preview = self.preview is not None and self.preview.wants_frame()
+                processed_frame = self.process_frame(frame, show_heatmap, show_trajectories,
+                                                     render=out is not None or remote_preview)
+                if out is not None:
+                    out.write(processed_frame)
+                if remote_preview:
+                    self.preview.publish(processed_frame)
                 frame_count += 1
+                processed_count += 1
                 if status_callback and frame_count % 10 == 0:
-                    progress = int((frame_count / total_frames) * 100)
+                    progress = int((processed_count / total_frames) * 100) if total_frames > 0 else 0
                     status_callback({
                         'status': 'processing', 'progress': progress,
                         'entry_count': self.entry_count, 'exit_count': self.exit_count
                     })
         finally:
             cap.release()
-            out.release()
+            if out is not None:
+                encoder_stats = out.release()
+            if self.events is not None:
+                self.events.flush()
+            if self.trajectories is not None:
+                self.trajectories.flush()
+            if self.heatmap_store is not None:
+                self.heatmap_store.flush()
+            if self.checkpoint is not None:
+                self.checkpoint.close(self.get_state())
+                self.checkpoint = None
+                self.checkpoint_meta = {}
+            # Only a complete run from the first frame yields a cache that covers the whole video
+            if self.detection_recorder is not None and completed and start_frame == 0:
+                print(f"🗃️ Detection cache written to {self.detection_recorder.finalize()}")
+            self.detection_cache = None
+            self.detection_recorder = None
+        elapsed = time.time() - start_time
+        for queue in ('capture', 'encoder'):
+            self.metrics.unregister_gauge('queue_depth', queue=queue)
+        self.metrics.unregister_gauge('frames_dropped', source='capture')
         return {
             'entry_count': self.entry_count, 'exit_count': self.exit_count,
-            'total_count': self.entry_count + self.exit_count, 'frames_processed': frame_count
+            'total_count': self.entry_count + self.exit_count, 'frames_processed': frame_count,
+            'zone_counts': self.zone_counts, 'resumed_from_frame': start_frame,
+            'processing_fps': round(frame_count / elapsed, 2) if elapsed > 0 else 0.0,
+            'encoder': encoder_stats,
+            'metrics': self.metrics.summary()
         }
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="AI Footfall Counter (YOLOv8 + DeepSORT)")
+    parser.add_argument('input', nargs='?', default='test_video.mp4', help="Input video path")
+    parser.add_argument('--output', default='output_video.mp4', help="Annotated output video path")
+    parser.add_argument('--no-video', action='store_true', help="Only count, do not write an output video")
+    parser.add_argument('--model', default='yolov8n.pt', help="YOLOv8 weights")
+    parser.add_argument('--line-y', type=int, default=None, help="Counting line y position (default: frame middle)")
+    parser.add_argument('--conf', type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument('--cpu', action='store_true', help="Force CPU inference")
+    parser.add_argument('--skip-frames', type=int, default=0, help="Frames to skip between detections")
+    parser.add_argument('--imgsz', type=int, default=640, help="Inference image size")
+    parser.add_argument('--target-fps', type=float, default=None,
+                        help="Adapt skip rate, imgsz, heatmap and trajectories to keep up with this processing rate")
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help="Detect on overlapping tiles of this size (high-resolution cameras)")
+    parser.add_argument('--tile-overlap', type=float, default=0.2, help="Minimum overlap between tiles")
+    parser.add_argument('--tracker', choices=TRACKERS, default='deepsort', help="Multi-object tracker")
+    parser.add_argument('--detection-cache', action='store_true',
+                        help=f"Replay/record YOLO detections in {CACHE_DIR}/ for repeated runs on the same footage")
+    parser.add_argument('--no-embedding-cache', action='store_true',
+                        help="Recompute DeepSORT embeddings for every detection on every frame")
+    parser.add_argument('--backend', choices=['torch'] + list(EXPORT_SUFFIXES), default='torch',
+                        help="Inference backend (non-torch backends export the weights on first use)")
+    parser.add_argument('--decode-process', action='store_true',
+                        help="Decode in a separate process and pass frames through shared memory")
+    parser.add_argument('--no-heatmap', action='store_true', help="Disable the heatmap overlay")
+    parser.add_argument('--no-trajectories', action='store_true', help="Disable trajectory drawing")
+    parser.add_argument('--video-backend', choices=['auto', 'opencv', 'ffmpeg'], default='auto',
+                        help="Encoder for the output video (ffmpeg = libx264 ultrafast)")
+    parser.add_argument('--output-fps', type=float, default=None, help="Write the output video at a reduced frame rate")
+    parser.add_argument('--output-scale', type=float, default=1.0, help="Scale factor for the output video resolution")
+    parser.add_argument('--events', action='append', default=[],
+                        help="Crossing event sink (.jsonl, .csv or .db); may be given more than once")
+    parser.add_argument('--trajectories', default=None, metavar='DIR',
+                        help="Record full track paths to DIR for later recounts (python trajectories.py DIR ...)")
+    parser.add_argument('--heatmap-store', default=None, metavar='DIR',
+                        help="Persist hourly person-density heatmaps to DIR (render with python heatmaps.py)")
+    parser.add_argument('--camera-id', default='camera-0', help="Camera identifier recorded with each event")
+    parser.add_argument('--checkpoint', default=None, help="Checkpoint file for resuming long runs")
+    parser.add_argument('--checkpoint-interval', type=float, default=30.0, help="Seconds between checkpoints")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore an existing checkpoint and start over")
+    parser.add_argument('--metrics-port', type=int, default=None, help="Serve Prometheus metrics on this local port")
+    parser.add_argument('--preview-port', type=int, default=None,
+                        help="Serve the annotated stream (MJPEG) and counts (JSON/SSE) on localhost:PORT")
+    parser.add_argument('--streams', type=int, default=None,
+                        help="Number of counters sharing this machine; limits this one's torch, OpenCV and "
+                             "decode threads to its share of the cores")
+    parser.add_argument('--stream-index', type=int, default=0, help="Which of --streams this counter is (0-based)")
+    parser.add_argument('--pin-cores', action='store_true', help="Also pin this counter to its share of the cores")
+    parser.add_argument('--control-port', type=int, default=None,
+                        help="Accept live reconfiguration (line, zones, confidence, ...) on localhost:PORT; see control.py")
+    parser.add_argument('--zone', type=parse_zone, action='append', default=[],
+                        help="Also count entries/exits of a zone polygon name:x1,y1;x2,y2;x3,y3 (repeatable)")
+    parser.add_argument('--metrics-log-interval', type=float, default=0, help="Log a metrics line every N seconds")
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None,
+                        help="Profile a window of frames with cProfile (CPU) or tracemalloc (allocations)")
+    parser.add_argument('--profile-start', type=int, default=30, help="Frames to run before profiling starts")
+    parser.add_argument('--profile-frames', type=int, default=100, help="Number of frames to profile")
+    parser.add_argument('--profile-output', default='footfall_profile', help="Output path prefix for profile files")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.streams or args.pin_cores:
+        ThreadBudget(args.streams or 1, args.stream_index, pin=args.pin_cores,
+                     gpu=not args.cpu and torch.cuda.is_available()).apply()
+    counter = FootfallCounter(
+        model_path=args.model, roi_line_y=args.line_y, confidence_threshold=args.conf,
+        use_gpu=not args.cpu, skip_frames=args.skip_frames,
+        tracker=args.tracker, backend=args.backend, imgsz=args.imgsz,
+        tile_size=args.tile_size, tile_overlap=args.tile_overlap, embedding_cache=not args.no_embedding_cache,
+        event_sinks=[create_sink(path) for path in args.events], camera_id=args.camera_id,
+        trajectory_store=TrajectoryStore(args.trajectories) if args.trajectories else None,
+        heatmap_store=HeatmapStore(args.heatmap_store, args.camera_id) if args.heatmap_store else None
+    )
+    if args.target_fps:
+        counter.enable_adaptive_quality(args.target_fps)
+    if args.zone:
+        counter.configure(zones=dict(args.zone))
+    if args.profile:
+        counter.enable_profiling(args.profile, args.profile_start, args.profile_frames, args.profile_output)
+    server = MetricsServer(counter.metrics, port=args.metrics_port).start() if args.metrics_port else None
+    if args.preview_port:
+        counter.preview = PreviewServer(lambda: counter_stats(counter), port=args.preview_port).start()
+    control = ControlServer(counter, port=args.control_port).start() if args.control_port else None
+    logger = MetricsLogger(counter.metrics, args.metrics_log_interval).start() if args.metrics_log_interval > 0 else None
+    try:
+        result = counter.process_video(
+            args.input, None if args.no_video else args.output,
+            show_heatmap=not args.no_heatmap, show_trajectories=not args.no_trajectories,
+            video_backend=args.video_backend, output_fps=args.output_fps, output_scale=args.output_scale,
+            checkpoint_path=args.checkpoint, checkpoint_interval=args.checkpoint_interval, resume=not args.no_resume,
+            detection_cache=args.detection_cache, decode_process=args.decode_process
+        )
+    finally:
+        counter.close()
+        if logger:
+            logger.stop()
+        if server:
+            server.stop()
+        if control:
+            control.stop()
+        if counter.preview:
+            counter.preview.stop()
+    print(f"✅ Entries: {result['entry_count']}  Exits: {result['exit_count']}  Total: {result['total_count']}")
+    for name, counts in counter.zone_counts.items():
+        print(f"🔷 Zone {name}: {counts['entry_count']} in / {counts['exit_count']} out")
+    print(f"🎞️ Frames: {result['frames_processed']} @ {result['processing_fps']} FPS")
+    if result['encoder']:
+        encoder = result['encoder']
+        print(f"💾 Encoder ({encoder['backend']}): {encoder['frames_written']} frames @ {encoder['encoder_fps']} FPS")
+    print(counter.metrics.log_line())
+    return result
+
+
+if __name__ == '__main__':
+    main()
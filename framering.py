@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Shared-Memory Frame Ring
+Fixed-size frame slots in multiprocessing.shared_memory with sequence numbers, so a
+decode process can hand frames to the counting process without pickling or copying
+"""
+
+import multiprocessing as mp
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from threads import open_capture
+
+# Header: write_seq, end_of_stream, stop, dropped, then (seq, frame_index) per slot
+HEADER_FIELDS = 4
+WRITE_SEQ, END_OF_STREAM, STOP, DROPPED = range(HEADER_FIELDS)
+ALIGNMENT = 64
+
+
+class FrameRing:
+    """Single-producer, single-consumer ring of frame slots in shared memory
+
+    The writer fills slot seq % slots and publishes it by storing seq in the slot
+    header and bumping write_seq; the reader gets a NumPy view of the slot and hands
+    it back when done. Two semaphores count free and filled slots, so a full ring
+    blocks the writer (backpressure) and an empty one blocks the reader. The ring
+    pickles by name, so it can be passed to a multiprocessing.Process.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=8, name=None, free=None, filled=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.slot_bytes = -(-self.frame_bytes // ALIGNMENT) * ALIGNMENT
+        header_bytes = -(-(HEADER_FIELDS + 2 * slots) * 8 // ALIGNMENT) * ALIGNMENT
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * self.slot_bytes)
+            self.free = mp.Semaphore(slots)
+            self.filled = mp.Semaphore(0)
+        else:
+            # Attached from child processes, which share the creator's resource tracker
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.free, self.filled = free, filled
+        self.header = np.ndarray(HEADER_FIELDS + 2 * slots, dtype=np.int64, buffer=self.shm.buf)
+        if self.owner:
+            self.header[:] = 0
+        self.slot_meta = self.header[HEADER_FIELDS:].reshape(slots, 2)
+        self.frames = [
+            np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf, offset=header_bytes + i * self.slot_bytes)
+            for i in range(slots)
+        ]
+        self.read_seq = 0
+
+    def __reduce__(self):
+        return (FrameRing, (self.shape, self.dtype.str, self.slots, self.shm.name, self.free, self.filled))
+
+    # Writer side
+
+    def acquire_slot(self, block=True, timeout=None):
+        """(seq, view) of the next free slot, or None if none is free in time"""
+        while not self.free.acquire(block, 0.1 if block else None):
+            if not block or self.header[STOP]:
+                return None
+            if timeout is not None:
+                timeout -= 0.1
+                if timeout <= 0:
+                    return None
+        seq = int(self.header[WRITE_SEQ])
+        return seq, self.frames[seq % self.slots]
+
+    def publish(self, seq, frame_index):
+        """Make a slot filled through acquire_slot visible to the reader"""
+        self.slot_meta[seq % self.slots] = (seq, frame_index)
+        self.header[WRITE_SEQ] = seq + 1
+        self.filled.release()
+
+    def write(self, frame, frame_index, block=True):
+        """Copy a frame into the ring; False if it was dropped because the ring was full"""
+        slot = self.acquire_slot(block)
+        if slot is None:
+            self.header[DROPPED] += 1
+            return False
+        seq, view = slot
+        view[...] = frame
+        self.publish(seq, frame_index)
+        return True
+
+    def end_of_stream(self):
+        self.header[END_OF_STREAM] = 1
+        # Wake a reader blocked on an empty ring
+        self.filled.release()
+
+    # Reader side
+
+    def depth(self):
+        return int(self.header[WRITE_SEQ]) - self.read_seq
+
+    def get(self, timeout=None):
+        """(seq, frame_index, view) of the next frame, or None at end of stream / timeout
+
+        The view aliases shared memory and stays valid until release() is called.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.filled.acquire(True, 0.1):
+                if self.depth() > 0:
+                    break
+                if self.header[END_OF_STREAM]:
+                    self.filled.release()
+                    return None
+            elif self.header[END_OF_STREAM] and self.depth() == 0:
+                return None
+            if self.header[STOP] or (deadline is not None and time.monotonic() > deadline):
+                return None
+        slot = self.read_seq % self.slots
+        seq, frame_index = (int(v) for v in self.slot_meta[slot])
+        if seq != self.read_seq:
+            raise RuntimeError(f"Frame ring out of sync: expected seq {self.read_seq}, slot holds {seq}")
+        return seq, frame_index, self.frames[slot]
+
+    def release(self):
+        """Return the slot from the last get() to the writer"""
+        self.read_seq += 1
+        self.free.release()
+
+    @contextmanager
+    def read(self, timeout=None):
+        item = self.get(timeout)
+        try:
+            yield item
+        finally:
+            if item is not None:
+                self.release()
+
+    def stop(self):
+        """Ask a blocked writer to give up"""
+        self.header[STOP] = 1
+        self.free.release()
+
+    def close(self):
+        self.frames = []
+        self.header = self.slot_meta = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _decode_worker(source, ring, start_frame, drop_when_full):
+    """Decode source straight into ring slots until the end of the stream or a stop request"""
+    cap = open_capture(source)
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    frame_index = start_frame
+    try:
+        while not ring.header[STOP]:
+            slot = ring.acquire_slot(block=not drop_when_full)
+            if slot is None:
+                if ring.header[STOP]:
+                    break
+                # Live source and the consumer is behind: skip this frame without converting it
+                if not cap.grab():
+                    break
+                ring.header[DROPPED] += 1
+                frame_index += 1
+                continue
+            seq, view = slot
+            ok, frame = cap.read(view)
+            if not ok:
+                ring.free.release()
+                break
+            if frame is not view and not np.shares_memory(frame, view):
+                if frame.shape != view.shape:
+                    frame = cv2.resize(frame, (view.shape[1], view.shape[0]))
+                view[...] = frame
+            ring.publish(seq, frame_index)
+            frame_index += 1
+    finally:
+        cap.release()
+        ring.end_of_stream()
+
+
+class ProcessVideoCapture:
+    """Drop-in for ThreadedVideoCapture that decodes in a separate process
+
+    Decoding runs outside this interpreter's GIL and frames arrive through a FrameRing.
+    A frame returned by read() is a view into shared memory that is valid until the
+    next read(); copy it to keep it longer.
+    """
+
+    def __init__(self, source, start_frame=0, drop_when_full=False, slots=8):
+        probe = cv2.VideoCapture(source)
+        self.props = {prop: probe.get(prop) for prop in (
+            cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FRAME_COUNT)}
+        self.opened = probe.isOpened()
+        probe.release()
+        self.source = source
+        self.start_frame = start_frame
+        self.drop_when_full = drop_when_full
+        width, height = int(self.props[cv2.CAP_PROP_FRAME_WIDTH]), int(self.props[cv2.CAP_PROP_FRAME_HEIGHT])
+        self.ring = FrameRing((height, width, 3), slots=slots) if self.opened else None
+        self.process = None
+        self.holding = False
+        self.finished = not self.opened
+
+    def start(self):
+        if self.ring is not None:
+            self.process = mp.Process(target=_decode_worker, daemon=True,
+                                      args=(self.source, self.ring, self.start_frame, self.drop_when_full))
+            self.process.start()
+        return self
+
+    def read(self):
+        if self.holding:
+            self.ring.release()
+            self.holding = False
+        item = self.ring.get() if not self.finished else None
+        if item is None:
+            self.finished = True
+            return False, None
+        self.holding = True
+        return True, item[2]
+
+    def isOpened(self):
+        return not self.finished
+
+    def get(self, prop):
+        return self.props.get(prop, 0.0)
+
+    def queue_depth(self):
+        return self.ring.depth() if self.ring is not None else 0
+
+    @property
+    def dropped(self):
+        return int(self.ring.header[DROPPED]) if self.ring is not None else 0
+
+    def release(self):
+        self.finished = True
+        if self.ring is None:
+            return
+        self.ring.stop()
+        if self.process is not None:
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.ring.close()
+        self.ring = None
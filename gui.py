@@ -7,14 +7,27 @@ import customtkinter as ctk
 import cv2
 from PIL import Image, ImageTk
 import threading
-from footfall_counter import FootfallCounter
+from footfall_counter import FootfallCounter, ThreadedVideoCapture, TRACKERS
+from video_writer import AnnotatedVideoWriter
+from aggregation import AggregationStore
+from heatmaps import HeatmapStore, HEATMAP_DIR, render as render_heatmap
+from metrics import MetricsServer
+from preview import PreviewServer, counter_stats
+from control import ControlServer
+from config import PerformanceConfig, CONFIG_PATH, DEVICES, BACKENDS, IMAGE_SIZES
 import os
 from tkinter import filedialog, messagebox
 import time
+import re
+from urllib.parse import urlparse
 
-use_gpu=True
-half_precision=False
-skip_frames=2
+config_path=CONFIG_PATH  # device, precision, skip, imgsz, tracker and backend; edited in the Settings tab
+stats_db_path="footfall_stats.db"
+checkpoint_dir="checkpoints"
+heatmap_dir=HEATMAP_DIR
+metrics_port=None  # e.g. 9108 to serve Prometheus metrics on localhost
+preview_port=None  # e.g. 8090 to serve the annotated stream to browsers on localhost
+control_port=None  # e.g. 9109 to reconfigure the running counter with control.py
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -33,19 +46,65 @@ class FootfallApp(ctk.CTk):
         # Application state
         self.counter = None
         self.processing = False
+        self.current_camera = None
+        self.session_start = None
         self.current_source = None
         self.video_thread = None
         self.current_frame = None
+        self.closing = False
 
         # Variables
         self.show_heatmap = ctk.BooleanVar(value=True)
         self.show_trajectories = ctk.BooleanVar(value=True)
+        self.save_video = ctk.BooleanVar(value=True)
+        self.video_backend = ctk.StringVar(value="Auto")
+
+        # Performance settings, persisted to config_path and applied to the next counter
+        self.perf_config = PerformanceConfig.load(config_path)
+        self.perf_device = ctk.StringVar(value=self.perf_config.device)
+        self.perf_half = ctk.BooleanVar(value=self.perf_config.half_precision)
+        self.perf_skip = ctk.StringVar(value=str(self.perf_config.skip_frames))
+        self.perf_imgsz = ctk.StringVar(value=str(self.perf_config.imgsz))
+        self.perf_tracker = ctk.StringVar(value=self.perf_config.tracker)
+        self.perf_backend = ctk.StringVar(value=self.perf_config.backend)
+        target_fps = self.perf_config.target_fps
+        self.perf_target_fps = ctk.StringVar(value=f"{target_fps:g}" if target_fps else "Off")
+
+        # Live tuning, applied to the running counter between frames
+        self.line_position = ctk.DoubleVar(value=50.0)
+        self.confidence = ctk.DoubleVar(value=0.5)
         self.entry_count = 0
         self.exit_count = 0
         self.total_count = 0
         self.current_fps = 0.0
 
+        # Prometheus endpoint always serves the current counter's metrics
+        self.metrics_sources = []
+        self.metrics_server = MetricsServer(self.metrics_sources, port=metrics_port).start() if metrics_port else None
+        self.preview_server = PreviewServer(lambda: counter_stats(self.counter), port=preview_port).start() \
+            if preview_port else None
+        self.control_server = ControlServer(lambda: self.counter, port=control_port).start() if control_port else None
+
         self.setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def on_closing(self):
+        """Stop processing and close the counter so its last heatmap bucket, events and checkpoint are saved"""
+        self.closing = True
+        self.processing = False
+        self._finish_closing(time.monotonic() + 5.0)
+
+    def _finish_closing(self, deadline):
+        # Keep the event loop running while the processing thread finishes; it updates widgets on its way out
+        if self.video_thread is not None and self.video_thread.is_alive() and time.monotonic() < deadline:
+            self.after(100, self._finish_closing, deadline)
+            return
+        if self.counter:
+            self.counter.close()
+        for server in (self.metrics_server, self.preview_server, self.control_server):
+            if server is not None:
+                server.stop()
+        self.destroy()
 
     def setup_ui(self):
         """Setup the perfect UI"""
@@ -420,6 +479,27 @@ class FootfallApp(ctk.CTk):
         )
         self.file_process_btn.pack(side="left", padx=5)
 
+        # Output options
+        output_frame = ctk.CTkFrame(control_frame, fg_color="transparent")
+        output_frame.pack(pady=(0, 15))
+
+        ctk.CTkSwitch(
+            output_frame,
+            text="Save Annotated Video",
+            variable=self.save_video,
+            font=ctk.CTkFont(size=13)
+        ).pack(side="left", padx=15)
+
+        ctk.CTkLabel(output_frame, text="Encoder:", font=ctk.CTkFont(size=13)).pack(side="left", padx=(15, 5))
+
+        ctk.CTkOptionMenu(
+            output_frame,
+            values=["Auto", "FFmpeg", "OpenCV"],
+            variable=self.video_backend,
+            width=110,
+            font=ctk.CTkFont(size=12)
+        ).pack(side="left")
+
         # Progress section
         self.progress_frame = ctk.CTkFrame(self.tab_file, corner_radius=10, fg_color=("gray90", "gray17"))
         self.progress_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=(0, 10))
@@ -556,9 +636,93 @@ class FootfallApp(ctk.CTk):
             font=ctk.CTkFont(size=15)
         ).pack(pady=10, padx=30)
 
+        # Performance
+        perf_frame = ctk.CTkFrame(settings_container, corner_radius=10)
+        perf_frame.grid(row=1, column=0, columnspan=2, sticky="ew", padx=0, pady=(10, 5))
+
+        ctk.CTkLabel(
+            perf_frame,
+            text="🚀 Performance",
+            font=ctk.CTkFont(size=18, weight="bold")
+        ).grid(row=0, column=0, columnspan=8, pady=(20, 15))
+
+        perf_options = [
+            ("Device", self.perf_device, list(DEVICES)),
+            ("Skip Frames", self.perf_skip, [str(n) for n in range(6)]),
+            ("Inference Size", self.perf_imgsz, [str(size) for size in IMAGE_SIZES]),
+            ("Tracker", self.perf_tracker, list(TRACKERS)),
+            ("Backend", self.perf_backend, list(BACKENDS)),
+            ("Live Target FPS", self.perf_target_fps, ["Off", "10", "15", "20", "25", "30"])
+        ]
+        for i, (label, variable, values) in enumerate(perf_options):
+            row, column = divmod(i, 3)
+            ctk.CTkLabel(perf_frame, text=f"{label}:", font=ctk.CTkFont(size=13)).grid(
+                row=row + 1, column=column * 2, padx=(30, 5), pady=8, sticky="e")
+            ctk.CTkOptionMenu(
+                perf_frame,
+                values=values,
+                variable=variable,
+                command=self.save_performance_settings,
+                width=130,
+                font=ctk.CTkFont(size=12)
+            ).grid(row=row + 1, column=column * 2 + 1, padx=(0, 15), pady=8, sticky="w")
+
+        ctk.CTkSwitch(
+            perf_frame,
+            text="Half Precision (FP16, CUDA only)",
+            variable=self.perf_half,
+            command=self.save_performance_settings,
+            font=ctk.CTkFont(size=13)
+        ).grid(row=3, column=0, columnspan=3, padx=30, pady=8, sticky="w")
+
+        ctk.CTkLabel(
+            perf_frame,
+            text=f"Saved to {config_path} • applied when the next stream or file starts (skip frames immediately)",
+            font=ctk.CTkFont(size=11),
+            text_color="gray"
+        ).grid(row=4, column=0, columnspan=8, padx=30, pady=(0, 15), sticky="w")
+
+        # Live tuning
+        tuning_frame = ctk.CTkFrame(settings_container, corner_radius=10)
+        tuning_frame.grid(row=2, column=0, columnspan=2, sticky="ew", padx=0, pady=(10, 5))
+        tuning_frame.grid_columnconfigure(1, weight=1)
+
+        ctk.CTkLabel(
+            tuning_frame,
+            text="🎯 Live Tuning",
+            font=ctk.CTkFont(size=18, weight="bold")
+        ).grid(row=0, column=0, columnspan=3, pady=(20, 15))
+
+        self.tuning_labels = {}
+        tuning_sliders = [
+            ("Counting Line (% height)", self.line_position, 5, 95, 90),
+            ("Confidence", self.confidence, 0.1, 0.9, 16)
+        ]
+        for i, (label, variable, low, high, steps) in enumerate(tuning_sliders):
+            ctk.CTkLabel(tuning_frame, text=f"{label}:", font=ctk.CTkFont(size=13)).grid(
+                row=i + 1, column=0, padx=(30, 5), pady=8, sticky="e")
+            ctk.CTkSlider(
+                tuning_frame,
+                from_=low,
+                to=high,
+                number_of_steps=steps,
+                variable=variable,
+                command=self.apply_live_tuning
+            ).grid(row=i + 1, column=1, padx=5, pady=8, sticky="ew")
+            self.tuning_labels[label] = ctk.CTkLabel(tuning_frame, text="", width=60, font=ctk.CTkFont(size=13))
+            self.tuning_labels[label].grid(row=i + 1, column=2, padx=(5, 30), pady=8, sticky="w")
+        self.update_tuning_labels()
+
+        ctk.CTkLabel(
+            tuning_frame,
+            text="Applied to the running counter without reloading the model or losing tracks",
+            font=ctk.CTkFont(size=11),
+            text_color="gray"
+        ).grid(row=3, column=0, columnspan=3, padx=30, pady=(0, 15), sticky="w")
+
         # Info
         info_frame = ctk.CTkFrame(settings_container, corner_radius=10, fg_color=("gray90", "gray17"))
-        info_frame.grid(row=1, column=0, columnspan=2, sticky="ew", padx=0, pady=(10, 5))
+        info_frame.grid(row=3, column=0, columnspan=2, sticky="ew", padx=0, pady=(10, 5))
 
         ctk.CTkLabel(
             info_frame,
@@ -597,13 +761,73 @@ class FootfallApp(ctk.CTk):
             self.file_input_label.configure(text=f"Selected: {filename}")
             self.file_process_btn.configure(state="normal")
 
+    def save_performance_settings(self, *_):
+        """Persist the Settings tab's performance options; they apply to the next counter"""
+        target_fps = self.perf_target_fps.get()
+        self.perf_config = PerformanceConfig(
+            model=self.perf_config.model,
+            device=self.perf_device.get(),
+            half_precision=self.perf_half.get(),
+            skip_frames=int(self.perf_skip.get()),
+            imgsz=int(self.perf_imgsz.get()),
+            tracker=self.perf_tracker.get(),
+            backend=self.perf_backend.get(),
+            target_fps=0.0 if target_fps == "Off" else float(target_fps)
+        )
+        if self.counter:
+            self.counter.configure(skip_frames=self.perf_config.skip_frames)
+        try:
+            self.perf_config.save(config_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save settings: {e}")
+
+    def update_tuning_labels(self):
+        self.tuning_labels["Counting Line (% height)"].configure(text=f"{self.line_position.get():.0f}%")
+        self.tuning_labels["Confidence"].configure(text=f"{self.confidence.get():.2f}")
+
+    def live_tuning_settings(self):
+        return {'roi_line_y': None, 'roi_line_position': round(self.line_position.get()) / 100,
+                'confidence_threshold': round(self.confidence.get(), 2)}
+
+    def apply_live_tuning(self, *_):
+        """Move the counting line / change the confidence of the running counter between frames"""
+        self.update_tuning_labels()
+        if self.counter:
+            self.counter.configure(**self.live_tuning_settings())
+
+    def create_counter(self, camera_id, time_field='wall_time', time_offset=0.0, live=False):
+        """Create a counter whose crossings feed the persistent aggregation store"""
+        if self.counter:
+            self.counter.close()
+        store = AggregationStore(stats_db_path, time_field=time_field, time_offset=time_offset)
+        self.current_camera = camera_id
+        self.session_start = time.time()
+        heatmaps = HeatmapStore(heatmap_dir, camera_id, time_field=time_field, time_offset=time_offset)
+        tuning = self.live_tuning_settings()
+        counter = FootfallCounter(event_sinks=[store], camera_id=camera_id, heatmap_store=heatmaps,
+                                  confidence_threshold=tuning.pop('confidence_threshold'),
+                                  **self.perf_config.counter_kwargs())
+        counter.configure(**tuning)
+        self.metrics_sources[:] = [counter.metrics]
+
+        if live:
+            # Live streams carry their counts across restarts
+            filename = re.sub(r'[^A-Za-z0-9_.-]+', '_', camera_id) + ".json"
+            checkpoint = counter.enable_checkpoints(os.path.join(checkpoint_dir, filename))
+            state = checkpoint.load()
+            if state:
+                counter.restore_state(state, restore_position=False)
+            if self.perf_config.target_fps:
+                counter.enable_adaptive_quality(self.perf_config.target_fps)
+        return counter
+
     def start_webcam(self):
         """Start webcam"""
         if self.processing:
             messagebox.showwarning("Warning", "Already processing!", weight = "bold")
             return
 
-        self.counter = FootfallCounter(model_path='yolov8n.pt')
+        self.counter = self.create_counter("webcam-0", live=True)
         self.current_source = 0
         self.processing = True
         self.status_label.configure(text="Processing • Webcam", fg_color= "green", padx=60, pady=10)
@@ -625,7 +849,9 @@ class FootfallApp(ctk.CTk):
             messagebox.showwarning("Warning", "Please enter an RTSP URL")
             return
 
-        self.counter = FootfallCounter(model_path='yolov8n.pt')
+        # Camera IDs are persisted, so keep credentials out of them
+        parsed = urlparse(rtsp_url)
+        self.counter = self.create_counter(f"rtsp-{parsed.hostname or 'stream'}{parsed.path}", live=True)
         self.current_source = rtsp_url
         self.processing = True
         self.status_label.configure(text=f"Processing • RTSP", fg_color= "green", padx=60, pady=10)
@@ -646,42 +872,86 @@ class FootfallApp(ctk.CTk):
             messagebox.showwarning("Warning", "Please select a video file first")
             return
 
-        output_path = filedialog.asksaveasfilename(
-            title="Save Processed Video",
-            defaultextension=".mp4",
-            filetypes=[("MP4 files", "*.mp4"), ("All files", "*.*")]
-        )
-
-        if not output_path:
-            return
+        output_path = None
+        if self.save_video.get():
+            output_path = filedialog.asksaveasfilename(
+                title="Save Processed Video",
+                defaultextension=".mp4",
+                filetypes=[("MP4 files", "*.mp4"), ("All files", "*.*")]
+            )
 
-        self.counter = FootfallCounter(model_path='yolov8n.pt')
+            if not output_path:
+                return
+
+        # Counting the same recording twice would double its rollups and heatmaps, so replace them
+        camera_id = os.path.basename(self.selected_input_file)
+        store = AggregationStore(stats_db_path)
+        if store.totals(camera_id=camera_id):
+            if not messagebox.askyesno("Already Counted",
+                                       f"{camera_id} is already in the statistics.\nReplace its earlier counts?"):
+                return
+            store.delete(camera_id)
+            HeatmapStore(heatmap_dir, camera_id).delete()
+
+        # Recorded footage is bucketed by media time from the estimated recording start
+        # (file modification time minus clip duration)
+        cap = cv2.VideoCapture(self.selected_input_file)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps if fps else 0.0
+        cap.release()
+        recording_start = os.path.getmtime(self.selected_input_file) - duration
+
+        self.counter = self.create_counter(camera_id, time_field='media_time', time_offset=recording_start)
+        self.current_source = self.selected_input_file
         self.processing = True
         self.file_process_btn.configure(state="disabled")
         self.file_progress.set(0)
         self.file_progress_label.configure(text="0% - Starting...")
         self.status_label.configure(text="Processing • File", fg_color= "green", padx=60, pady=10)
 
-        threading.Thread(
+        self.video_thread = threading.Thread(
             target=self._process_file,
             args=(self.selected_input_file, output_path),
             daemon=True
-        ).start()
+        )
+        self.video_thread.start()
+
+    def _open_live_capture(self, source, metrics):
+        """Threaded capture that drops the oldest frames when counting falls behind, or None
+
+        Its queue depth and dropped frames are exported through the counter's metrics, so a
+        stream the counter can't keep up with shows up as frames_dropped.
+        """
+        cap = ThreadedVideoCapture(source, drop_when_full=True)
+        if not cap.cap.isOpened():
+            cap.release()
+            return None
+        metrics.register_gauge('queue_depth', cap.queue_depth, queue='capture')
+        metrics.register_gauge('frames_dropped', lambda: cap.dropped, source='capture')
+        return cap.start()
+
+    def _close_live_capture(self, cap, metrics):
+        cap.release()
+        metrics.unregister_gauge('queue_depth', queue='capture')
+        metrics.unregister_gauge('frames_dropped', source='capture')
 
     def _process_webcam(self):
         """Process webcam"""
-        cap = cv2.VideoCapture(self.current_source)
+        metrics = self.counter.metrics
+        cap = self._open_live_capture(self.current_source, metrics)
 
-        if not cap.isOpened():
+        if cap is None:
             messagebox.showerror("Error", "Cannot open webcam")
             self.processing = False
             return
 
         try:
             while self.processing:
-                ret, frame = cap.read()
+                with metrics.stage('decode'):
+                    ret, frame = cap.read()
                 if not ret:
-                    continue
+                    # The capture thread stops at the first failed read
+                    break
 
                 processed_frame = self.counter.process_frame(
                     frame,
@@ -690,11 +960,13 @@ class FootfallApp(ctk.CTk):
                 )
 
                 self.current_frame = processed_frame
+                if self.preview_server:
+                    self.preview_server.publish(processed_frame)
                 self.update_statistics()
                 self.display_frame_full_res(processed_frame, self.webcam_video_label)
 
         finally:
-            cap.release()
+            self._close_live_capture(cap, metrics)
             self.processing = False
             self.webcam_start_btn.configure(state="normal")
             self.webcam_stop_btn.configure(state="disabled")
@@ -702,18 +974,21 @@ class FootfallApp(ctk.CTk):
 
     def _process_rtsp(self):
         """Process RTSP"""
-        cap = cv2.VideoCapture(self.current_source)
+        metrics = self.counter.metrics
+        cap = self._open_live_capture(self.current_source, metrics)
 
-        if not cap.isOpened():
+        if cap is None:
             messagebox.showerror("Error", f"Cannot connect to RTSP stream")
             self.processing = False
             return
 
         try:
             while self.processing:
-                ret, frame = cap.read()
+                with metrics.stage('decode'):
+                    ret, frame = cap.read()
                 if not ret:
-                    continue
+                    # The capture thread stops at the first failed read
+                    break
 
                 processed_frame = self.counter.process_frame(
                     frame,
@@ -722,11 +997,13 @@ class FootfallApp(ctk.CTk):
                 )
 
                 self.current_frame = processed_frame
+                if self.preview_server:
+                    self.preview_server.publish(processed_frame)
                 self.update_statistics()
                 self.display_frame_full_res(processed_frame, self.rtsp_video_label)
 
         finally:
-            cap.release()
+            self._close_live_capture(cap, metrics)
             self.processing = False
             self.rtsp_start_btn.configure(state="normal")
             self.rtsp_stop_btn.configure(state="disabled")
@@ -736,28 +1013,42 @@ class FootfallApp(ctk.CTk):
         """Process file"""
         try:
             cap = cv2.VideoCapture(input_path)
+            self.counter.source_fps = cap.get(cv2.CAP_PROP_FPS) or None
             fps = int(cap.get(cv2.CAP_PROP_FPS))
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            out = None
+            if output_path:
+                out = AnnotatedVideoWriter(
+                    output_path, fps, (width, height),
+                    backend=self.video_backend.get().lower(),
+                    metrics=self.counter.metrics
+                )
 
             frame_count = 0
+            encoder_stats = None
 
-            while cap.isOpened():
-                ret, frame = cap.read()
+            while cap.isOpened() and not self.closing:
+                with self.counter.metrics.stage('decode'):
+                    ret, frame = cap.read()
                 if not ret:
                     break
 
+                # Without a video output only the preview frames need drawing
+                remote_preview = self.preview_server is not None and self.preview_server.wants_frame()
                 processed_frame = self.counter.process_frame(
                     frame,
                     show_heatmap=self.show_heatmap.get(),
-                    show_trajectories=self.show_trajectories.get()
+                    show_trajectories=self.show_trajectories.get(),
+                    render=out is not None or remote_preview or (frame_count + 1) % 10 == 0
                 )
 
-                out.write(processed_frame)
+                if out is not None:
+                    out.write(processed_frame)
+                if remote_preview:
+                    self.preview_server.publish(processed_frame)
 
                 frame_count += 1
                 progress = frame_count / total_frames
@@ -774,7 +1065,10 @@ class FootfallApp(ctk.CTk):
                     self.display_frame_full_res(processed_frame, self.file_video_label)
 
             cap.release()
-            out.release()
+            if out is not None:
+                encoder_stats = out.release()
+            if self.closing:
+                return
 
             self.file_progress.set(1.0)
             self.file_progress_label.configure(text="100% - Complete!")
@@ -785,13 +1079,21 @@ class FootfallApp(ctk.CTk):
                 'total_count': self.counter.entry_count + self.counter.exit_count
             }
 
+            if encoder_stats:
+                saved_text = (
+                    f"Saved to: {output_path}\n"
+                    f"Encoder: {encoder_stats['backend']} @ {encoder_stats['encoder_fps']} FPS"
+                )
+            else:
+                saved_text = "Video output disabled"
+
             messagebox.showinfo(
                 "Success",
                 f"Processing complete!\n\n"
                 f"Entries: {result['entry_count']}\n"
                 f"Exits: {result['exit_count']}\n"
                 f"Total: {result['total_count']}\n\n"
-                f"Saved to: {output_path}"
+                f"{saved_text}"
             )
 
         except Exception as e:
@@ -804,6 +1106,8 @@ class FootfallApp(ctk.CTk):
 
     def display_frame_full_res(self, frame, label_widget):
         """Display frame in FULL RESOLUTION with proper aspect ratio - NO CROPPING"""
+        start = time.perf_counter()
+
         # Get original dimensions
         height, width = frame.shape[:2]
 
@@ -838,6 +1142,9 @@ class FootfallApp(ctk.CTk):
         label_widget.configure(image=imgtk, text="")
         label_widget.image = imgtk
 
+        if self.counter:
+            self.counter.metrics.observe('display', time.perf_counter() - start)
+
     def update_statistics(self):
         """Update statistics"""
         if self.counter:
@@ -862,9 +1169,9 @@ class FootfallApp(ctk.CTk):
     def reset_counts(self):
         """Reset counts"""
         if self.counter:
-            self.counter.entry_count = 0
-            self.counter.exit_count = 0
-            self.counter.counted_ids.clear()
+            self.counter.reset_counts()
+            if self.counter.checkpoint:
+                self.counter.checkpoint.save(self.counter.get_state())
             self.update_statistics()
             messagebox.showinfo("Success", "All counts reset")
 
@@ -885,8 +1192,8 @@ class FootfallApp(ctk.CTk):
             messagebox.showinfo("Success", f"Screenshot saved to:\n{save_path}")
 
     def export_report(self):
-        """Export report"""
-        if not self.counter:
+        """Export report from the aggregation store"""
+        if not os.path.exists(stats_db_path):
             messagebox.showinfo("Info", "No data to export")
             return
 
@@ -898,19 +1205,63 @@ class FootfallApp(ctk.CTk):
 
         if save_path:
             try:
+                if self.counter:
+                    # Make sure crossings still queued for the store are included
+                    self.counter.events.flush()
+                store = AggregationStore(stats_db_path)
+                # Zone crossings share the store under their zone names; footfall is the counting line's
+                line = self.counter.line_name if self.counter else 'main'
+                hourly = store.last(7 * 86400, bucket='1h', line=line)
+                totals = store.totals()
+
                 with open(save_path, 'w') as f:
                     f.write("="*60 + "\n")
                     f.write("AI Footfall Counter - Statistics Report\n")
                     f.write("="*60 + "\n\n")
                     f.write(f"Generated: {self.get_current_time()}\n")
                     f.write(f"Source: {self.current_source}\n\n")
-                    f.write(f"Total Entries: {self.entry_count}\n")
-                    f.write(f"Total Exits: {self.exit_count}\n")
-                    f.write(f"Total Count: {self.total_count}\n")
-                    f.write(f"Average FPS: {self.current_fps:.2f}\n")
+
+                    if self.counter:
+                        if self.counter.source_fps:
+                            # Recorded footage is bucketed by media time, before the session started,
+                            # and a file run starts from zero, so its own counts are the session's
+                            entries, exits = self.counter.entry_count, self.counter.exit_count
+                        else:
+                            # Live counters carry restored counts; count this session's crossings only
+                            session = store.totals(start=self.session_start, camera_id=self.current_camera,
+                                                   line=line)
+                            entries = sum(row['entries'] for row in session)
+                            exits = sum(row['exits'] for row in session)
+                        f.write(f"Session ({self.current_camera}):\n")
+                        f.write(f"  Entries: {entries}\n")
+                        f.write(f"  Exits: {exits}\n")
+                        f.write(f"  Average FPS: {self.current_fps:.2f}\n\n")
+
+                    f.write("All-time totals:\n")
+                    f.write(f"{'Camera':<30}{'Line':<10}{'Entries':>10}{'Exits':>10}\n")
+                    for row in totals:
+                        f.write(f"{row['camera_id']:<30}{row['line']:<10}{row['entries']:>10}{row['exits']:>10}\n")
+
+                    f.write(f"\nHourly footfall across line '{line}' (last 7 days):\n")
+                    f.write(f"{'Hour':<22}{'Entries':>10}{'Exits':>10}\n")
+                    for row in hourly:
+                        hour = time.strftime("%Y-%m-%d %H:00", time.localtime(row['bucket_start']))
+                        f.write(f"{hour:<22}{row['entries']:>10}{row['exits']:>10}\n")
+
                     f.write("\n" + "="*60 + "\n")
 
-                messagebox.showinfo("Success", f"Report exported to:\n{save_path}")
+                message = f"Report exported to:\n{save_path}"
+                if self.counter and self.counter.heatmap_store is not None:
+                    # Density over the last 7 days (recorded footage: the whole recording)
+                    self.counter.heatmap_store.flush()
+                    start = None if self.counter.source_fps else time.time() - 7 * 86400
+                    density = self.counter.heatmap_store.density(start)
+                    if density['grid'] is not None:
+                        heatmap_path = os.path.splitext(save_path)[0] + "_heatmap.png"
+                        cv2.imwrite(heatmap_path, render_heatmap(density['grid'], density['frame_size'],
+                                                                 background=self.current_frame))
+                        message += f"\n{heatmap_path}"
+                messagebox.showinfo("Success", message)
 
             except Exception as e:
                 messagebox.showerror("Error", f"Export failed: {str(e)}")
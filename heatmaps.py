@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Heatmap Store
+Downsampled, non-decaying person-density grids snapshotted per time bucket as
+compressed files, with range sums, comparisons and on-demand rendering
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+HEATMAP_DIR = 'heatmaps'
+
+
+def _camera_dir(directory, camera_id):
+    return os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]+', '_', camera_id))
+
+
+class HeatmapStore:
+    """Accumulates centroid observations on a cell_size grid, one file per bucket
+
+    Unlike the live overlay (which decays and lives at full resolution), each bucket
+    holds raw per-cell observation counts plus the number of frames sampled, so buckets
+    add up exactly and densities compare across ranges of different length. A 1080p
+    grid at the default 8 px cells is 135 x 240 float32 (~130 KB before compression).
+    Buckets use wall-clock time, or media time plus time_offset for recorded footage,
+    like AggregationStore. Reopening a bucket adds to it, so footage that is counted
+    again must be delete()d first, as with AggregationStore.delete().
+    """
+
+    def __init__(self, directory=HEATMAP_DIR, camera_id='camera-0', bucket_seconds=3600, cell_size=8,
+                 time_field='wall_time', time_offset=0.0, flush_interval=60.0):
+        self.directory = _camera_dir(directory, camera_id)
+        self.camera_id = camera_id
+        self.bucket_seconds = bucket_seconds
+        self.cell_size = cell_size
+        self.time_field = time_field
+        self.time_offset = time_offset
+        self.flush_interval = flush_interval
+        self.bucket = None
+        self.grid = None
+        self.frame_size = None
+        self.frames = 0
+        self.points = 0
+        self.last_flush = time.monotonic()
+        # add() runs on the processing thread, flush() also from report exports
+        self.lock = threading.RLock()
+
+    def _path(self, bucket):
+        return os.path.join(self.directory, f"{bucket}.npz")
+
+    def _timestamp(self, wall_time, media_time):
+        if self.time_field == 'media_time' and media_time is not None:
+            return media_time + self.time_offset
+        return wall_time
+
+    def add(self, centroids, frame_size, wall_time, media_time=None):
+        """Record one processed frame's (x, y) person centroids; frame_size is (width, height)"""
+        bucket = int(self._timestamp(wall_time, media_time) // self.bucket_seconds) * self.bucket_seconds
+        with self.lock:
+            if bucket != self.bucket or tuple(frame_size) != self.frame_size:
+                self.flush()
+                self._open(bucket, tuple(frame_size))
+            self.frames += 1
+            if len(centroids):
+                points = np.asarray(centroids, dtype=np.int64).reshape(-1, 2) // self.cell_size
+                rows, cols = self.grid.shape
+                np.add.at(self.grid, (np.clip(points[:, 1], 0, rows - 1), np.clip(points[:, 0], 0, cols - 1)), 1)
+                self.points += len(points)
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def _open(self, bucket, frame_size):
+        """Start (or continue, after a restart) accumulating a bucket"""
+        width, height = frame_size
+        shape = (-(-height // self.cell_size), -(-width // self.cell_size))
+        self.bucket, self.frame_size = bucket, frame_size
+        self.grid, self.frames, self.points = np.zeros(shape, dtype=np.float32), 0, 0
+        existing = load_bucket(self._path(bucket))
+        if existing is not None and existing['grid'].shape == shape and existing['cell_size'] == self.cell_size:
+            self.grid += existing['grid']
+            self.frames, self.points = existing['frames'], existing['points']
+
+    def flush(self):
+        """Write the current bucket (atomically) so a crash loses at most flush_interval seconds"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if self.grid is None or self.frames == 0:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._path(self.bucket) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, grid=self.grid, frames=self.frames, points=self.points,
+                                    cell_size=self.cell_size, frame_size=np.array(self.frame_size))
+            os.replace(tmp_path, self._path(self.bucket))
+
+    def close(self):
+        self.flush()
+
+    def delete(self, start=None, end=None):
+        """Remove this camera's buckets in [start, end) before its footage is counted again
+
+        A bucket still being accumulated in that range is dropped too. Returns how many
+        bucket files were removed.
+        """
+        with self.lock:
+            if self.bucket is not None and (start is None or self.bucket >= start) \
+                    and (end is None or self.bucket < end):
+                self.bucket, self.grid, self.frame_size, self.frames, self.points = None, None, None, 0, 0
+            removed = 0
+            for bucket in self.buckets(start, end):
+                try:
+                    os.remove(self._path(bucket))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            return removed
+
+    # Queries
+
+    def buckets(self, start=None, end=None):
+        """Bucket start times in [start, end)"""
+        starts = sorted(int(os.path.basename(p)[:-4]) for p in glob.glob(os.path.join(self.directory, '*.npz')))
+        return [b for b in starts if (start is None or b >= start) and (end is None or b < end)]
+
+    def sum(self, start=None, end=None):
+        """Summed grid, frames and points over [start, end), one bucket in memory at a time"""
+        total, frames, points, frame_size = None, 0, 0, None
+        for bucket in self.buckets(start, end):
+            data = load_bucket(self._path(bucket))
+            if data is None:
+                continue
+            if total is None:
+                total, frame_size = data['grid'].copy(), data['frame_size']
+            elif data['grid'].shape != total.shape:
+                # Resolution changed within the range; the later footage can't be added cell by cell
+                print(f"⚠️ Skipping heatmap bucket {bucket}: grid {data['grid'].shape} != {total.shape}")
+                continue
+            else:
+                total += data['grid']
+            frames += data['frames']
+            points += data['points']
+        return {'grid': total, 'frames': frames, 'points': points, 'frame_size': frame_size,
+                'cell_size': self.cell_size}
+
+    def density(self, start=None, end=None):
+        """Mean people per cell per sampled frame over [start, end)"""
+        summed = self.sum(start, end)
+        if summed['grid'] is None or summed['frames'] == 0:
+            return summed
+        summed['grid'] = summed['grid'] / summed['frames']
+        return summed
+
+    def compare(self, range_a, range_b):
+        """Per-frame density of range_b minus range_a (positive where b is busier)"""
+        a, b = self.density(*range_a), self.density(*range_b)
+        if a['grid'] is None or b['grid'] is None or a['grid'].shape != b['grid'].shape:
+            raise ValueError("Both ranges need heatmap data at the same resolution")
+        return dict(b, grid=b['grid'] - a['grid'], frames_a=a['frames'], frames_b=b['frames'])
+
+
+def load_bucket(path):
+    try:
+        with np.load(path) as data:
+            return {'grid': data['grid'], 'frames': int(data['frames']), 'points': int(data['points']),
+                    'cell_size': int(data['cell_size']), 'frame_size': tuple(int(v) for v in data['frame_size'])}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def render(grid, frame_size, sigma=30, background=None, diverging=False):
+    """BGR image of a (summed, density or compare) grid at frame_size (width, height)
+
+    The grid is upscaled and blurred with the live overlay's sigma (in frame pixels),
+    then coloured with the live JET map, or with a blue-white-red map for comparisons,
+    and blended 70/30 with background if one is given.
+    """
+    width, height = frame_size
+    cell = width / grid.shape[1]
+    smooth = cv2.GaussianBlur(grid.astype(np.float32), (0, 0), max(sigma / cell, 0.5))
+    smooth = cv2.resize(smooth, (width, height), interpolation=cv2.INTER_LINEAR)
+    if diverging:
+        peak = float(np.abs(smooth).max()) or 1.0
+        scaled = np.clip(smooth / peak, -1, 1)
+        colored = np.empty((height, width, 3), dtype=np.uint8)
+        colored[..., 0] = (255 * (1 - np.clip(scaled, 0, 1))).astype(np.uint8)
+        colored[..., 2] = (255 * (1 + np.clip(scaled, -1, 0))).astype(np.uint8)
+        colored[..., 1] = np.minimum(colored[..., 0], colored[..., 2])
+    else:
+        peak = float(smooth.max()) or 1.0
+        colored = cv2.applyColorMap(cv2.convertScaleAbs(smooth, alpha=255.0 / peak), cv2.COLORMAP_JET)
+    if background is not None:
+        background = cv2.resize(background, (width, height))
+        colored = cv2.addWeighted(background, 0.7, colored, 0.3, 0)
+    return colored
+
+
+def parse_time(text):
+    """Unix time from an ISO date/time ('2024-05-01' or '2024-05-01T09:00') or a number"""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Render stored person-density heatmaps")
+    parser.add_argument('camera_id', help="Camera whose heatmaps to render")
+    parser.add_argument('--dir', default=HEATMAP_DIR, help="Heatmap store directory")
+    parser.add_argument('--start', type=parse_time, default=None, help="Range start (ISO time)")
+    parser.add_argument('--end', type=parse_time, default=None, help="Range end (ISO time, exclusive)")
+    parser.add_argument('--compare', type=parse_time, nargs=2, metavar=('START', 'END'), default=None,
+                        help="Render the change from this baseline range to --start/--end")
+    parser.add_argument('--background', default=None, help="Image or video to blend the heatmap over")
+    parser.add_argument('--output', default='heatmap.png', help="Output image path")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    store = HeatmapStore(args.dir, args.camera_id)
+    if args.compare:
+        result = store.compare(tuple(args.compare), (args.start, args.end))
+    else:
+        result = store.density(args.start, args.end)
+    if result['grid'] is None:
+        print(f"No heatmap data for {args.camera_id} in {store.directory}")
+        return 2
+
+    background = None
+    if args.background:
+        background = cv2.imread(args.background)
+        if background is None:
+            cap = cv2.VideoCapture(args.background)
+            _, background = cap.read()
+            cap.release()
+    image = render(result['grid'], result['frame_size'], background=background, diverging=bool(args.compare))
+    cv2.imwrite(args.output, image)
+    print(f"🔥 {len(store.buckets(args.start, args.end))} buckets, {result['frames']} frames → {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Performance Metrics
+Per-stage latency percentiles, counters and queue-depth gauges, exposed as
+Prometheus text on a local HTTP endpoint and as a periodic log line
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGES = ['decode', 'detect', 'embed', 'track', 'count', 'heatmap', 'draw', 'encode', 'display']
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class StageStats:
+    """Sliding window of stage durations plus lifetime count/sum"""
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        # Stages such as encode are observed from other threads
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def quantiles(self):
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class PerformanceMetrics:
+    """Stage timers, counters and gauges for one counter/stream"""
+
+    def __init__(self, camera_id='camera-0', window=300):
+        self.camera_id = camera_id
+        self.window = window
+        self.stages = {name: StageStats(window) for name in STAGES}
+        self.counters = {'frames_total': 0, 'frames_processed': 0, 'frames_skipped': 0}
+        self.gauges = {}
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(self.window)
+        stats.add(seconds)
+
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def register_gauge(self, name, fn, **labels):
+        """fn() is sampled whenever metrics are rendered, e.g. a queue's qsize"""
+        self.gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def unregister_gauge(self, name, **labels):
+        self.gauges.pop((name, tuple(sorted(labels.items()))), None)
+
+    def _sample_gauges(self):
+        values = []
+        for (name, labels), fn in list(self.gauges.items()):
+            try:
+                values.append((name, labels, float(fn())))
+            except Exception:
+                continue
+        return values
+
+    def summary(self):
+        """Plain dict for JSON reports: per-stage ms percentiles, counters and gauges"""
+        stages = {}
+        for name, stats in self.stages.items():
+            if stats.count == 0:
+                continue
+            q = stats.quantiles()
+            stages[name] = {
+                'count': stats.count,
+                'mean_ms': round(stats.total / stats.count * 1000, 3),
+                'p50_ms': round(q[0.5] * 1000, 3),
+                'p90_ms': round(q[0.9] * 1000, 3),
+                'p99_ms': round(q[0.99] * 1000, 3)
+            }
+        gauges = {}
+        for name, labels, value in self._sample_gauges():
+            key = name + ''.join(f"[{v}]" for _, v in labels)
+            gauges[key] = value
+        return {'stages': stages, 'counters': dict(self.counters), 'gauges': gauges}
+
+    def families(self):
+        """Prometheus metric families: name -> (type, help, sample lines)"""
+        camera = f'camera="{self.camera_id}"'
+        families = {}
+        samples = []
+        for name, stats in self.stages.items():
+            if stats.count == 0:
+                continue
+            for q, value in stats.quantiles().items():
+                samples.append(f'footfall_stage_latency_seconds{{{camera},stage="{name}",quantile="{q}"}} {value:.6f}')
+            samples.append(f'footfall_stage_latency_seconds_sum{{{camera},stage="{name}"}} {stats.total:.6f}')
+            samples.append(f'footfall_stage_latency_seconds_count{{{camera},stage="{name}"}} {stats.count}')
+        families['footfall_stage_latency_seconds'] = ('summary', "Per-stage latency over the recent window", samples)
+        for name, value in self.counters.items():
+            name = name if name.endswith('_total') else name + '_total'
+            families[f'footfall_{name}'] = ('counter', None, [f"footfall_{name}{{{camera}}} {value}"])
+        for name, labels, value in self._sample_gauges():
+            label_text = ''.join(f',{k}="{v}"' for k, v in labels)
+            family = families.setdefault(f'footfall_{name}', ('gauge', None, []))
+            family[2].append(f"footfall_{name}{{{camera}{label_text}}} {value:g}")
+        return families
+
+    def render_prometheus(self):
+        return render_prometheus([self])
+
+    def log_line(self):
+        """One-line summary, e.g. for periodic logging"""
+        parts = []
+        for name, stats in self.stages.items():
+            if stats.count:
+                q = stats.quantiles()
+                parts.append(f"{name} p50={q[0.5] * 1000:.1f}ms p99={q[0.99] * 1000:.1f}ms")
+        counters = ' '.join(f"{k}={v}" for k, v in self.counters.items())
+        gauges = ' '.join(f"{name}{''.join(f'[{v}]' for _, v in labels)}={value:g}"
+                          for name, labels, value in self._sample_gauges())
+        return f"📈 [{self.camera_id}] {' | '.join(parts)} || {counters} {gauges}".rstrip()
+
+
+def render_prometheus(sources):
+    """Text exposition for several metrics objects, grouped by metric family"""
+    merged = {}
+    for metrics in sources:
+        for name, (kind, help_text, samples) in metrics.families().items():
+            merged.setdefault(name, (kind, help_text, []))[2].extend(samples)
+    lines = []
+    for name, (kind, help_text, samples) in merged.items():
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serves /metrics in Prometheus text format from a background thread"""
+
+    def __init__(self, metrics, port=9108, host='127.0.0.1'):
+        self.metrics = metrics
+        sources = metrics if isinstance(metrics, (list, tuple)) else [metrics]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = render_prometheus(sources).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"📊 Metrics at http://{self.server.server_address[0]}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsLogger:
+    """Prints metrics.log_line() every interval seconds"""
+
+    def __init__(self, metrics, interval=60.0):
+        self.metrics = metrics
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(self.metrics.log_line())
+
+    def stop(self):
+        self._stop.set()
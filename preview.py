@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Preview Server
+Local asyncio HTTP server for remote viewers: the latest annotated frame as MJPEG,
+current counts as JSON or Server-Sent Events. Each frame is JPEG-encoded once, at a
+throttled rate and only while someone is watching, and shared by all clients.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+INDEX_HTML = """<!doctype html>
+<html><head><title>Footfall preview</title>
+<style>body{background:#111;color:#eee;font-family:sans-serif;margin:16px}img{max-width:100%}</style></head>
+<body><h3 id="stats">Connecting...</h3><img src="/stream.mjpg">
+<script>
+new EventSource('/events').onmessage = function (e) {
+  var s = JSON.parse(e.data);
+  document.getElementById('stats').textContent =
+    s.camera_id + ' | entries ' + s.entry_count + ' | exits ' + s.exit_count + ' | total ' + s.total_count;
+};
+</script></body></html>
+"""
+
+
+def counter_stats(counter):
+    """Counts snapshot of a FootfallCounter (or None while no counter is running)"""
+    if counter is None:
+        return {'camera_id': None, 'entry_count': 0, 'exit_count': 0, 'total_count': 0}
+    return {
+        'camera_id': counter.camera_id, 'entry_count': counter.entry_count, 'exit_count': counter.exit_count,
+        'total_count': counter.entry_count + counter.exit_count, 'frame_index': counter.frame_counter
+    }
+
+
+class PreviewServer:
+    """Serves /, /stream.mjpg, /frame.jpg, /stats.json and /events from a background thread
+
+    publish(frame) is called by the processing loop. It returns immediately unless a
+    frame is due (max_fps) and someone is connected, in which case it copies the frame
+    into a reused buffer; the copy is encoded on the server's thread pool. stats is a
+    callable returning a JSON-serialisable dict, sampled every stats_interval seconds.
+    """
+
+    def __init__(self, stats, port=8090, host='127.0.0.1', max_fps=10.0, quality=80, max_width=1280,
+                 stats_interval=0.5):
+        self.stats = stats
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.quality = quality
+        self.max_width = max_width
+        self.stats_interval = stats_interval
+        self.clients = 0
+        self.frames_encoded = 0
+        self.jpeg = None
+        self.stats_json = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        self._encoding = False
+        self._loop = None
+        self._server = None
+        self._frame_ready = None
+        self._stats_ready = None
+        self._thread = None
+        self._started = threading.Event()
+
+    # Processing side
+
+    def wants_frame(self):
+        """True when publish() would use a frame now, so callers can skip rendering otherwise"""
+        return self.clients > 0 and not self._encoding and \
+            time.monotonic() - self._last_publish >= 1.0 / self.max_fps
+
+    def publish(self, frame):
+        if not self.wants_frame() or self._loop is None:
+            return False
+        with self._lock:
+            if self._pending is None or self._pending.shape != frame.shape:
+                self._pending = np.empty_like(frame)
+            np.copyto(self._pending, frame)
+            self._encoding = True
+        self._last_publish = time.monotonic()
+        try:
+            self._loop.call_soon_threadsafe(self._schedule_encode)
+        except (AttributeError, RuntimeError):
+            # Server stopped between the check and the call
+            self._encoding = False
+            return False
+        return True
+
+    # Server side
+
+    def _schedule_encode(self):
+        self._loop.create_task(self._encode())
+
+    def _encode_pending(self):
+        with self._lock:
+            frame = self._pending
+            if self.max_width and frame.shape[1] > self.max_width:
+                scale = self.max_width / frame.shape[1]
+                frame = cv2.resize(frame, (self.max_width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return encoded.tobytes() if ok else None
+
+    async def _encode(self):
+        try:
+            jpeg = await self._loop.run_in_executor(None, self._encode_pending)
+        finally:
+            self._encoding = False
+        if jpeg is not None:
+            self.jpeg = jpeg
+            self.frames_encoded += 1
+            self._frame_ready.set()
+            self._frame_ready = asyncio.Event()
+
+    async def _sample_stats(self):
+        while True:
+            try:
+                stats_json = json.dumps(self.stats())
+            except Exception as e:
+                stats_json = json.dumps({'error': str(e)})
+            if stats_json != self.stats_json:
+                self.stats_json = stats_json
+                self._stats_ready.set()
+                self._stats_ready = asyncio.Event()
+            await asyncio.sleep(self.stats_interval)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) >= 2 else '/'
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self._respond(writer, 405, 'text/plain', b'Method Not Allowed')
+            elif path == '/':
+                await self._respond(writer, 200, 'text/html; charset=utf-8', INDEX_HTML.encode())
+            elif path == '/stats.json':
+                await self._respond(writer, 200, 'application/json', (self.stats_json or '{}').encode())
+            elif path == '/frame.jpg':
+                await self._serve_frame(writer)
+            elif path == '/stream.mjpg':
+                await self._serve_stream(writer)
+            elif path == '/events':
+                await self._serve_events(writer)
+            else:
+                await self._respond(writer, 404, 'text/plain', b'Not Found')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down with viewers still connected
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body):
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n".encode())
+        writer.write(body)
+        await writer.drain()
+
+    async def _wait_for_frame(self, timeout=5.0):
+        try:
+            await asyncio.wait_for(self._frame_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _serve_frame(self, writer):
+        self.clients += 1
+        try:
+            if self.jpeg is None:
+                await self._wait_for_frame()
+        finally:
+            self.clients -= 1
+        if self.jpeg is None:
+            await self._respond(writer, 503, 'text/plain', b'No frame yet')
+        else:
+            await self._respond(writer, 200, 'image/jpeg', self.jpeg)
+
+    async def _serve_stream(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        self.clients += 1
+        try:
+            sent = None
+            while True:
+                if self.jpeg is None or self.jpeg is sent:
+                    await self._wait_for_frame()
+                    continue
+                # Every client sends the same bytes; a slow client just skips to the latest frame
+                sent = self.jpeg
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                             + str(len(sent)).encode() + b"\r\n\r\n" + sent + b"\r\n")
+                await writer.drain()
+        finally:
+            self.clients -= 1
+
+    async def _serve_events(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        sent = None
+        while True:
+            if self.stats_json is not None and self.stats_json is not sent:
+                sent = self.stats_json
+                writer.write(f"data: {sent}\n\n".encode())
+            else:
+                # Comment line as a keep-alive, so proxies don't close idle streams
+                writer.write(b": keep-alive\n\n")
+            await writer.drain()
+            try:
+                await asyncio.wait_for(self._stats_ready.wait(), 15.0)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _main(self):
+        self._frame_ready = asyncio.Event()
+        self._stats_ready = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        stats_task = asyncio.ensure_future(self._sample_stats())
+        self._started.set()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            stats_task.cancel()
+
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._main())
+            # Connected viewers are still streaming; end their handlers before closing the loop
+            pending = asyncio.all_tasks(loop)
+            if pending:
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        finally:
+            self._loop = None
+            self._started.set()
+            loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait(5.0)
+        print(f"📺 Preview at http://{self.host}:{self.port}/")
+        return self
+
+    def stop(self):
+        loop = self._loop
+        if loop is not None and self._server is not None:
+            loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Profiler
+Wraps a bounded window of process_frame calls with cProfile (CPU) or tracemalloc
+(allocations) and dumps a sorted report plus a flamegraph-compatible collapsed-stack file
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_ENV = 'FOOTFALL_PROFILE'
+
+
+class FrameProfiler:
+    """Profiles frames [start_frame, start_frame + num_frames) and dumps the results once"""
+
+    def __init__(self, mode='cprofile', start_frame=30, num_frames=100, output_prefix='footfall_profile'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.start_frame = start_frame
+        self.num_frames = num_frames
+        self.output_prefix = output_prefix
+        self.frames_seen = 0
+        self.frames_profiled = 0
+        self.profiled_time = 0.0
+        self.done = False
+        self.outputs = []
+        self._profile = None
+        self._snapshot_start = None
+
+    @classmethod
+    def from_env(cls):
+        """Build a profiler from FOOTFALL_PROFILE=mode[:start_frame[:num_frames[:output_prefix]]]"""
+        spec = os.environ.get(PROFILE_ENV)
+        if not spec:
+            return None
+        parts = spec.split(':', 3)
+        kwargs = {'mode': parts[0]}
+        if len(parts) > 1 and parts[1]:
+            kwargs['start_frame'] = int(parts[1])
+        if len(parts) > 2 and parts[2]:
+            kwargs['num_frames'] = int(parts[2])
+        if len(parts) > 3 and parts[3]:
+            kwargs['output_prefix'] = parts[3]
+        return cls(**kwargs)
+
+    @contextmanager
+    def frame(self):
+        """Wrap one process_frame call"""
+        self.frames_seen += 1
+        active = not self.done and self.frames_seen > self.start_frame
+        if active:
+            self._start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if active:
+                self._pause()
+                self.profiled_time += time.perf_counter() - start
+                self.frames_profiled += 1
+                if self.frames_profiled >= self.num_frames:
+                    self.finish()
+
+    def _start(self):
+        if self.mode == 'cprofile':
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self._snapshot_start is None:
+            tracemalloc.start(25)
+            self._snapshot_start = tracemalloc.take_snapshot()
+
+    def _pause(self):
+        # Only time inside process_frame is attributed, not capture waits between frames
+        if self.mode == 'cprofile':
+            self._profile.disable()
+
+    def finish(self):
+        """Stop profiling and write the report files (also called for short runs)"""
+        if self.done or self.frames_profiled == 0:
+            self.done = True
+            return self.outputs
+        self.done = True
+        directory = os.path.dirname(os.path.abspath(self.output_prefix))
+        os.makedirs(directory, exist_ok=True)
+        if self.mode == 'cprofile':
+            self._dump_cprofile()
+        else:
+            self._dump_tracemalloc()
+        print(f"🔬 Profiled {self.frames_profiled} frames "
+              f"({self.profiled_time / self.frames_profiled * 1000:.1f} ms/frame): {', '.join(self.outputs)}")
+        return self.outputs
+
+    def _header(self):
+        return (f"Footfall profile ({self.mode}): frames {self.start_frame + 1}-{self.start_frame + self.frames_profiled}, "
+                f"{self.profiled_time / self.frames_profiled * 1000:.2f} ms/frame\n\n")
+
+    def _dump_cprofile(self):
+        prof_path = self.output_prefix + '.prof'
+        report_path = self.output_prefix + '.txt'
+        collapsed_path = self.output_prefix + '.collapsed'
+        self._profile.dump_stats(prof_path)
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(40)
+        stats.sort_stats('tottime').print_stats(40)
+        with open(report_path, 'w') as f:
+            f.write(self._header())
+            f.write(stream.getvalue())
+
+        with open(collapsed_path, 'w') as f:
+            for stack, micros in sorted(collapse_pstats(stats.stats).items()):
+                f.write(f"{stack} {micros}\n")
+        self.outputs = [report_path, prof_path, collapsed_path]
+
+    def _dump_tracemalloc(self):
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        report_path = self.output_prefix + '.txt'
+        collapsed_path = self.output_prefix + '.collapsed'
+
+        with open(report_path, 'w') as f:
+            f.write(self._header())
+            f.write("Top allocation growth by line:\n")
+            for stat in snapshot.compare_to(self._snapshot_start, 'lineno')[:40]:
+                f.write(f"  {stat}\n")
+            f.write("\nLargest live allocations by line:\n")
+            for stat in snapshot.statistics('lineno')[:40]:
+                f.write(f"  {stat}\n")
+
+        stacks = defaultdict(int)
+        for stat in snapshot.statistics('traceback'):
+            frames = [f"{os.path.basename(fr.filename)}:{fr.lineno}" for fr in reversed(stat.traceback)]
+            stacks[';'.join(frames)] += stat.size
+        with open(collapsed_path, 'w') as f:
+            for stack, size in sorted(stacks.items()):
+                f.write(f"{stack} {size}\n")
+        self.outputs = [report_path, collapsed_path]
+
+
+def _label(func):
+    filename, lineno, name = func
+    return f"{name} ({os.path.basename(filename)}:{lineno})" if lineno else name
+
+
+def collapse_pstats(raw_stats, max_depth=64, min_fraction=1e-5):
+    """Approximate collapsed stacks (flamegraph.pl / speedscope format) from pstats data
+
+    cProfile only records caller->callee edges, so each function's self time is
+    split across its call paths in proportion to the cumulative time of each edge.
+    Paths carrying less than min_fraction of the profiled time (and under 1µs) are
+    not expanded: the number of paths grows exponentially with shared callees, and
+    such paths are too thin to show up in a flame graph anyway.
+    """
+    callees = defaultdict(list)
+    roots = []
+    for func, (_, _, _, _, callers) in raw_stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    labels = {func: _label(func) for func in raw_stats}
+    total = sum(raw_stats[root][3] for root in roots)
+    min_time = max(1e-6, total * min_fraction)
+
+    stacks = defaultdict(int)
+
+    def walk(func, path, share):
+        _, _, tottime, cumtime, _ = raw_stats[func]
+        if share * cumtime < min_time:
+            return
+        path = path + [labels[func]]
+        micros = int(tottime * share * 1e6)
+        if micros > 0:
+            stacks[';'.join(path)] += micros
+        if len(path) >= max_depth:
+            return
+        for callee, edge_cumtime in callees.get(func, []):
+            if labels[callee] in path:
+                continue
+            walk(callee, path, share * edge_cumtime / raw_stats[callee][3] if raw_stats[callee][3] else 0)
+
+    for root in roots:
+        walk(root, [], 1.0)
+    return stacks
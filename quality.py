@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive Quality Control
+Feedback controller that trades frame skipping, inference size, heatmap updates and
+trajectory drawing for throughput so a stream keeps up with its target frame rate
+"""
+
+import time
+from collections import deque
+
+# Applied cumulatively, cheapest visual losses first and accuracy losses last
+DEGRADE_STEPS = [
+    ('heatmap_update_interval', lambda base: base['heatmap_update_interval'] * 2),
+    ('draw_trajectories', lambda base: False),
+    ('skip_frames', lambda base: base['skip_frames'] + 1),
+    ('imgsz', lambda base: max(320, int(base['imgsz'] * 0.75) // 32 * 32)),
+    ('skip_frames', lambda base: base['skip_frames'] + 2),
+    ('imgsz', lambda base: max(320, base['imgsz'] // 2 // 32 * 32)),
+    ('skip_frames', lambda base: base['skip_frames'] + 4),
+]
+
+
+def quality_levels(base, adjust_imgsz=True):
+    """Settings per level: level 0 is base, each further level degrades one more knob"""
+    levels = [dict(base)]
+    for name, value in DEGRADE_STEPS:
+        if name == 'imgsz' and not adjust_imgsz:
+            continue
+        level = dict(levels[-1])
+        level[name] = value(base)
+        if level != levels[-1]:
+            levels.append(level)
+    return levels
+
+
+class AdaptiveQualityController:
+    """Moves a counter up and down a ladder of quality levels to hold target_fps
+
+    The rate is measured over the last window frames as input frames per second of
+    process_frame time, so skipped frames count as the cheap frames they are. The
+    controller degrades one level when the rate drops below target_fps, and restores
+    one level when the rate clears target_fps * headroom. A restore also waits for a
+    longer cooldown than a degrade, so the controller doesn't oscillate between two
+    levels. Every decision is printed and kept in decisions.
+    """
+
+    def __init__(self, counter, target_fps, window=30, headroom=1.3, degrade_cooldown=2.0, restore_cooldown=10.0):
+        self.counter = counter
+        self.target_fps = target_fps
+        self.window = window
+        self.headroom = headroom
+        self.degrade_cooldown = degrade_cooldown
+        self.restore_cooldown = restore_cooldown
+        base = {
+            'skip_frames': counter.skip_frames, 'imgsz': counter.imgsz,
+            'heatmap_update_interval': counter.heatmap_update_interval, 'draw_trajectories': counter.draw_trajectories
+        }
+        # Exported models (ONNX, TensorRT, ...) are built for one input size
+        self.levels = quality_levels(base, adjust_imgsz=counter.backend == 'torch')
+        self.level = 0
+        self.samples = deque(maxlen=window)
+        self.last_change = time.monotonic()
+        self.decisions = []
+
+    def rate(self):
+        total = sum(self.samples)
+        return len(self.samples) / total if total > 0 else float('inf')
+
+    def observe(self, frame_seconds):
+        """Called once per input frame with the time process_frame took"""
+        self.samples.append(frame_seconds)
+        if len(self.samples) < self.window:
+            return
+        rate = self.rate()
+        since_change = time.monotonic() - self.last_change
+        if rate < self.target_fps and self.level < len(self.levels) - 1 and since_change >= self.degrade_cooldown:
+            self.set_level(self.level + 1, rate, 'behind')
+        elif rate > self.target_fps * self.headroom and self.level > 0 and since_change >= self.restore_cooldown:
+            self.set_level(self.level - 1, rate, 'headroom')
+
+    def _apply(self, settings):
+        counter = self.counter
+        counter.skip_frames = settings['skip_frames']
+        counter.imgsz = settings['imgsz']
+        counter.heatmap_update_interval = settings['heatmap_update_interval']
+        counter.draw_trajectories = settings['draw_trajectories']
+        self.samples.clear()
+        self.last_change = time.monotonic()
+
+    def set_base(self, **settings):
+        """Replace level-0 settings (from counter.configure) and re-apply the current level on top"""
+        base = dict(self.levels[0], **settings)
+        self.levels = quality_levels(base, adjust_imgsz=self.counter.backend == 'torch')
+        self.level = min(self.level, len(self.levels) - 1)
+        self._apply(self.levels[self.level])
+
+    def set_level(self, level, rate=None, reason='manual'):
+        previous = self.level
+        self.level = level
+        settings = self.levels[level]
+        counter = self.counter
+        self._apply(settings)
+
+        decision = dict(settings, time=time.time(), frame=counter.frame_counter, level=level,
+                        previous_level=previous, reason=reason, rate=round(rate, 2) if rate is not None else None)
+        self.decisions.append(decision)
+        counter.metrics.inc('quality_changes')
+        rate_text = f" at {rate:.1f} FPS (target {self.target_fps:g})" if rate is not None else ""
+        print(f"🎚️ [{counter.camera_id}] quality level {previous} -> {level} ({reason}{rate_text}): "
+              f"skip={settings['skip_frames']} imgsz={settings['imgsz']} "
+              f"heatmap every {settings['heatmap_update_interval']} "
+              f"trajectories {'on' if settings['draw_trajectories'] else 'off'}")
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Sampler & Line Calibration
+Seeks to evenly spaced points of a video, detects people on a few short frame pairs
+and recommends a counting-line band from where people actually move, touching only
+a small fraction of the frames
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from embedding import iou_matrix
+
+MAX_FRACTION = 0.05
+# Rows near the top/bottom edge only see partial bodies and make poor counting lines
+EDGE_MARGIN = 0.1
+TILE_WIDTH = 320
+# Gaps shorter than this are decoded through rather than seeked: a seek decodes from
+# the preceding keyframe anyway, and camera footage has a keyframe every 1-2 seconds
+SEQUENTIAL_SECONDS = 2.0
+
+
+class FrameSampler:
+    """Reads evenly spaced (frame, frame + pair_gap) pairs from a video file
+
+    Jumps longer than seek_frames use container seeking; shorter gaps and the frames
+    inside a pair are skipped with grab(), which still decodes but avoids the colour
+    conversion and copy of a full read(). frames_decoded counts every frame read or
+    grabbed and stays below max_fraction of the video: a gap is only grabbed through
+    while the remaining pairs still fit in that budget, otherwise it is seeked, and a
+    clip too short for a single pair yields none. A seek also decodes from the keyframe
+    before its target, which OpenCV doesn't report, so seeks are counted separately:
+    the true decode cost is frames_decoded plus up to one keyframe interval per seek.
+    """
+
+    def __init__(self, video_path, num_samples=None, pair_gap=5, max_fraction=MAX_FRACTION, seek_frames=None):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video: {video_path}")
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.pair_gap = pair_gap
+        # Strictly below max_fraction; every pair decodes pair_gap + 1 of these frames
+        self.max_frames = max(math.ceil(self.total_frames * max_fraction) - 1, 0)
+        self.num_samples = min(num_samples or 48, self.max_frames // (pair_gap + 1))
+        self.seek_frames = int(self.fps * SEQUENTIAL_SECONDS) if seek_frames is None else seek_frames
+        self.frames_decoded = 0
+        self.seeks = 0
+        self.position = 0
+
+    def indices(self):
+        """Start frame of each pair, evenly spaced and clear of the last pair_gap frames"""
+        if self.num_samples == 0:
+            return []
+        span = max(self.total_frames - self.pair_gap - 1, 1)
+        step = span / self.num_samples
+        return [int(step * (i + 0.5)) for i in range(self.num_samples)]
+
+    def _grab(self, count):
+        for _ in range(count):
+            if not self.cap.grab():
+                return False
+            self.frames_decoded += 1
+            self.position += 1
+        return True
+
+    def _read(self):
+        ok, frame = self.cap.read()
+        if ok:
+            self.frames_decoded += 1
+            self.position += 1
+        return ok, frame
+
+    def _seek(self, index, reserve):
+        """Move to index, grabbing through the gap only if reserve more frames still fit the budget"""
+        gap = index - self.position
+        if 0 <= gap <= self.seek_frames and self.frames_decoded + gap + reserve <= self.max_frames:
+            return self._grab(gap)
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.seeks += 1
+        self.position = index
+        return True
+
+    def pairs(self):
+        """Yield (frame_index, frame, next_frame) with next_frame pair_gap frames later"""
+        indices = self.indices()
+        for n, index in enumerate(indices):
+            if not self._seek(index, (len(indices) - n) * (self.pair_gap + 1)):
+                continue
+            ok, frame = self._read()
+            if not ok:
+                continue
+            next_frame = None
+            ok = self._grab(self.pair_gap - 1)
+            if ok:
+                ok, next_frame = self._read()
+            yield index, frame, next_frame if ok else None
+
+    def release(self):
+        self.cap.release()
+
+
+def match_movements(boxes_a, boxes_b, min_iou=0.3):
+    """(x, y0, y1) centroid movements of people matched between two nearby frames"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return []
+    ious = iou_matrix(boxes_a[:, :4], boxes_b[:, :4])
+    moves = []
+    used_a, used_b = set(), set()
+    for flat in np.argsort(-ious, axis=None):
+        i, j = np.unravel_index(flat, ious.shape)
+        if ious[i, j] < min_iou:
+            break
+        if i in used_a or j in used_b:
+            continue
+        used_a.add(i)
+        used_b.add(j)
+        cx = (boxes_a[i, 0] + boxes_a[i, 2]) / 2
+        y0 = (boxes_a[i, 1] + boxes_a[i, 3]) / 2
+        y1 = (boxes_b[j, 1] + boxes_b[j, 3]) / 2
+        moves.append((float(cx), float(y0), float(y1)))
+    return moves
+
+
+def recommend_line(moves, centroids_y, height, smoothing=0.03):
+    """Counting line y and band (y_min, y_max) where vertical movement is densest
+
+    Each matched person adds its vertical speed at its position; the smoothed profile's
+    peak is the recommended line, and the band is the contiguous region around it that
+    stays above half the peak. Without movement it falls back to where people stand,
+    and without detections to the frame middle the counter uses by default.
+    """
+    profile = np.zeros(height, dtype=np.float64)
+    source = 'movement'
+    for _, y0, y1 in moves:
+        profile[int(np.clip((y0 + y1) / 2, 0, height - 1))] += abs(y1 - y0)
+    if not profile.any():
+        source = 'presence'
+        for y in centroids_y:
+            profile[int(np.clip(y, 0, height - 1))] += 1
+    if not profile.any():
+        middle = int(height * 0.5)
+        return {'line_y': middle, 'band': [middle, middle], 'source': 'default'}
+
+    sigma = max(height * smoothing, 1.0)
+    radius = int(3 * sigma)
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    profile = np.convolve(profile, kernel, mode='same')
+    margin = int(height * EDGE_MARGIN)
+    profile[:margin] = 0
+    profile[height - margin:] = 0
+    line_y = int(np.argmax(profile))
+    above = profile >= profile[line_y] * 0.5
+    y_min = line_y
+    while y_min > 0 and above[y_min - 1]:
+        y_min -= 1
+    y_max = line_y
+    while y_max < height - 1 and above[y_max + 1]:
+        y_max += 1
+    return {'line_y': line_y, 'band': [y_min, y_max], 'source': source}
+
+
+def thumbnail(frame, width=TILE_WIDTH):
+    """Downscaled copy of a frame and its scale factor"""
+    scale = width / frame.shape[1]
+    return cv2.resize(frame, (width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA), scale
+
+
+def preview_grid(samples, recommendation, scale, columns=4, max_tiles=12):
+    """Grid of (frame_index, thumbnail, boxes) samples with detections, the recommended band and line"""
+    if not samples:
+        return None
+    picks = [samples[int(i * len(samples) / min(max_tiles, len(samples)))] for i in range(min(max_tiles, len(samples)))]
+    tile_height, tile_width = picks[0][1].shape[:2]
+    rows = math.ceil(len(picks) / columns)
+    grid = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+    y_min, y_max = (int(v * scale) for v in recommendation['band'])
+    line_y = int(recommendation['line_y'] * scale)
+
+    for n, (index, tile, boxes) in enumerate(picks):
+        tile = tile.copy()
+        band = tile[y_min:y_max + 1]
+        cv2.addWeighted(band, 0.7, np.full_like(band, (0, 255, 255)), 0.3, 0, dst=band)
+        cv2.line(tile, (0, line_y), (tile_width, line_y), (0, 255, 255), 2)
+        for x1, y1, x2, y2, _ in boxes:
+            cv2.rectangle(tile, (int(x1 * scale), int(y1 * scale)), (int(x2 * scale), int(y2 * scale)), (0, 255, 0), 1)
+        cv2.putText(tile, f"#{index}", (5, 18), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        row, col = divmod(n, columns)
+        grid[row * tile_height:(row + 1) * tile_height, col * tile_width:(col + 1) * tile_width] = tile
+    return grid
+
+
+def calibrate(video_path, counter=None, num_samples=None, pair_gap=5, preview_path=None, **counter_kwargs):
+    """Sample a video, detect people and recommend a counting line
+
+    counter is any FootfallCounter (only its detector is used); by default one is
+    created with ByteTrack so no DeepSORT embedder is loaded.
+    """
+    if counter is None:
+        from footfall_counter import FootfallCounter
+        counter = FootfallCounter(**dict({'tracker': 'bytetrack'}, **counter_kwargs))
+
+    sampler = FrameSampler(video_path, num_samples, pair_gap)
+    samples, moves, centroids_y = [], [], []
+    scale = 1.0
+    height = int(sampler.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    try:
+        for index, frame, next_frame in sampler.pairs():
+            boxes = counter.detect_people(frame)
+            if preview_path:
+                # Keep thumbnails only; full frames for every sample would add up quickly
+                thumb, scale = thumbnail(frame)
+                samples.append((index, thumb, boxes))
+            centroids_y.extend(((boxes[:, 1] + boxes[:, 3]) / 2).tolist())
+            if next_frame is not None:
+                moves.extend(match_movements(boxes, counter.detect_people(next_frame)))
+    finally:
+        sampler.release()
+
+    recommendation = recommend_line(moves, centroids_y, height)
+    result = dict(recommendation, **{
+        'video': os.path.basename(video_path), 'frames_total': sampler.total_frames,
+        'frames_decoded': sampler.frames_decoded, 'seeks': sampler.seeks, 'samples': sampler.num_samples,
+        'fraction_decoded': round(sampler.frames_decoded / sampler.total_frames, 4) if sampler.total_frames else 0.0,
+        'detections': len(centroids_y), 'movements': len(moves)
+    })
+    if preview_path:
+        grid = preview_grid(samples, recommendation, scale)
+        if grid is not None:
+            cv2.imwrite(preview_path, grid)
+            result['preview'] = preview_path
+    return result
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Preview a video and recommend a counting line from sampled frames")
+    parser.add_argument('input', help="Input video path")
+    parser.add_argument('--samples', type=int, default=None,
+                        help=f"Number of frame pairs (default 48, capped at {MAX_FRACTION:.0%} of the frames)")
+    parser.add_argument('--pair-gap', type=int, default=5, help="Frames between the two frames of a pair")
+    parser.add_argument('--preview', default='calibration_preview.jpg', help="Preview grid image path")
+    parser.add_argument('--model', default='yolov8n.pt', help="YOLOv8 weights")
+    parser.add_argument('--conf', type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument('--cpu', action='store_true', help="Force CPU inference")
+    parser.add_argument('--output', default=None, help="Write the recommendation as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    result = calibrate(args.input, num_samples=args.samples, pair_gap=args.pair_gap, preview_path=args.preview,
+                       model_path=args.model, confidence_threshold=args.conf, use_gpu=not args.cpu)
+    print(f"📏 Recommended line y={result['line_y']} (band {result['band'][0]}-{result['band'][1]}, "
+          f"from {result['source']})")
+    print(f"🎞️ Decoded {result['frames_decoded']} of {result['frames_total']} frames ({result['fraction_decoded']:.1%}) "
+          f"plus {result['seeks']} seeks (each decodes from the preceding keyframe), "
+          f"{result['detections']} detections, {result['movements']} movements")
+    if 'preview' in result:
+        print(f"🖼️ Preview grid: {result['preview']}  (use --line-y {result['line_y']})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Crowds
+Renders people walking across the counting line at a chosen density, speed and
+resolution with exact ground-truth crossings, as a video file (plus evaluate.py
+ground truth) or as in-memory frames for stress-testing process_frame
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from video_writer import AnnotatedVideoWriter
+from events import ListSink
+
+SPRITE_VARIANTS = 16
+SKIN_TONES = [(189, 224, 255), (148, 190, 234), (105, 150, 198), (70, 110, 160), (45, 70, 110)]
+# Sprite heights are rounded to this many pixels so scaled sprites can be cached
+SIZE_STEP = 4
+
+
+def draw_person(height, body_color, leg_color, skin_color, pose):
+    """(image, mask) of a simple standing/walking figure, height pixels tall and centred in its box"""
+    height = max(int(height), 12)
+    width = max(int(height * 0.42), 6)
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cx = width // 2
+    head = max(int(height * 0.085), 2)
+    limb = max(int(height * 0.07), 1)
+    spread = int(width * (0.28 if pose else 0.1))
+    hip, shoulder = int(height * 0.55), int(height * 0.24)
+    for canvas, body, legs, skin in ((image, body_color, leg_color, skin_color), (mask, 255, 255, 255)):
+        cv2.line(canvas, (cx - limb, hip), (cx - spread, height - limb), legs, limb + 1)
+        cv2.line(canvas, (cx + limb, hip), (cx + spread, height - limb), legs, limb + 1)
+        cv2.ellipse(canvas, (cx, int(height * 0.4)), (int(width * 0.3), int(height * 0.19)), 0, 0, 360, body, -1)
+        cv2.line(canvas, (cx - int(width * 0.3), shoulder), (cx - int(width * 0.38) + spread // 2, hip), body, limb)
+        cv2.line(canvas, (cx + int(width * 0.3), shoulder), (cx + int(width * 0.38) - spread // 2, hip), body, limb)
+        cv2.circle(canvas, (cx, head + 1), head, skin, -1)
+    return image, mask > 0
+
+
+def load_sprites(directory):
+    """(image, mask) cut-outs from RGBA PNGs in directory, cropped to their opaque area"""
+    sprites = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.png'))):
+        rgba = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if rgba is None or rgba.ndim != 3 or rgba.shape[2] != 4:
+            print(f"⚠️ Skipping {path}: not an RGBA image")
+            continue
+        ys, xs = np.nonzero(rgba[..., 3] > 127)
+        if len(ys) == 0:
+            continue
+        rgba = rgba[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+        sprites.append((rgba[..., :3].copy(), rgba[..., 3] > 127))
+    return sprites
+
+
+def make_background(width, height, rng):
+    """Textured floor: a lit gradient, blurred noise and faint tile lines"""
+    gradient = np.linspace(70, 130, height, dtype=np.float32)[:, None, None]
+    texture = cv2.GaussianBlur(rng.normal(0, 18, (height, width, 1)).astype(np.float32), (0, 0), 3)[..., None]
+    tint = np.array([1.0, 0.97, 0.92], dtype=np.float32)
+    background = np.clip((gradient + texture) * tint, 0, 255).astype(np.uint8)
+    step = max(height // 12, 16)
+    for y in range(0, height, step):
+        cv2.line(background, (0, y), (width, y), (60, 60, 60), 1)
+    for x in range(0, width, step):
+        cv2.line(background, (x, 0), (x, height), (60, 60, 60), 1)
+    return background
+
+
+class SyntheticCrowd:
+    """A constant population of people walking up or down across roi_line_y
+
+    Every person enters at the top or bottom edge (or, at the start, anywhere in the
+    frame), walks at speed * [0.7, 1.3] pixels per second with some sideways drift,
+    and is replaced by a new one after leaving the frame. A crossing is recorded for
+    the frame in which a person's centre first reaches the line from the other side,
+    with the counter's semantics: moving down is an entry, moving up an exit. People
+    further down the frame are drawn larger and in front (perspective=True).
+
+    frames() continues from where the previous call stopped; ground_truth() covers
+    every frame generated so far.
+    """
+
+    def __init__(self, width=1280, height=720, fps=25, people=30, speed=80.0, person_height=90,
+                 roi_line_y=None, entry_ratio=0.5, perspective=True, seed=0, background=None, sprites=None,
+                 noise=0.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.people = people
+        self.speed = speed
+        self.person_height = person_height
+        self.roi_line_y = int(height * 0.5) if roi_line_y is None else roi_line_y
+        self.entry_ratio = entry_ratio
+        self.perspective = perspective
+        self.seed = seed
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        if background is None:
+            self.background = make_background(width, height, self.rng)
+        else:
+            self.background = cv2.resize(cv2.imread(background) if isinstance(background, str) else background,
+                                         (width, height))
+        # Per variant, one sprite per walking pose; cut-outs have a single pose
+        if sprites:
+            self.sprites = [[sprite, sprite] for sprite in load_sprites(sprites)]
+            if not self.sprites:
+                raise ValueError(f"No RGBA sprites found in {sprites}")
+        else:
+            colors = self.rng.integers(20, 235, (SPRITE_VARIANTS, 2, 3))
+            self.sprites = [[{'body': tuple(int(v) for v in colors[i, 0]), 'legs': tuple(int(v) for v in colors[i, 1]),
+                              'skin': SKIN_TONES[i % len(SKIN_TONES)], 'pose': pose} for pose in (0, 1)]
+                            for i in range(SPRITE_VARIANTS)]
+        self._scaled = {}
+        self._buffer = np.empty_like(self.background)
+
+        self.frame_index = 0
+        self.next_id = 0
+        self.crossings = []
+        self.visible_total = 0
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.vx = np.zeros(0)
+        self.vy = np.zeros(0)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.variant = np.zeros(0, dtype=np.int64)
+        self.phase = np.zeros(0, dtype=np.int64)
+        self._spawn(people, anywhere=True)
+
+    # Simulation
+
+    def _scale(self, y):
+        if not self.perspective:
+            return np.ones_like(y)
+        return 0.6 + 0.8 * np.clip(y / self.height, 0, 1)
+
+    def _spawn(self, count, anywhere=False):
+        rng = self.rng
+        down = rng.random(count) < self.entry_ratio
+        margin = self.person_height
+        if anywhere:
+            y = rng.uniform(-margin / 2, self.height + margin / 2, count)
+        else:
+            y = np.where(down, -margin / 2, self.height + margin / 2) + rng.uniform(-margin / 2, 0, count) * \
+                np.where(down, 1, -1)
+        speed = self.speed * rng.uniform(0.7, 1.3, count) / self.fps
+        self.x = np.concatenate([self.x, rng.uniform(0, self.width, count)])
+        self.y = np.concatenate([self.y, y])
+        self.vx = np.concatenate([self.vx, rng.normal(0, 0.15, count) * speed])
+        self.vy = np.concatenate([self.vy, np.where(down, speed, -speed)])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+        self.variant = np.concatenate([self.variant, rng.integers(0, len(self.sprites), count)])
+        self.phase = np.concatenate([self.phase, rng.integers(0, 1000, count)])
+        self.next_id += count
+
+    def _step(self):
+        """Advance one frame and record crossings of the line for self.frame_index"""
+        prev_y = self.y
+        self.x = self.x + self.vx
+        self.y = self.y + self.vy
+        # Bounce off the side walls so nobody leaves sideways before crossing
+        off = (self.x < 0) | (self.x > self.width)
+        self.vx[off] *= -1
+        self.x = np.clip(self.x, 0, self.width)
+
+        line = self.roi_line_y
+        entry = (prev_y < line) & (self.y >= line)
+        exit_ = (prev_y > line) & (self.y <= line)
+        for i in np.flatnonzero(entry | exit_):
+            self.crossings.append({'frame': self.frame_index, 'direction': 'entry' if entry[i] else 'exit',
+                                   'person': int(self.ids[i])})
+
+        margin = self.person_height
+        gone = ((self.vy > 0) & (self.y > self.height + margin)) | ((self.vy < 0) & (self.y < -margin))
+        if gone.any():
+            keep = ~gone
+            for name in ('x', 'y', 'vx', 'vy', 'ids', 'variant', 'phase'):
+                setattr(self, name, getattr(self, name)[keep])
+            self._spawn(int(gone.sum()))
+
+    # Rendering
+
+    def _sprite(self, variant, pose, height):
+        height = max(SIZE_STEP * 3, int(round(height / SIZE_STEP)) * SIZE_STEP)
+        key = (variant, pose, height)
+        sprite = self._scaled.get(key)
+        if sprite is None:
+            source = self.sprites[variant][pose]
+            if isinstance(source, dict):
+                sprite = draw_person(height, source['body'], source['legs'], source['skin'], source['pose'])
+            else:
+                image, mask = source
+                width = max(1, int(image.shape[1] * height / image.shape[0]))
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                mask = cv2.resize(mask.astype(np.uint8), (width, height), interpolation=cv2.INTER_NEAREST) > 0
+                sprite = (image, mask)
+            self._scaled[key] = sprite
+        return sprite
+
+    def _render(self):
+        frame = self._buffer
+        np.copyto(frame, self.background)
+        heights = self.person_height * self._scale(self.y)
+        # Walking poses alternate four times a second
+        poses = ((self.frame_index + self.phase) * 4 // self.fps) % 2
+        visible = 0
+        for i in np.argsort(self.y):
+            image, mask = self._sprite(int(self.variant[i]), int(poses[i]), heights[i])
+            h, w = mask.shape
+            x1, y1 = int(round(self.x[i])) - w // 2, int(round(self.y[i])) - h // 2
+            fx1, fy1 = max(x1, 0), max(y1, 0)
+            fx2, fy2 = min(x1 + w, self.width), min(y1 + h, self.height)
+            if fx1 >= fx2 or fy1 >= fy2:
+                continue
+            visible += 1
+            region = (slice(fy1 - y1, fy2 - y1), slice(fx1 - x1, fx2 - x1))
+            np.copyto(frame[fy1:fy2, fx1:fx2], image[region], where=mask[region][..., None])
+        self.visible_total += visible
+        if self.noise:
+            noise = self.rng.normal(0, self.noise, frame.shape).astype(np.int16)
+            np.copyto(frame, np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+        return frame
+
+    def frames(self, num_frames):
+        """Yield num_frames BGR frames; each is a reused buffer, valid until the next one is yielded"""
+        for _ in range(num_frames):
+            if self.frame_index > 0:
+                self._step()
+            yield self._render()
+            self.frame_index += 1
+
+    def ground_truth(self, video=None):
+        """Crossings so far in evaluate.py's ground-truth format, plus totals and scene settings"""
+        entries = sum(1 for c in self.crossings if c['direction'] == 'entry')
+        return {
+            'video': video, 'roi_line_y': self.roi_line_y, 'crossings': list(self.crossings),
+            'entry_count': entries, 'exit_count': len(self.crossings) - entries, 'total_count': len(self.crossings),
+            'frames': self.frame_index, 'fps': self.fps, 'width': self.width, 'height': self.height,
+            'people': self.people, 'speed': self.speed, 'seed': self.seed,
+            'mean_visible': round(self.visible_total / self.frame_index, 1) if self.frame_index else 0.0
+        }
+
+    def write(self, path, num_frames, truth_path=None, backend='auto'):
+        """Encode num_frames to path and write the ground truth next to it (.json); returns the ground truth"""
+        writer = AnnotatedVideoWriter(path, self.fps, (self.width, self.height), backend=backend)
+        try:
+            for frame in self.frames(num_frames):
+                writer.write(frame)
+        finally:
+            writer.release()
+        truth_path = truth_path or os.path.splitext(path)[0] + '.json'
+        truth = self.ground_truth(os.path.relpath(path, os.path.dirname(os.path.abspath(truth_path))))
+        with open(truth_path, 'w') as f:
+            json.dump(truth, f, indent=2)
+        return truth
+
+
+def stress(crowd, num_frames, counter_kwargs=None, model=None, tolerance=15):
+    """Count num_frames of crowd in memory with a fresh counter; returns (report, counter)
+
+    Only process_frame time is measured, so rendering the scene doesn't count
+    against the counter's throughput. Crossings are scored like evaluate.py.
+    """
+    from footfall_counter import FootfallCounter
+    from evaluate import score
+
+    sink = ListSink()
+    counter = FootfallCounter(roi_line_y=crowd.roi_line_y, event_sinks=[sink], model=model, **(counter_kwargs or {}))
+    counter.source_fps = crowd.fps
+    elapsed = 0.0
+    try:
+        for frame in crowd.frames(num_frames):
+            start = time.perf_counter()
+            counter.process_frame(frame, show_heatmap=False, show_trajectories=False, render=False)
+            elapsed += time.perf_counter() - start
+    finally:
+        counter.close()
+    predicted = [{'frame': e.frame_index, 'direction': e.direction} for e in sink.events]
+    truth = crowd.ground_truth()
+    report = score(predicted, truth['crossings'], tolerance)
+    report.update({'people': crowd.people, 'mean_visible': truth['mean_visible'], 'frames': num_frames,
+                   'resolution': f"{crowd.width}x{crowd.height}",
+                   'fps': round(num_frames / elapsed, 2) if elapsed > 0 else 0.0,
+                   'stages': counter.metrics.summary()['stages']})
+    return report, counter
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Generate synthetic crowds with exact ground-truth counts")
+    parser.add_argument('output', nargs='?', default='synthetic_crowd.mp4',
+                        help="Video path; ground truth goes to the same name with .json")
+    parser.add_argument('--people', type=int, nargs='+', default=[30],
+                        help="People on screen; several values give one video (or stress run) each")
+    parser.add_argument('--seconds', type=float, default=20.0, help="Duration")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--speed', type=float, default=80.0, help="Mean walking speed in pixels per second")
+    parser.add_argument('--person-height', type=int, default=90, help="Person height in pixels at mid-frame")
+    parser.add_argument('--line-y', type=int, default=None, help="Counting line y position (default: frame middle)")
+    parser.add_argument('--entry-ratio', type=float, default=0.5, help="Share of people walking down (entries)")
+    parser.add_argument('--no-perspective', action='store_true', help="Same size everywhere in the frame")
+    parser.add_argument('--sprites', default=None, help="Directory of RGBA PNG cut-outs to use instead of figures")
+    parser.add_argument('--background', default=None, help="Background image")
+    parser.add_argument('--noise', type=float, default=0.0, help="Per-frame sensor noise (standard deviation)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stress', action='store_true',
+                        help="Count the frames in memory instead of writing a video, and report FPS and accuracy")
+    parser.add_argument('--model', default='yolov8n.pt', help="YOLOv8 weights (--stress)")
+    parser.add_argument('--cpu', action='store_true', help="Force CPU inference (--stress)")
+    parser.add_argument('--imgsz', type=int, default=640, help="Inference image size (--stress)")
+    parser.add_argument('--skip-frames', type=int, default=0, help="Frames to skip between detections (--stress)")
+    parser.add_argument('--tracker', default='deepsort', help="Multi-object tracker (--stress)")
+    parser.add_argument('--report', default=None, help="Write the --stress reports as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    num_frames = int(args.seconds * args.fps)
+    model = None
+    reports = []
+    if args.stress:
+        print(f"{'People':>7}{'Visible':>9}{'FPS':>8}{'Prec':>7}{'Recall':>8}{'In':>6}{'GT In':>7}{'Out':>6}{'GT Out':>8}")
+    for people in args.people:
+        crowd = SyntheticCrowd(
+            args.width, args.height, args.fps, people, args.speed, args.person_height, args.line_y,
+            args.entry_ratio, not args.no_perspective, args.seed, args.background, args.sprites, args.noise
+        )
+        if args.stress:
+            report, counter = stress(crowd, num_frames, {
+                'model_path': args.model, 'use_gpu': not args.cpu, 'imgsz': args.imgsz,
+                'skip_frames': args.skip_frames, 'tracker': args.tracker
+            }, model=model)
+            # Load the detector once for every density (ByteTrack keeps per-video state in it)
+            model = counter.model if args.tracker != 'bytetrack' else None
+            reports.append(report)
+            print(f"{people:>7}{report['mean_visible']:>9}{report['fps']:>8.1f}{report['precision']:>7.3f}"
+                  f"{report['recall']:>8.3f}{report['entries']:>6}{report['gt_entries']:>7}"
+                  f"{report['exits']:>6}{report['gt_exits']:>8}")
+            continue
+        output = args.output
+        if len(args.people) > 1:
+            stem, ext = os.path.splitext(args.output)
+            output = f"{stem}_p{people}{ext}"
+        start = time.perf_counter()
+        truth = crowd.write(output, num_frames)
+        print(f"🎬 {output}: {num_frames} frames, {truth['mean_visible']} people visible on average, "
+              f"{truth['entry_count']} entries / {truth['exit_count']} exits "
+              f"({num_frames / (time.perf_counter() - start):.0f} FPS generated)")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(reports, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Embedding Cache Tests
+Runs FootfallCounter._track with a real DeepSORT tracker on synthetic people
+"""
+
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('ultralytics')
+pytest.importorskip('deep_sort_realtime')
+
+from deep_sort_realtime.deepsort_tracker import DeepSort
+
+from embedding import CachedEmbedder
+from footfall_counter import FootfallCounter
+from metrics import PerformanceMetrics
+from synthetic import SyntheticCrowd
+
+
+def crowd_detections(crowd):
+    """Ground-truth person boxes for the frame the crowd just rendered"""
+    detections = []
+    heights = crowd.person_height * crowd._scale(crowd.y)
+    for x, y, h in zip(crowd.x, crowd.y, heights):
+        x1, y1 = max(0, x - h / 4), max(0, y - h / 2)
+        x2, y2 = min(crowd.width, x + h / 4), min(crowd.height, y + h / 2)
+        if x2 - x1 > 2 and y2 - y1 > 2:
+            detections.append(([x1, y1, x2 - x1, y2 - y1], 0.9, 0))
+    return detections
+
+
+def make_counter(embedding_cache=True):
+    """A counter with only the tracking state _track uses; no detector weights needed"""
+    counter = FootfallCounter.__new__(FootfallCounter)
+    counter.tracker = DeepSort(max_age=30, n_init=3, nn_budget=100, embedder='mobilenet',
+                               half=False, embedder_gpu=False)
+    counter.embedding_cache = CachedEmbedder(counter.tracker) if embedding_cache else None
+    counter.metrics = PerformanceMetrics()
+    return counter
+
+
+@pytest.mark.parametrize('embedding_cache', [True, False])
+def test_track_with_deepsort(embedding_cache):
+    counter = make_counter(embedding_cache)
+    crowd = SyntheticCrowd(width=640, height=360, people=5, person_height=120, seed=3)
+    confirmed = set()
+    for frame in crowd.frames(20):
+        tracks = counter._track(crowd_detections(crowd), frame)
+        confirmed.update(t.track_id for t in tracks if t.is_confirmed())
+    assert confirmed
+    if embedding_cache:
+        cache = counter.embedding_cache
+        assert cache.computed > 0
+        assert cache.reused > 0
+        assert set(cache.cache) <= {t.track_id for t in counter.tracker.tracker.tracks}
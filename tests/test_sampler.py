@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Frame Sampler Tests
+Checks the decode budget on synthetic clips at different frame rates and lengths
+"""
+
+import pytest
+
+from sampler import FrameSampler, MAX_FRACTION
+from synthetic import SyntheticCrowd
+
+
+@pytest.fixture(scope='module')
+def make_clip(tmp_path_factory):
+    def make(fps, num_frames):
+        path = str(tmp_path_factory.mktemp('clips') / f"crowd_{fps}fps_{num_frames}.mp4")
+        SyntheticCrowd(width=160, height=120, fps=fps, people=3, person_height=30, seed=1).write(
+            path, num_frames, backend='opencv')
+        return path
+    return make
+
+
+def sample_all(path, **kwargs):
+    sampler = FrameSampler(path, **kwargs)
+    try:
+        pairs = list(sampler.pairs())
+    finally:
+        sampler.release()
+    return sampler, pairs
+
+
+@pytest.mark.parametrize('fps, num_frames', [(25, 3000), (60, 3000), (60, 600)])
+def test_decodes_below_max_fraction(make_clip, fps, num_frames):
+    sampler, pairs = sample_all(make_clip(fps, num_frames))
+    assert sampler.total_frames == num_frames
+    assert pairs and all(next_frame is not None for _, _, next_frame in pairs)
+    assert sampler.frames_decoded / sampler.total_frames < MAX_FRACTION
+
+
+def test_short_gaps_grabbed_while_budget_allows(make_clip):
+    path = make_clip(60, 600)
+    # Gaps between 8 pairs are ~68 frames, under the 2 s seek_frames: all grabbed when the budget allows
+    sampler, pairs = sample_all(path, num_samples=8, max_fraction=0.99)
+    assert len(pairs) == 8 and sampler.seeks == 0
+    # With half the budget, later gaps are seeked instead
+    sampler, pairs = sample_all(path, num_samples=8, max_fraction=0.5)
+    assert len(pairs) == 8 and sampler.seeks > 0
+    assert 8 * 6 < sampler.frames_decoded < 0.5 * sampler.total_frames
+
+
+def test_clip_too_short_for_a_pair(make_clip):
+    sampler, pairs = sample_all(make_clip(25, 100))
+    assert pairs == []
+    assert sampler.frames_decoded == 0
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tiled Detection Tests
+Cross-tile box merging: only boxes cut by a tile edge are suppressed by containment
+"""
+
+import numpy as np
+
+from tiling import cut_by_tile, merge_boxes, tile_grid
+
+FRAME_SIZE = (1920, 1080)
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def test_tiles_cover_frame_with_overlap():
+    tiles = tile_grid(*FRAME_SIZE, tile_size=640, overlap=0.2)
+    assert min(t[0] for t in tiles) == 0 and max(t[2] for t in tiles) == FRAME_SIZE[0]
+    assert min(t[1] for t in tiles) == 0 and max(t[3] for t in tiles) == FRAME_SIZE[1]
+    xs = sorted({t[0] for t in tiles})
+    assert all(b - a <= 640 * 0.8 for a, b in zip(xs, xs[1:]))
+
+
+def test_cut_by_tile_ignores_frame_edges():
+    tile = (0, 0, 640, 640)
+    found = boxes([0, 0, 100, 200, 0.9],      # touches the frame's left/top edge only
+                  [560, 100, 640, 300, 0.9],  # cut by the tile's right edge
+                  [200, 500, 300, 640, 0.9],  # cut by the tile's bottom edge
+                  [200, 200, 300, 400, 0.9])  # inside the tile
+    assert cut_by_tile(found, tile, FRAME_SIZE).tolist() == [False, True, True, False]
+    # The same boxes in a tile at the frame's bottom-right corner: only its left and top edges cut
+    tile = (1280, 440, 1920, 1080)
+    found = boxes([1280, 600, 1400, 800, 0.9], [1800, 900, 1920, 1080, 0.9])
+    assert cut_by_tile(found, tile, FRAME_SIZE).tolist() == [True, False]
+
+
+def test_cut_partial_box_suppressed_by_whole_box():
+    # A person cut by a tile edge: the partial box has low IoU with the whole one but lies inside it
+    whole = [500, 100, 600, 400, 0.8]
+    partial = [500, 100, 600, 200, 0.95]
+    merged = merge_boxes(boxes(whole, partial), cut=[False, True])
+    assert merged.tolist() == boxes(whole).tolist()
+
+
+def test_uncut_contained_box_survives():
+    # A child in front of an adult: mostly contained, but neither box touches a tile edge
+    adult = [500, 100, 600, 400, 0.9]
+    child = [510, 250, 580, 400, 0.8]
+    merged = merge_boxes(boxes(adult, child), cut=[False, False])
+    assert len(merged) == 2
+    assert len(merge_boxes(boxes(adult, child))) == 2
+
+
+def test_overlapping_duplicates_merged_by_iou():
+    first = [100, 100, 200, 300, 0.9]
+    second = [105, 102, 203, 305, 0.7]
+    merged = merge_boxes(boxes(first, second), cut=[False, False])
+    assert merged.tolist() == boxes(first).tolist()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Trajectory Store Tests
+Records synthetic tracks through FootfallCounter._count and recounts them from the store
+"""
+
+from collections import defaultdict, deque
+
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('ultralytics')
+
+from footfall_counter import FootfallCounter, UltralyticsTrack
+from synthetic import SyntheticCrowd
+from trajectories import TrajectoryStore
+
+ZONES = {'left': [(0, 0), (200, 0), (200, 240), (0, 240)]}
+
+
+def make_counter(store, roi_line_y):
+    """A counter with only the counting state _count uses; no detector or tracker"""
+    counter = FootfallCounter.__new__(FootfallCounter)
+    counter.track_history = defaultdict(lambda: deque(maxlen=60))
+    counter.counted_ids = set()
+    counter.entry_count = counter.exit_count = 0
+    counter.zones = dict(ZONES)
+    counter.zone_counts = {name: {'entry_count': 0, 'exit_count': 0} for name in ZONES}
+    counter.zone_counted = set()
+    counter.colors = {'bbox': (0, 255, 0), 'entry': (0, 255, 0), 'exit': (0, 0, 255)}
+    counter.events = None
+    counter.trajectories = store
+    counter.frame_counter = 0
+    counter.roi_line_y = roi_line_y
+    return counter
+
+
+def record(store, num_frames=300):
+    """Count a synthetic crowd's ground-truth tracks, recording them to store"""
+    crowd = SyntheticCrowd(width=320, height=240, fps=25, people=8, speed=60.0, person_height=40, seed=3)
+    counter = make_counter(store, crowd.roi_line_y)
+    for _ in crowd.frames(num_frames):
+        counter.frame_counter += 1
+        half = crowd.person_height * crowd._scale(crowd.y) / 2
+        tracks = [UltralyticsTrack(str(track_id), [x - h / 2, y - h, x + h / 2, y + h], 0.9)
+                  for track_id, x, y, h in zip(crowd.ids, crowd.x, crowd.y, half)]
+        counter._count(tracks, crowd.roi_line_y)
+    store.set_source(source='crowd.mp4', camera_id='cam-1', roi_line_y=crowd.roi_line_y)
+    store.close()
+    return counter
+
+
+def test_recount_at_recorded_line_reproduces_counts(tmp_path):
+    counter = record(TrajectoryStore(str(tmp_path)))
+    assert counter.entry_count and counter.exit_count
+
+    result = TrajectoryStore(str(tmp_path)).recount(counter.roi_line_y, ZONES)
+    assert (result['entry_count'], result['exit_count']) == (counter.entry_count, counter.exit_count)
+    assert result['zones']['left']['entry_count'] == counter.zone_counts['left']['entry_count']
+    assert result['zones']['left']['exit_count'] == counter.zone_counts['left']['exit_count']
+    # Without a line, the recorded one from meta.json is used
+    assert TrajectoryStore(str(tmp_path)).recount()['total_count'] == counter.entry_count + counter.exit_count
+
+
+def test_store_refuses_another_source(tmp_path):
+    record(TrajectoryStore(str(tmp_path)))
+    store = TrajectoryStore(str(tmp_path))
+    store.set_source(source='crowd.mp4', camera_id='cam-1')
+    with pytest.raises(ValueError):
+        store.set_source(source='other.mp4', camera_id='cam-1')
+    with pytest.raises(ValueError):
+        TrajectoryStore(str(tmp_path), meta={'camera_id': 'cam-2'})
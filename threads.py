@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Thread Budget
+Splits CPU cores between torch intra-op threads, OpenCV's thread pool and FFmpeg
+decode threads per stream, so counters sharing a machine don't oversubscribe it
+"""
+
+import os
+
+import cv2
+
+# Read by open_capture(); an environment variable so decode processes inherit it
+DECODE_THREADS_ENV = 'FOOTFALL_DECODE_THREADS'
+
+
+def available_cores():
+    """Core IDs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_to_cores(cores):
+    """Restrict this process to cores; threads started afterwards inherit the mask"""
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+        else:
+            import psutil
+            psutil.Process().cpu_affinity(list(cores))
+        return True
+    except (ImportError, AttributeError, OSError) as e:
+        print(f"⚠️ Could not pin to cores {list(cores)}: {e}")
+        return False
+
+
+def open_capture(source):
+    """cv2.VideoCapture that decodes with the thread count set by ThreadBudget.apply()
+
+    FFmpeg otherwise starts one decode thread per core for every stream. Webcams
+    (integer sources) and builds without CAP_PROP_N_THREADS open as usual.
+    """
+    threads = os.environ.get(DECODE_THREADS_ENV)
+    if threads and not isinstance(source, int) and hasattr(cv2, 'CAP_PROP_N_THREADS'):
+        cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, [cv2.CAP_PROP_N_THREADS, int(threads)])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    return cv2.VideoCapture(source)
+
+
+class ThreadBudget:
+    """Thread counts (and optionally cores) for stream stream_index of streams on this machine
+
+    Each stream gets an equal slice of the available cores. A quarter of the slice
+    (at least one core) goes to decoding, which runs concurrently with the counter in
+    its capture thread or process. Torch inference and OpenCV calls run one after the
+    other in the processing thread, so both pools get the rest of the slice. With GPU
+    inference torch only feeds the device and needs at most two threads.
+
+    torch and OpenCV thread counts are per process, so run each stream in its own
+    process (one CLI invocation each) and call apply() before the model is loaded.
+    """
+
+    def __init__(self, streams=1, stream_index=0, cores=None, pin=False, gpu=False):
+        available = sorted(cores) if cores is not None else available_cores()
+        share = max(1, len(available) // streams)
+        # More streams than cores: streams share cores round-robin
+        start = (stream_index % streams) * share % len(available)
+        self.streams = streams
+        self.stream_index = stream_index
+        self.cores = available[start:start + share]
+        self.pin = pin
+        self.pinned = False
+        self.decode_threads = max(1, len(self.cores) // 4)
+        compute = max(1, len(self.cores) - self.decode_threads)
+        self.torch_threads = min(compute, 2) if gpu else compute
+        self.opencv_threads = compute
+
+    def apply(self):
+        """Set the thread pools of this process; call before the model is loaded and captures open"""
+        if self.pin:
+            self.pinned = pin_to_cores(self.cores)
+        try:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                # Only settable before torch's first parallel operation
+                pass
+        except ImportError:
+            pass
+        cv2.setNumThreads(self.opencv_threads)
+        os.environ[DECODE_THREADS_ENV] = str(self.decode_threads)
+        cores = f", pinned to cores {self.cores[0]}-{self.cores[-1]}" if self.pinned else ""
+        print(f"🧵 Stream {self.stream_index + 1}/{self.streams}: {len(self.cores)} cores → torch "
+              f"{self.torch_threads}, OpenCV {self.opencv_threads}, decode {self.decode_threads} threads{cores}")
+        return self
+
+
+def thread_report():
+    """Thread settings actually in effect in this process"""
+    report = {'cpu_count': os.cpu_count(), 'allowed_cores': len(available_cores()),
+              'opencv_threads': cv2.getNumThreads(),
+              'decode_threads': int(os.environ[DECODE_THREADS_ENV]) if os.environ.get(DECODE_THREADS_ENV) else None}
+    try:
+        import torch
+        report['torch_threads'] = torch.get_num_threads()
+        report['torch_interop_threads'] = torch.get_num_interop_threads()
+    except ImportError:
+        pass
+    return report
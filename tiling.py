@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Tiled Detection
+Overlapping-tile person detection for high-resolution cameras: tiles are run as one
+batch, merged with cross-tile NMS, and tiles without motion reuse their last boxes
+"""
+
+import cv2
+import numpy as np
+
+from embedding import iou_matrix
+
+
+def tile_grid(width, height, tile_size=640, overlap=0.2):
+    """(x1, y1, x2, y2) tiles of tile_size covering the frame with at least overlap between neighbours"""
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = int(tile_size * (1 - overlap))
+        count = -(-(length - tile_size) // stride) + 1
+        # Spread the tiles evenly so the last one ends exactly at the frame edge
+        return [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in starts(height) for x in starts(width)]
+
+
+def cut_by_tile(boxes, tile, frame_size, margin=2):
+    """Flags for (k, 4+) tile boxes in frame coordinates that touch an edge of tile inside the frame"""
+    x1, y1, x2, y2 = tile
+    width, height = frame_size
+    cut = np.zeros(len(boxes), dtype=bool)
+    if x1 > 0:
+        cut |= boxes[:, 0] <= x1 + margin
+    if y1 > 0:
+        cut |= boxes[:, 1] <= y1 + margin
+    if x2 < width:
+        cut |= boxes[:, 2] >= x2 - margin
+    if y2 < height:
+        cut |= boxes[:, 3] >= y2 - margin
+    return cut
+
+
+def merge_boxes(boxes, iou_threshold=0.5, containment_threshold=0.8, cut=None):
+    """Greedy NMS over (k, 5) x1, y1, x2, y2, conf boxes from different tiles
+
+    Besides IoU, a box flagged in cut (it touches a tile edge, see cut_by_tile) and mostly
+    contained in a higher-scoring one is dropped: a person cut by a tile edge yields a
+    partial box whose IoU with the full box can be low. Boxes that weren't cut are only
+    suppressed by IoU, so a child in front of an adult or a person in a doorway survives.
+    """
+    if len(boxes) <= 1:
+        return boxes
+    cut = np.zeros(len(boxes), dtype=bool) if cut is None else np.asarray(cut, dtype=bool)
+    # Whole boxes first, then by score, so a partial box never suppresses the whole one
+    order = np.lexsort((-boxes[:, 4], cut))
+    boxes, cut = boxes[order], cut[order]
+    ious = iou_matrix(boxes[:, :4], boxes[:, :4])
+    lt = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    rb = np.minimum(boxes[:, None, 2:4], boxes[None, :, 2:4])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    areas = np.prod(boxes[:, 2:4] - boxes[:, :2], axis=1)
+    # Share of the later (column) box that lies inside the earlier (row) box
+    contained = inter / np.maximum(areas[None, :], 1e-6)
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= (ious[i] > iou_threshold) | ((contained[i] > containment_threshold) & cut)
+    return boxes[keep]
+
+
+class TiledDetector:
+    """Runs a counter's YOLO model over overlapping tiles of each frame
+
+    Motion is measured on a quarter-resolution grayscale difference against the previous
+    frame. Tiles with no changed pixels above motion_fraction keep the boxes they
+    produced last time, so people standing still are not lost. Every refresh_interval
+    frames all tiles run regardless. With full_frame=True the whole frame is added to
+    the batch at imgsz, so people larger than the tile overlap are still found whole.
+    """
+
+    def __init__(self, counter, tile_size=640, overlap=0.2, full_frame=True, motion_threshold=25,
+                 motion_fraction=0.002, refresh_interval=30):
+        self.counter = counter
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.full_frame = full_frame
+        self.motion_threshold = motion_threshold
+        self.motion_fraction = motion_fraction
+        self.refresh_interval = refresh_interval
+        self.tiles = []
+        self.frame_size = None
+        self.tile_boxes = {}
+        self.prev_small = None
+        self.frames = 0
+        self.tiles_run = 0
+        self.tiles_skipped = 0
+
+    def _moving_tiles(self, frame):
+        """Indices of tiles with motion since the previous frame"""
+        small = cv2.resize(frame, (frame.shape[1] // 4, frame.shape[0] // 4), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        prev, self.prev_small = self.prev_small, small
+        if prev is None or self.frames % self.refresh_interval == 0:
+            return list(range(len(self.tiles)))
+        changed = cv2.absdiff(small, prev) > self.motion_threshold
+        integral = cv2.integral(changed.astype(np.uint8))
+        moving = []
+        for i, (x1, y1, x2, y2) in enumerate(self.tiles):
+            x1, y1, x2, y2 = x1 // 4, y1 // 4, x2 // 4, y2 // 4
+            count = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+            if count > self.motion_fraction * max((x2 - x1) * (y2 - y1), 1):
+                moving.append(i)
+        return moving
+
+    def detect(self, frame):
+        """(k, 5) merged x1, y1, x2, y2, conf person boxes in frame coordinates"""
+        height, width = frame.shape[:2]
+        if self.frame_size != (width, height):
+            self.frame_size = (width, height)
+            self.tiles = tile_grid(width, height, self.tile_size, self.overlap)
+            self.tile_boxes = {}
+            self.prev_small = None
+        moving = self._moving_tiles(frame)
+        self.frames += 1
+        self.tiles_run += len(moving)
+        self.tiles_skipped += len(self.tiles) - len(moving)
+
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in (self.tiles[i] for i in moving)]
+        if self.full_frame:
+            crops.append(frame)
+        counter = self.counter
+        results = counter.model(
+            crops, classes=[0], conf=counter.confidence_threshold, verbose=False,
+            device=counter.device, half=counter.half_precision, imgsz=counter.imgsz
+        ) if crops else []
+
+        # Tile boxes carry a sixth column flagging boxes cut by the tile's edge
+        for i, result in zip(moving, results):
+            x1, y1 = self.tiles[i][:2]
+            boxes = np.column_stack([result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy()])
+            boxes[:, [0, 2]] += x1
+            boxes[:, [1, 3]] += y1
+            self.tile_boxes[i] = np.column_stack([boxes, cut_by_tile(boxes, self.tiles[i], self.frame_size)])
+        parts = list(self.tile_boxes.values())
+        if self.full_frame and results:
+            full = results[-1]
+            boxes = np.column_stack([full.boxes.xyxy.cpu().numpy(), full.boxes.conf.cpu().numpy()])
+            parts.append(np.column_stack([boxes, np.zeros(len(boxes))]))
+        if not parts:
+            return np.zeros((0, 5), dtype=np.float32)
+        boxes = np.concatenate(parts).reshape(-1, 6)
+        return merge_boxes(boxes[:, :5], cut=boxes[:, 5] > 0)
+
+    def skip_ratio(self):
+        total = self.tiles_run + self.tiles_skipped
+        return self.tiles_skipped / total if total else 0.0
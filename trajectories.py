@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Trajectory Store & Recount
+Full per-track centroid paths persisted as NumPy chunks, and "what-if" recounts
+for a new counting line or zones without decoding video or running any model
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+POINT_DTYPE = np.dtype([('frame', np.int64), ('track_id', np.int64), ('x', np.int32), ('y', np.int32)])
+# Track IDs and frame numbers restart with every video, so a store holds a single source
+SOURCE_KEYS = ('source', 'camera_id')
+
+
+class TrajectoryStore:
+    """Append-only store of (frame, track_id, x, y) centroid points
+
+    The counter appends exactly the points it pushes into track_history, so a recount
+    over the store sees the same consecutive pairs _check_line_crossing saw. Points are
+    buffered and written as chunk-NNNNNN.npy files of chunk_size points each.
+
+    A store records one source: tracks from another video would reuse its track IDs
+    and merge with its paths, so set_source() raises ValueError for a different
+    source or camera_id than the one already in meta.json.
+    """
+
+    def __init__(self, directory, chunk_size=65536, meta=None):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.meta = {}
+        self._buffer = []
+        os.makedirs(directory, exist_ok=True)
+        self._next_chunk = len(self._chunk_paths())
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                self.meta = json.load(f)
+        self.set_source(**(meta or {}))
+
+    def set_source(self, **meta):
+        """Update meta with the recorded video's details, refusing a different source or camera_id"""
+        for key in SOURCE_KEYS:
+            if self.meta.get(key) is not None and meta.get(key) is not None and self.meta[key] != meta[key]:
+                raise ValueError(f"Trajectory store {self.directory} holds {key} {self.meta[key]!r}, "
+                                 f"not {meta[key]!r}; record each video to its own directory")
+        self.meta.update(meta)
+
+    def _chunk_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'chunk-*.npy')))
+
+    def append(self, frame_index, track_id, x, y):
+        self._buffer.append((frame_index, int(track_id), x, y))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered points as a new chunk (atomically) and refresh meta.json"""
+        if self._buffer:
+            points = np.array(self._buffer, dtype=POINT_DTYPE)
+            path = os.path.join(self.directory, f"chunk-{self._next_chunk:06d}.npy")
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, points)
+            os.replace(tmp_path, path)
+            self._next_chunk += 1
+            self._buffer = []
+        tmp_path = os.path.join(self.directory, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.directory, 'meta.json'))
+
+    def close(self):
+        self.flush()
+
+    def load(self):
+        """All stored points (including unflushed ones), sorted by track then frame
+
+        Resumed runs may re-record frames written before a crash, so duplicate
+        (frame, track_id) points are dropped.
+        """
+        parts = [np.load(path) for path in self._chunk_paths()]
+        if self._buffer:
+            parts.append(np.array(self._buffer, dtype=POINT_DTYPE))
+        if not parts:
+            return np.zeros(0, dtype=POINT_DTYPE)
+        points = np.concatenate(parts)
+        order = np.lexsort((points['frame'], points['track_id']))
+        points = points[order]
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = (points['track_id'][1:] != points['track_id'][:-1]) | (points['frame'][1:] != points['frame'][:-1])
+        return points[keep]
+
+    def recount(self, line=None, zones=None):
+        """Recount this store for a counting line (y or ((x1, y1), (x2, y2))) and/or zones"""
+        points = self.load()
+        if line is None and zones is None:
+            line = self.meta.get('roi_line_y')
+        result = {}
+        if line is not None:
+            result.update(recount_line(points, line))
+        if zones:
+            result['zones'] = recount_zones(points, zones)
+        return result
+
+
+def _steps(points):
+    """Index of every point whose predecessor belongs to the same track"""
+    same = points['track_id'][1:] == points['track_id'][:-1]
+    return np.nonzero(same)[0] + 1
+
+
+def _first_per_track(points, indices):
+    """Keep only each track's first crossing (a counted track is never counted again)"""
+    if len(indices) == 0:
+        return indices
+    _, first = np.unique(points['track_id'][indices], return_index=True)
+    return np.sort(indices[first])
+
+
+def _crossings(points, indices, directions):
+    return [{'frame': int(points['frame'][i]), 'track_id': int(points['track_id'][i]), 'direction': d}
+            for i, d in zip(indices, directions)]
+
+
+def recount_line(points, line):
+    """Entries/exits for a counting line over points sorted by track then frame
+
+    An int line is a full-width horizontal line at that y, with exactly the rules of
+    FootfallCounter._check_line_crossing (downward crossing = entry). A segment
+    ((x1, y1), (x2, y2)) counts a crossing from its left side to its right side (seen
+    looking from the first point to the second) as an entry, and only where the
+    movement actually intersects the segment.
+    """
+    steps = _steps(points)
+    prev, cur = steps - 1, steps
+    if np.isscalar(line):
+        prev_side = points['y'][prev].astype(np.float64) - line
+        cur_side = points['y'][cur].astype(np.float64) - line
+        within = np.ones(len(steps), dtype=bool)
+    else:
+        (x1, y1), (x2, y2) = line
+        dx, dy = float(x2 - x1), float(y2 - y1)
+        px, py = points['x'].astype(np.float64), points['y'].astype(np.float64)
+        # With image y pointing down, a left-to-right horizontal segment gives side > 0 below it
+        side = dx * (py - y1) - dy * (px - x1)
+        prev_side, cur_side = side[prev], side[cur]
+        # Where along the segment the movement crosses its infinite line
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(prev_side != cur_side, prev_side / (prev_side - cur_side), 0.0)
+        ix = px[prev] + (px[cur] - px[prev]) * t
+        iy = py[prev] + (py[cur] - py[prev]) * t
+        u = ((ix - x1) * dx + (iy - y1) * dy) / max(dx * dx + dy * dy, 1e-9)
+        within = (u >= 0) & (u <= 1)
+
+    entry = within & (prev_side < 0) & (cur_side >= 0)
+    exit_ = within & (prev_side > 0) & (cur_side <= 0)
+    indices = _first_per_track(points, cur[entry | exit_])
+    is_entry = np.zeros(len(points), dtype=bool)
+    is_entry[cur[entry]] = True
+    directions = ['entry' if is_entry[i] else 'exit' for i in indices]
+    entry_count = sum(1 for d in directions if d == 'entry')
+    return {
+        'entry_count': entry_count, 'exit_count': len(directions) - entry_count, 'total_count': len(directions),
+        'crossings': _crossings(points, indices, directions)
+    }
+
+
+def points_in_polygon(x, y, polygon):
+    """Vectorised even-odd ray casting test"""
+    polygon = np.asarray(polygon, dtype=np.float64)
+    inside = np.zeros(len(x), dtype=bool)
+    x, y = x.astype(np.float64), y.astype(np.float64)
+    for (ax, ay), (bx, by) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        spans = (ay > y) != (by > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross_x = ax + (y - ay) * (bx - ax) / (by - ay)
+        inside ^= spans & (x < cross_x)
+    return inside
+
+
+def recount_zones(points, zones):
+    """Per zone: entries (outside -> inside) and exits (inside -> outside), each track counted once per zone"""
+    steps = _steps(points)
+    result = {}
+    for name, polygon in zones.items():
+        inside = points_in_polygon(points['x'], points['y'], polygon)
+        entry = ~inside[steps - 1] & inside[steps]
+        exit_ = inside[steps - 1] & ~inside[steps]
+        indices = _first_per_track(points, steps[entry | exit_])
+        directions = ['entry' if inside[i] else 'exit' for i in indices]
+        entry_count = sum(1 for d in directions if d == 'entry')
+        result[name] = {
+            'entry_count': entry_count, 'exit_count': len(directions) - entry_count,
+            'total_count': len(directions), 'crossings': _crossings(points, indices, directions)
+        }
+    return result
+
+
+def parse_zone(spec):
+    """'name:x1,y1;x2,y2;x3,y3' -> (name, [(x1, y1), ...])"""
+    name, _, coords = spec.partition(':')
+    polygon = [tuple(float(v) for v in pair.split(',')) for pair in coords.split(';') if pair]
+    if len(polygon) < 3:
+        raise argparse.ArgumentTypeError(f"Zone {name!r} needs at least three points")
+    return name, polygon
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Recount entries/exits from recorded trajectories")
+    parser.add_argument('store', help="Trajectory directory written with --trajectories")
+    line = parser.add_mutually_exclusive_group()
+    line.add_argument('--line-y', type=int, default=None, help="Horizontal counting line y")
+    line.add_argument('--line', type=int, nargs=4, metavar=('X1', 'Y1', 'X2', 'Y2'), default=None,
+                      help="Counting line segment; crossing from its left to its right side is an entry")
+    parser.add_argument('--zone', type=parse_zone, action='append', default=[],
+                        help="Zone polygon as name:x1,y1;x2,y2;x3,y3 (repeatable)")
+    parser.add_argument('--output', default=None, help="Write the recount (with crossings) as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not os.path.isdir(args.store):
+        print(f"No trajectory store at {args.store}")
+        return 2
+    line = args.line_y if args.line is None else ((args.line[0], args.line[1]), (args.line[2], args.line[3]))
+    result = TrajectoryStore(args.store).recount(line, dict(args.zone) or None)
+    if 'entry_count' in result:
+        print(f"✅ Entries: {result['entry_count']}  Exits: {result['exit_count']}  Total: {result['total_count']}")
+    for name, zone in result.get('zones', {}).items():
+        print(f"🔷 {name}: entries {zone['entry_count']}  exits {zone['exit_count']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Annotated video output
+OpenCV (mp4v) or piped FFmpeg (libx264) encoding on a background thread,
+with optional frame-rate and resolution reduction
+"""
+
+import cv2
+import shutil
+import subprocess
+import threading
+import time
+from queue import Queue
+
+
+class AnnotatedVideoWriter:
+    """Threaded video writer with OpenCV and FFmpeg backends"""
+
+    def __init__(self, output_path, fps, size, backend='auto', output_fps=None, scale=1.0,
+                 codec='libx264', preset='ultrafast', crf=23, queue_size=64, metrics=None):
+        if backend == 'auto':
+            backend = 'ffmpeg' if shutil.which('ffmpeg') else 'opencv'
+        if backend not in ('opencv', 'ffmpeg'):
+            raise ValueError(f"Unknown video backend: {backend}")
+
+        self.output_path = output_path
+        self.backend = backend
+        self.source_fps = fps if fps and fps > 0 else 30
+        self.stride = max(1, int(round(self.source_fps / output_fps))) if output_fps else 1
+        self.fps = self.source_fps / self.stride
+        self.scale = scale
+        width, height = size
+        if scale != 1.0:
+            # Even dimensions keep yuv420p encoders happy
+            width = max(2, int(width * scale) // 2 * 2)
+            height = max(2, int(height * scale) // 2 * 2)
+        self.size = (width, height)
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.metrics = metrics
+
+        self.q = Queue(maxsize=queue_size)
+        self.frames_seen = 0
+        self.frames_written = 0
+        self.encode_time = 0.0
+        self.error = None
+        self._writer = None
+        self._process = None
+        self._open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        if self.backend == 'opencv':
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            self._writer = cv2.VideoWriter(self.output_path, fourcc, self.fps, self.size)
+            return
+        width, height = self.size
+        command = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{self.fps:.3f}',
+            '-i', '-', '-an',
+            '-c:v', self.codec, '-preset', self.preset, '-crf', str(self.crf), '-pix_fmt', 'yuv420p',
+            self.output_path
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        """Queue a frame for encoding, honouring the output frame-rate stride"""
+        self.frames_seen += 1
+        if (self.frames_seen - 1) % self.stride != 0:
+            return
+        if self.error is not None:
+            raise RuntimeError(f"Video encoder failed: {self.error}")
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        else:
+            # The caller may reuse its frame buffer for the next frame
+            frame = frame.copy()
+        self.q.put(frame)
+
+    def _run(self):
+        while True:
+            frame = self.q.get()
+            if frame is None:
+                return
+            if self.error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                if self._writer is not None:
+                    self._writer.write(frame)
+                else:
+                    self._process.stdin.write(frame.tobytes())
+            except (BrokenPipeError, OSError) as e:
+                self.error = e
+                continue
+            elapsed = time.perf_counter() - start
+            self.encode_time += elapsed
+            self.frames_written += 1
+            if self.metrics is not None:
+                self.metrics.observe('encode', elapsed)
+
+    def queue_depth(self):
+        return self.q.qsize()
+
+    def stats(self):
+        return {
+            'backend': self.backend,
+            'frames_written': self.frames_written,
+            'output_fps': round(self.fps, 2),
+            'output_size': list(self.size),
+            'encode_time': round(self.encode_time, 3),
+            'encoder_fps': round(self.frames_written / self.encode_time, 1) if self.encode_time > 0 else 0.0
+        }
+
+    def release(self):
+        """Flush queued frames and close the encoder"""
+        self.q.put(None)
+        self._thread.join()
+        if self._writer is not None:
+            self._writer.release()
+        if self._process is not None:
+            start = time.perf_counter()
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+            self._process.wait()
+            # Encoder flush time is part of the encoder's cost
+            self.encode_time += time.perf_counter() - start
+            if self._process.returncode != 0 and self.error is None:
+                stderr = self._process.stderr.read().decode(errors='replace').strip()
+                self.error = stderr or f"ffmpeg exited with code {self._process.returncode}"
+        if self.error is not None:
+            print(f"⚠️ Video encoder error: {self.error}")
+        return self.stats()